@@ -1,47 +1,205 @@
 // SPDX-License-Identifier: BUSL-1.1
 pragma solidity 0.8.6;
 
-import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/extensions/draft-ERC20Permit.sol';
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/ERC20.sol';
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/extensions/draft-IERC20Permit.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/utils/SafeERC20.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/security/ReentrancyGuard.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/security/Pausable.sol';
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/utils/cryptography/ECDSA.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/utils/math/Math.sol';
 
 import '../interfaces/IBetaBank.sol';
 import '../interfaces/IBetaConfig.sol';
 import '../interfaces/IBetaInterestModel.sol';
 
-contract BToken is ERC20Permit, ReentrancyGuard {
+import './libraries/SafeCast.sol';
+
+/// @dev Deployed once per BetaBank as an implementation, which BTokenDeployer clones for every
+/// market. Only per-market values live in storage, so no immutable may depend on the market.
+contract BToken is ERC20, IERC20Permit, ReentrancyGuard {
   using SafeERC20 for IERC20;
+  using SafeCast for uint;
 
   event Accrue(uint interest);
   event Mint(address indexed caller, address indexed to, uint amount, uint credit);
   event Burn(address indexed caller, address indexed to, uint amount, uint credit);
+  event Sync(address interestModel, address reserveBeneficiary, uint reserveRate);
+  event ClaimReserve(address indexed beneficiary, uint credit);
 
   uint public constant MINIMUM_LIQUIDITY = 10**6; // minimum liquidity to be locked in the pool when first mint occurs
+  bytes32 private constant _TYPE_HASH =
+    keccak256('EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)');
+  bytes32 private constant _HASHED_NAME = keccak256('B Token');
+  bytes32 private constant _HASHED_VERSION = keccak256('1');
+  bytes32 private constant _PERMIT_TYPEHASH =
+    keccak256('Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)');
 
   address public immutable betaBank; // BetaBank address
-  address public immutable underlying; // the underlying token
+  address public immutable deployer; // BTokenDeployer address, the only one allowed to initialize
+  address public underlying; // the underlying token, set once on initialize
+
+  struct AccrueState {
+    uint32 lastAccrueTime; // last interest accrual timestamp
+    uint96 interestRate; // current interest rate
+    uint128 totalLoan; // total amount of loan
+  }
+
+  struct PoolState {
+    uint128 totalLoanable; // total asset amount available to be borrowed
+    uint128 totalDebtShare; // total amount of debt share
+  }
 
-  uint public interestRate; // current interest rate
-  uint public lastAccrueTime; // last interest accrual timestamp
-  uint public totalLoanable; // total asset amount available to be borrowed
-  uint public totalLoan; // total amount of loan
-  uint public totalDebtShare; // total amount of debt share
+  AccrueState private accrueState; // the only slot accrue writes
+  PoolState private poolState; // accrue only reads totalLoanable from this slot
 
-  /// @dev Initializes the BToken contract.
+  address public interestModel; // interest rate model, synced from BetaBank
+  uint64 public reserveRate; // reserve rate, synced from BetaBank's config
+  bool public standardUnderlying; // whether the underlying has no transfer fees, synced from config
+  address public reserveBeneficiary; // reserve beneficiary, synced from BetaBank's config
+  uint96 public pendingReserve; // reserve bToken credit accrued but not yet minted to the beneficiary
+
+  mapping(address => uint) public override nonces; // EIP-2612 permit nonces
+
+  /// @dev Initializes the BToken implementation of the given BetaBank.
   /// @param _betaBank BetaBank address.
-  /// @param _underlying The underlying token address for the bToken.
-  constructor(address _betaBank, address _underlying)
-    ERC20Permit('B Token')
-    ERC20('B Token', 'bTOKEN')
-  {
+  constructor(address _betaBank) ERC20('B Token', 'bTOKEN') {
     require(_betaBank != address(0), 'constructor/betabank-zero-address');
-    require(_underlying != address(0), 'constructor/underlying-zero-address');
     betaBank = _betaBank;
+    deployer = msg.sender;
+  }
+
+  /// @dev Initializes a BToken clone. Must only be called by the deployer, right after cloning.
+  /// @param _underlying The underlying token address for the bToken.
+  function initialize(address _underlying) external {
+    require(msg.sender == deployer, 'initialize/not-deployer');
+    require(underlying == address(0), 'initialize/already-initialized');
+    require(_underlying != address(0), 'initialize/underlying-zero-address');
     underlying = _underlying;
-    interestRate = IBetaInterestModel(IBetaBank(_betaBank).interestModel()).initialRate();
-    lastAccrueTime = block.timestamp;
+    _sync();
+    accrueState = AccrueState(
+      block.timestamp.toUint32(),
+      IBetaInterestModel(interestModel).initialRate().toUint96(),
+      0
+    );
+  }
+
+  /// @dev Pulls the interest model, reserve info and standard flag from BetaBank and its config.
+  /// Changes to those only apply once synced, see BetaBank.syncBTokens. Interest is accrued with
+  /// the previous values first. Can be called by anyone at any time.
+  function sync() external nonReentrant {
+    accrue();
+    _sync();
+  }
+
+  /// @dev Copies the values accrue depends on into local storage. Callers accrue first, so that a
+  /// previous beneficiary is credited all the reserve accrued before the change.
+  function _sync() internal {
+    IBetaConfig config = IBetaConfig(IBetaBank(betaBank).config());
+    interestModel = IBetaBank(betaBank).interestModel();
+    reserveRate = config.reserveRate().toUint64();
+    standardUnderlying = config.standardTokens(underlying);
+    address beneficiary = config.reserveBeneficiary();
+    if (beneficiary != reserveBeneficiary) {
+      _claimReserve(); // reserve accrued so far belongs to the previous beneficiary
+      reserveBeneficiary = beneficiary;
+    }
+    emit Sync(interestModel, reserveBeneficiary, reserveRate);
+  }
+
+  /// @dev Pulls underlying tokens from the given address and returns the amount received.
+  /// Balance diff accounting for fee-on-transfer tokens is skipped for standard tokens.
+  function _pullUnderlying(address _from, uint _amount) internal returns (uint) {
+    IERC20 underlying_ = IERC20(underlying); // gas saving
+    if (standardUnderlying) {
+      underlying_.safeTransferFrom(_from, address(this), _amount);
+      return _amount;
+    }
+    uint balBefore = underlying_.balanceOf(address(this));
+    underlying_.safeTransferFrom(_from, address(this), _amount);
+    uint balAfter = underlying_.balanceOf(address(this));
+    return balAfter - balBefore;
+  }
+
+  /// @dev Mints the pending reserve to the reserve beneficiary. Can be called by anyone at any time.
+  function claimReserve() external nonReentrant {
+    accrue();
+    _claimReserve();
+  }
+
+  /// @dev Mints the pending reserve, if any, to the current reserve beneficiary.
+  function _claimReserve() internal {
+    uint credit = pendingReserve;
+    if (credit > 0) {
+      _mintReserve(credit);
+    }
+  }
+
+  /// @dev Mints the given credit, which must include everything pending, to the beneficiary.
+  function _mintReserve(uint _credit) internal {
+    pendingReserve = 0;
+    _mint(reserveBeneficiary, _credit);
+    emit ClaimReserve(reserveBeneficiary, _credit);
+  }
+
+  /// @dev Returns the bToken supply including the pending reserve not yet minted. All share price
+  /// math uses this value, so deferring the reserve mint does not affect prices.
+  function _shareSupply() internal view returns (uint) {
+    return totalSupply() + pendingReserve;
+  }
+
+  /// @dev Returns the EIP-712 domain separator. Computed on every call rather than cached in an
+  /// immutable, since all clones share the implementation's immutables.
+  function DOMAIN_SEPARATOR() public view override returns (bytes32) {
+    return
+      keccak256(
+        abi.encode(_TYPE_HASH, _HASHED_NAME, _HASHED_VERSION, block.chainid, address(this))
+      );
+  }
+
+  /// @dev Sets the allowance of the spender over the owner's bToken with the owner's signature.
+  /// Same message format as OpenZeppelin's ERC20Permit with name 'B Token' and version '1'.
+  function permit(
+    address _owner,
+    address _spender,
+    uint _value,
+    uint _deadline,
+    uint8 _v,
+    bytes32 _r,
+    bytes32 _s
+  ) external override {
+    require(block.timestamp <= _deadline, 'permit/expired-deadline');
+    bytes32 structHash = keccak256(
+      abi.encode(_PERMIT_TYPEHASH, _owner, _spender, _value, nonces[_owner]++, _deadline)
+    );
+    bytes32 hash = ECDSA.toTypedDataHash(DOMAIN_SEPARATOR(), structHash);
+    require(ECDSA.recover(hash, _v, _r, _s) == _owner, 'permit/invalid-signature');
+    _approve(_owner, _spender, _value);
+  }
+
+  /// @dev Returns the current interest rate.
+  function interestRate() external view returns (uint) {
+    return accrueState.interestRate;
+  }
+
+  /// @dev Returns the last interest accrual timestamp.
+  function lastAccrueTime() external view returns (uint) {
+    return accrueState.lastAccrueTime;
+  }
+
+  /// @dev Returns the total asset amount available to be borrowed.
+  function totalLoanable() external view returns (uint) {
+    return poolState.totalLoanable;
+  }
+
+  /// @dev Returns the total amount of loan.
+  function totalLoan() external view returns (uint) {
+    return accrueState.totalLoan;
+  }
+
+  /// @dev Returns the total amount of debt share.
+  function totalDebtShare() external view returns (uint) {
+    return poolState.totalDebtShare;
   }
 
   /// @dev Returns the name of the token.
@@ -49,7 +207,7 @@ contract BToken is ERC20Permit, ReentrancyGuard {
     try IERC20Metadata(underlying).name() returns (string memory data) {
       return string(abi.encodePacked('B ', data));
     } catch (bytes memory) {
-      return ERC20.name();
+      return 'B Token'; // clones do not have the implementation's ERC20 name in storage
     }
   }
 
@@ -58,7 +216,7 @@ contract BToken is ERC20Permit, ReentrancyGuard {
     try IERC20Metadata(underlying).symbol() returns (string memory data) {
       return string(abi.encodePacked('b', data));
     } catch (bytes memory) {
-      return ERC20.symbol();
+      return 'bTOKEN';
     }
   }
 
@@ -74,35 +232,106 @@ contract BToken is ERC20Permit, ReentrancyGuard {
   /// @dev Accrues interest rate and adjusts the rate. Can be called by anyone at any time.
   function accrue() public {
     // 1. Check time past condition
-    uint timePassed = block.timestamp - lastAccrueTime;
+    AccrueState memory s = accrueState; // gas saving by avoiding multiple SLOADs
+    uint timePassed = block.timestamp - s.lastAccrueTime;
     if (timePassed == 0) return;
-    lastAccrueTime = block.timestamp;
     // 2. Check bank pause condition
     require(!Pausable(betaBank).paused(), 'BetaBank/paused');
     // 3. Compute the accrued interest value over the past time
+    (uint interest, uint nextRate, uint reserveCredit) = _previewAccrue(
+      s,
+      poolState.totalLoanable,
+      timePassed
+    );
+    // 4. Update accrue time, total loan and next interest rate, written back in a single store
+    s.lastAccrueTime = block.timestamp.toUint32();
+    s.interestRate = nextRate.toUint96();
+    s.totalLoan = (s.totalLoan + interest).toUint128();
+    accrueState = s;
+    // 5. Set aside a portion of collected interest for the beneficiary, minted on claim
+    if (interest > 0) {
+      if (reserveCredit > 0) {
+        uint pending = pendingReserve + reserveCredit;
+        if (pending > type(uint96).max) {
+          _mintReserve(pending); // the accumulator would overflow, so mint right away
+        } else {
+          pendingReserve = uint96(pending);
+        }
+      }
+      emit Accrue(interest);
+    }
+  }
+
+  /// @dev Returns the interest, next interest rate and reserve bToken credit that accrue would
+  /// apply if called now. Ignores the bank pause state.
+  function previewAccrue()
+    public
+    view
+    returns (
+      uint interest,
+      uint nextRate,
+      uint reserveCredit
+    )
+  {
+    AccrueState memory s = accrueState;
+    uint timePassed = block.timestamp - s.lastAccrueTime;
+    if (timePassed == 0) {
+      return (0, s.interestRate, 0);
+    }
+    return _previewAccrue(s, poolState.totalLoanable, timePassed);
+  }
+
+  /// @dev Returns the total loan including interest not yet accrued.
+  function pendingTotalLoan() external view returns (uint) {
+    (uint interest, , ) = previewAccrue();
+    return accrueState.totalLoan + interest;
+  }
+
+  /// @dev Returns the debt value for the given debt share as if accrue were called now.
+  function previewDebtShareValue(uint _debtShare) external view returns (uint) {
+    if (_debtShare == 0) {
+      return 0;
+    }
+    (uint interest, , ) = previewAccrue();
+    return Math.ceilDiv(
+      _debtShare * (accrueState.totalLoan + interest),
+      poolState.totalDebtShare
+    ); // round up
+  }
+
+  /// @dev Computes the accrual of the given accrue state and loanable amount over the given time.
+  function _previewAccrue(
+    AccrueState memory _s,
+    uint _totalLoanable,
+    uint _timePassed
+  )
+    internal
+    view
+    returns (
+      uint interest,
+      uint nextRate,
+      uint reserveCredit
+    )
+  {
     (uint totalLoan_, uint totalLoanable_, uint interestRate_) = (
-      totalLoan,
-      totalLoanable,
-      interestRate
-    ); // gas saving by avoiding multiple SLOADs
-    IBetaConfig config = IBetaConfig(IBetaBank(betaBank).config());
-    IBetaInterestModel model = IBetaInterestModel(IBetaBank(betaBank).interestModel());
-    uint interest = (interestRate_ * totalLoan_ * timePassed) / (365 days) / 1e18;
-    // 4. Update total loan and next interest rate
+      _s.totalLoan,
+      _totalLoanable,
+      _s.interestRate
+    );
+    interest = (interestRate_ * totalLoan_ * _timePassed) / (365 days) / 1e18;
     totalLoan_ += interest;
-    totalLoan = totalLoan_;
-    interestRate = model.getNextInterestRate(interestRate_, totalLoanable_, totalLoan_, timePassed);
-    // 5. Send a portion of collected interest to the beneficiary
+    nextRate = IBetaInterestModel(interestModel).getNextInterestRate(
+      interestRate_,
+      totalLoanable_,
+      totalLoan_,
+      _timePassed
+    );
     if (interest > 0) {
-      uint reserveRate = config.reserveRate();
-      if (reserveRate > 0) {
-        uint toReserve = (interest * reserveRate) / 1e18;
-        _mint(
-          config.reserveBeneficiary(),
-          (toReserve * totalSupply()) / (totalLoan_ + totalLoanable_ - toReserve)
-        );
+      uint reserveRate_ = reserveRate;
+      if (reserveRate_ > 0) {
+        uint toReserve = (interest * reserveRate_) / 1e18;
+        reserveCredit = (toReserve * _shareSupply()) / (totalLoan_ + totalLoanable_ - toReserve);
       }
-      emit Accrue(interest);
     }
   }
 
@@ -112,49 +341,61 @@ contract BToken is ERC20Permit, ReentrancyGuard {
     if (_debtShare == 0) {
       return 0;
     }
-    return Math.ceilDiv(_debtShare * totalLoan, totalDebtShare); // round up
+    return Math.ceilDiv(_debtShare * accrueState.totalLoan, poolState.totalDebtShare); // round up
   }
 
   /// @dev Mints new bToken to the given address.
   /// @param _to The address to mint new bToken for.
   /// @param _amount The amount of underlying tokens to deposit via `transferFrom`.
   /// @return credit The amount of bToken minted.
-  function mint(address _to, uint _amount) external nonReentrant returns (uint credit) {
+  function mint(address _to, uint _amount) public nonReentrant returns (uint credit) {
     accrue();
-    uint amount;
-    {
-      uint balBefore = IERC20(underlying).balanceOf(address(this));
-      IERC20(underlying).safeTransferFrom(msg.sender, address(this), _amount);
-      uint balAfter = IERC20(underlying).balanceOf(address(this));
-      amount = balAfter - balBefore;
-    }
-    uint supply = totalSupply();
+    uint amount = _pullUnderlying(msg.sender, _amount);
+    PoolState memory p = poolState; // gas saving by avoiding multiple SLOADs
+    uint supply = _shareSupply();
     if (supply == 0) {
       credit = amount - MINIMUM_LIQUIDITY;
       // Permanently lock the first MINIMUM_LIQUIDITY tokens
-      totalLoanable += credit;
-      totalLoan += MINIMUM_LIQUIDITY;
-      totalDebtShare += MINIMUM_LIQUIDITY;
+      accrueState.totalLoan = (accrueState.totalLoan + MINIMUM_LIQUIDITY).toUint128();
+      p.totalLoanable = (p.totalLoanable + credit).toUint128();
+      p.totalDebtShare = (p.totalDebtShare + MINIMUM_LIQUIDITY).toUint128();
       _mint(address(1), MINIMUM_LIQUIDITY); // OpenZeppelin ERC20 does not allow minting to 0
     } else {
-      credit = (amount * supply) / (totalLoanable + totalLoan);
-      totalLoanable += amount;
+      credit = (amount * supply) / (uint(p.totalLoanable) + accrueState.totalLoan);
+      p.totalLoanable = (p.totalLoanable + amount).toUint128();
     }
+    poolState = p;
     require(credit > 0, 'mint/no-credit-minted');
     _mint(_to, credit);
     emit Mint(msg.sender, _to, _amount, credit);
   }
 
+  /// @dev Similar to mint function, but with an additional call to the underlying's EIP-2612 permit.
+  function mintWithPermit(
+    address _to,
+    uint _amount,
+    uint _approve,
+    uint _deadline,
+    uint8 _v,
+    bytes32 _r,
+    bytes32 _s
+  ) external returns (uint credit) {
+    IERC20Permit(underlying).permit(msg.sender, address(this), _approve, _deadline, _v, _r, _s);
+    credit = mint(_to, _amount);
+  }
+
   /// @dev Burns the given bToken for the proportional amount of underlying tokens.
   /// @param _to The address to send the underlying tokens to.
   /// @param _credit The amount of bToken to burn.
   /// @return amount The amount of underlying tokens getting transferred out.
   function burn(address _to, uint _credit) external nonReentrant returns (uint amount) {
     accrue();
-    uint supply = totalSupply();
-    amount = (_credit * (totalLoanable + totalLoan)) / supply;
+    PoolState memory p = poolState; // gas saving by avoiding multiple SLOADs
+    uint supply = _shareSupply();
+    amount = (_credit * (uint(p.totalLoanable) + accrueState.totalLoan)) / supply;
     require(amount > 0, 'burn/no-amount-returned');
-    totalLoanable -= amount;
+    p.totalLoanable = (p.totalLoanable - amount).toUint128();
+    poolState = p;
     _burn(msg.sender, _credit);
     IERC20(underlying).safeTransfer(_to, amount);
     emit Burn(msg.sender, _to, amount, _credit);
@@ -168,10 +409,13 @@ contract BToken is ERC20Permit, ReentrancyGuard {
     require(msg.sender == betaBank, 'borrow/not-BetaBank');
     accrue();
     IERC20(underlying).safeTransfer(_to, _amount);
-    debtShare = Math.ceilDiv(_amount * totalDebtShare, totalLoan); // round up
-    totalLoanable -= _amount;
-    totalLoan += _amount;
-    totalDebtShare += debtShare;
+    PoolState memory p = poolState; // gas saving by avoiding multiple SLOADs
+    uint totalLoan_ = accrueState.totalLoan;
+    debtShare = Math.ceilDiv(_amount * p.totalDebtShare, totalLoan_); // round up
+    p.totalLoanable = (p.totalLoanable - _amount).toUint128();
+    p.totalDebtShare = (p.totalDebtShare + debtShare).toUint128();
+    poolState = p;
+    accrueState.totalLoan = (totalLoan_ + _amount).toUint128();
   }
 
   /// @dev Repays the debt using funds from the given address. Must only be called by BetaBank.
@@ -181,19 +425,15 @@ contract BToken is ERC20Permit, ReentrancyGuard {
   function repay(address _from, uint _amount) external nonReentrant returns (uint debtShare) {
     require(msg.sender == betaBank, 'repay/not-BetaBank');
     accrue();
-    uint amount;
-    {
-      uint balBefore = IERC20(underlying).balanceOf(address(this));
-      IERC20(underlying).safeTransferFrom(_from, address(this), _amount);
-      uint balAfter = IERC20(underlying).balanceOf(address(this));
-      amount = balAfter - balBefore;
-    }
-    require(amount <= totalLoan, 'repay/amount-too-high');
-    debtShare = (amount * totalDebtShare) / totalLoan; // round down
-    totalLoanable += amount;
-    totalLoan -= amount;
-    totalDebtShare -= debtShare;
-    require(totalDebtShare >= MINIMUM_LIQUIDITY, 'repay/too-low-sum-debt-share');
+    uint amount = _pullUnderlying(_from, _amount);
+    PoolState memory p = poolState; // gas saving by avoiding multiple SLOADs
+    uint totalLoan_ = accrueState.totalLoan;
+    require(amount <= totalLoan_, 'repay/amount-too-high');
+    debtShare = (amount * p.totalDebtShare) / totalLoan_; // round down
+    uint totalDebtShare_ = p.totalDebtShare - debtShare;
+    require(totalDebtShare_ >= MINIMUM_LIQUIDITY, 'repay/too-low-sum-debt-share');
+    poolState = PoolState((p.totalLoanable + amount).toUint128(), totalDebtShare_.toUint128());
+    accrueState.totalLoan = (totalLoan_ - amount).toUint128();
   }
 
   /// @dev Recovers tokens in this contract. EMERGENCY ONLY. Full trust in BetaBank.
@@ -1,20 +1,34 @@
 // SPDX-License-Identifier: BUSL-1.1
 pragma solidity 0.8.6;
 
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/proxy/Clones.sol';
+
 import './BToken.sol';
 
 contract BTokenDeployer {
-  /// @dev Deploys a new BToken contract for the given underlying token.
-  function deploy(address _underlying) external returns (address) {
-    bytes32 salt = keccak256(abi.encode(msg.sender, _underlying));
-    return address(new BToken{salt: salt}(msg.sender, _underlying));
+  /// @dev Deploys a new BToken minimal proxy (EIP-1167) for the given underlying token. The
+  /// BToken implementation of the calling BetaBank is deployed on its first market.
+  function deploy(address _underlying) external returns (address bToken) {
+    address impl = implementationFor(msg.sender);
+    if (impl.code.length == 0) {
+      bytes32 salt = keccak256(abi.encode(msg.sender));
+      require(address(new BToken{salt: salt}(msg.sender)) == impl, 'deploy/bad-implementation');
+    }
+    bToken = Clones.cloneDeterministic(impl, keccak256(abi.encode(msg.sender, _underlying)));
+    BToken(bToken).initialize(_underlying);
   }
 
-  /// @dev Returns the deterministic BToken address for the given BetaBank + underlying.
-  function bTokenFor(address _betaBank, address _underlying) external view returns (address) {
-    bytes memory args = abi.encode(_betaBank, _underlying);
+  /// @dev Returns the deterministic BToken implementation address for the given BetaBank.
+  function implementationFor(address _betaBank) public view returns (address) {
+    bytes memory args = abi.encode(_betaBank);
     bytes32 code = keccak256(abi.encodePacked(type(BToken).creationCode, args));
     bytes32 salt = keccak256(args);
     return address(uint160(uint(keccak256(abi.encodePacked(hex'ff', address(this), salt, code)))));
   }
+
+  /// @dev Returns the deterministic BToken address for the given BetaBank + underlying.
+  function bTokenFor(address _betaBank, address _underlying) external view returns (address) {
+    bytes32 salt = keccak256(abi.encode(_betaBank, _underlying));
+    return Clones.predictDeterministicAddress(implementationFor(_betaBank), salt);
+  }
 }
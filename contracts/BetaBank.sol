@@ -40,6 +40,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
   );
   event SetGovernor(address governor);
   event SetPendingGovernor(address pendingGovernor);
+  event SetDeployer(address deployer);
   event SetOracle(address oracle);
   event SetConfig(address config);
   event SetInterestModel(address interestModel);
@@ -56,9 +57,51 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint debtShare;
   }
 
+  /// @dev A (bToken, collateral) pair, referenced by positions through a 1-based market id.
+  struct Market {
+    address bToken;
+    address collateral;
+  }
+
+  struct Action {
+    uint8 kind; // one of the ACTION_* constants
+    uint pid;
+    uint amount;
+  }
+
+  /// @dev In-memory cache of per-token price and risk parameter lookups within a single call.
+  struct TokenCache {
+    uint size;
+    address[] tokens;
+    uint[] prices; // asset ETH prices, multiplied by 2**112
+    uint[] params; // safety LTVs for debt tokens, collateral factors for collateral tokens
+  }
+
+  /// @dev Market-wide values shared by all positions in a bulk liquidation.
+  struct LiquidationInfo {
+    address bToken;
+    address collateral;
+    uint debtPrice; // underlying ETH price, multiplied by 2**112
+    uint collPrice; // collateral ETH price, multiplied by 2**112
+    uint collFactor;
+    uint liquidationLTV;
+    uint killBountyRate;
+    uint totalLoan;
+    uint totalDebtShare;
+    uint amountLeft; // total amount to repay, then amount not yet split across positions
+    uint shareLeft; // repaid debt share not yet split across positions
+    uint totalPayout; // total collateral paid out to the liquidator
+  }
+
+  uint8 public constant ACTION_BORROW = 0;
+  uint8 public constant ACTION_REPAY = 1;
+  uint8 public constant ACTION_PUT = 2;
+  uint8 public constant ACTION_TAKE = 3;
+
   uint private unlocked; // reentrancy variable
   address public deployer; // deployer address
   address public override oracle; // oracle address
+  bool public batchOracle; // whether the oracle implements getAssetETHPrices, packed with oracle
   address public override config; // config address
   address public override interestModel; // interest rate model address
   address public governor; // current governor
@@ -70,10 +113,19 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
   mapping(address => bool) public runnerWhitelists; // whitelist of authorized routers
   mapping(address => bool) public ownerWhitelists; // whitelist of authorized owners
 
-  mapping(address => mapping(uint => Position)) public positions; // mapping from user to the user's position id to Position info
+  mapping(address => mapping(uint => Position)) public legacyPositions; // positions in the unpacked layout, cleared on migration
   mapping(address => uint) public nextPositionIds; // mapping from user to next position id (position count)
   mapping(address => uint) public totalCollaterals; // mapping from token address to amount of collateral
 
+  // packed positions: [0, 32) blockBorrowPut, [32, 64) blockRepayTake, [64, 160) collateralSize, [160, 256) debtShare
+  mapping(address => mapping(uint => uint)) private positionWords;
+  mapping(address => mapping(uint => uint)) public positionMarketIds; // zero if not migrated from legacyPositions
+  mapping(uint => Market) public markets; // mapping from market id to market
+  mapping(address => mapping(address => uint)) public marketIds; // mapping from bToken to collateral to market id
+  uint public marketCount; // number of registered markets
+  address[] public allBTokens; // bTokens created by this implementation, to sync in pages
+  mapping(address => bool) public standardCollaterals; // collateral standard flags, synced from config
+
   /// @dev Reentrancy guard modifier
   modifier lock() {
     require(unlocked == 1, 'BetaBank/locked');
@@ -115,12 +167,11 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     require(_interestModel != address(0), 'initialize/interest-model-zero-address');
     governor = _governor;
     deployer = _deployer;
-    oracle = _oracle;
+    _setOracle(_oracle);
     config = _config;
     interestModel = _interestModel;
     unlocked = 1;
     emit SetGovernor(_governor);
-    emit SetOracle(_oracle);
     emit SetConfig(_config);
     emit SetInterestModel(_interestModel);
   }
@@ -140,14 +191,36 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     emit SetGovernor(msg.sender);
   }
 
+  /// @dev Updates the BToken deployer used by new markets. Must only be called by the governor.
+  function setDeployer(address _deployer) external onlyGov {
+    require(_deployer != address(0), 'setDeployer/zero-address');
+    deployer = _deployer;
+    emit SetDeployer(_deployer);
+  }
+
   /// @dev Updates the oracle address. Must only be called by the governor.
+  /// Also detects whether the oracle supports batched price queries, see batchOracle.
   function setOracle(address _oracle) external onlyGov {
     require(_oracle != address(0), 'setOracle/zero-address');
+    _setOracle(_oracle);
+  }
+
+  /// @dev Sets the oracle, probing getAssetETHPrices with an empty query to set batchOracle.
+  function _setOracle(address _oracle) internal {
+    bool batch = false;
+    if (_oracle.isContract()) {
+      try IBetaOracle(_oracle).getAssetETHPrices(new address[](0)) returns (uint[] memory) {
+        batch = true;
+      } catch (bytes memory) {}
+    }
     oracle = _oracle;
+    batchOracle = batch;
     emit SetOracle(_oracle);
   }
 
   /// @dev Updates the config address. Must only be called by the governor.
+  /// BTokens and collaterals keep the previous reserve info and standard flags until synced, see
+  /// syncBTokens and syncCollaterals.
   function setConfig(address _config) external onlyGov {
     require(_config != address(0), 'setConfig/zero-address');
     config = _config;
@@ -155,12 +228,47 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
   }
 
   /// @dev Updates the interest model address. Must only be called by the governor.
+  /// BTokens keep accruing with the previous model until synced, see syncBTokens.
   function setInterestModel(address _interestModel) external onlyGov {
     require(_interestModel != address(0), 'setInterestModel/zero-address');
     interestModel = _interestModel;
     emit SetInterestModel(_interestModel);
   }
 
+  /// @dev Syncs the given bTokens with the current interest model, reserve info and standard
+  /// flags. Permissionless, since bTokens pull the values themselves. Must be called for all
+  /// bTokens after setConfig, setInterestModel, or the config's setReserveInfo and
+  /// setStandardTokens. Until then, bTokens keep using the previous values.
+  function syncBTokens(address[] calldata _bTokens) external {
+    for (uint idx = 0; idx < _bTokens.length; idx++) {
+      BToken(_bTokens[idx]).sync();
+    }
+  }
+
+  /// @dev Same as syncBTokens, for allBTokens from index _start up to _end (exclusive, capped at
+  /// the length). Lets keepers walk all markets in pages that fit in a block.
+  function syncBTokenRange(uint _start, uint _end) external {
+    _end = Math.min(_end, allBTokens.length);
+    for (uint idx = _start; idx < _end; idx++) {
+      BToken(allBTokens[idx]).sync();
+    }
+  }
+
+  /// @dev Syncs the standard flags of the given collaterals from config, so puts need no config
+  /// call. Permissionless like syncBTokens. Must be called after setConfig or the config's
+  /// setStandardTokens. Until then, puts keep using the previous flags.
+  function syncCollaterals(address[] calldata _collaterals) external {
+    for (uint idx = 0; idx < _collaterals.length; idx++) {
+      address collateral = _collaterals[idx];
+      standardCollaterals[collateral] = IBetaConfig(config).standardTokens(collateral);
+    }
+  }
+
+  /// @dev Returns the number of bTokens in allBTokens.
+  function allBTokensLength() external view returns (uint) {
+    return allBTokens.length;
+  }
+
   /// @dev Sets the whitelist statuses for the given runners. Must only be called by the governor.
   function setRunnerWhitelists(address[] calldata _runners, bool ok) external onlyGov {
     for (uint idx = 0; idx < _runners.length; idx++) {
@@ -204,6 +312,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     bToken = BTokenDeployer(deployer).deploy(_underlying);
     bTokens[_underlying] = bToken;
     underlyings[bToken] = _underlying;
+    allBTokens.push(bToken);
     emit Create(_underlying, bToken);
   }
 
@@ -216,6 +325,31 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
       (_owner == tx.origin && runnerWhitelists[_sender]));
   }
 
+  /// @dev Returns the position info of the given owner and position id.
+  function positions(address _owner, uint _pid)
+    external
+    view
+    override
+    returns (
+      uint32 blockBorrowPut,
+      uint32 blockRepayTake,
+      address bToken,
+      address collateral,
+      uint collateralSize,
+      uint debtShare
+    )
+  {
+    Position memory pos = _getPosition(_owner, _pid);
+    return (
+      pos.blockBorrowPut,
+      pos.blockRepayTake,
+      pos.bToken,
+      pos.collateral,
+      pos.collateralSize,
+      pos.debtShare
+    );
+  }
+
   /// @dev Returns the position's collateral token and BToken.
   function getPositionTokens(address _owner, uint _pid)
     external
@@ -224,7 +358,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     checkPID(_owner, _pid)
     returns (address _collateral, address _bToken)
   {
-    Position storage pos = positions[_owner][_pid];
+    Position memory pos = _getPosition(_owner, _pid);
     _collateral = pos.collateral;
     _bToken = pos.bToken;
   }
@@ -236,10 +370,21 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     checkPID(_owner, _pid)
     returns (uint)
   {
-    Position storage pos = positions[_owner][_pid];
+    Position memory pos = _getPosition(_owner, _pid);
     return BToken(pos.bToken).fetchDebtShareValue(pos.debtShare);
   }
 
+  /// @dev Returns the debt of the given position as if accrue were called now.
+  function previewPositionDebt(address _owner, uint _pid)
+    external
+    view
+    checkPID(_owner, _pid)
+    returns (uint)
+  {
+    Position memory pos = _getPosition(_owner, _pid);
+    return BToken(pos.bToken).previewDebtShareValue(pos.debtShare);
+  }
+
   /// @dev Returns the LTV of the given position. Can't be view as it needs to call accrue.
   function fetchPositionLTV(address _owner, uint _pid)
     external
@@ -247,7 +392,8 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     checkPID(_owner, _pid)
     returns (uint)
   {
-    return _fetchPositionLTV(positions[_owner][_pid]);
+    Position memory pos = _getPosition(_owner, _pid);
+    return _fetchPositionLTV(pos, IBetaConfig(config).getCollFactor(pos.collateral));
   }
 
   /// @dev Opens a new position to borrow a specific token for a specific collateral.
@@ -265,9 +411,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     require(IBetaConfig(config).getCollFactor(_collateral) > 0, 'open/bad-collateral');
     require(IBetaOracle(oracle).getAssetETHPrice(_collateral) > 0, 'open/no-price');
     pid = nextPositionIds[_owner]++;
-    Position storage pos = positions[_owner][pid];
-    pos.bToken = bToken;
-    pos.collateral = _collateral;
+    positionMarketIds[_owner][pid] = _getMarketId(bToken, _collateral);
     emit Open(_owner, pid, bToken, _collateral);
   }
 
@@ -280,18 +424,12 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _pid,
     uint _amount
   ) external override lock whenNotPaused isPermittedByOwner(_owner) checkPID(_owner, _pid) {
-    // 1. pre-conditions
-    Position memory pos = positions[_owner][_pid];
-    require(pos.blockRepayTake != uint32(block.number), 'borrow/bad-block');
-    // 2. perform the borrow and update the position
-    uint share = BToken(pos.bToken).borrow(msg.sender, _amount);
-    pos.debtShare += share;
-    positions[_owner][_pid].debtShare = pos.debtShare;
-    positions[_owner][_pid].blockBorrowPut = uint32(block.number);
-    // 3. make sure the position is still safe
-    uint ltv = _fetchPositionLTV(pos);
-    require(ltv <= IBetaConfig(config).getSafetyLTV(underlyings[pos.bToken]), 'borrow/not-safe');
-    emit Borrow(_owner, _pid, _amount, share, msg.sender);
+    Position memory pos = _borrow(_owner, _pid, _amount);
+    // make sure the position is still safe
+    IBetaConfig.RiskParams memory risk = _getRiskParams(pos);
+    require(risk.safetyLTV > 0, 'borrow/no-safety-ltv');
+    uint ltv = _fetchPositionLTV(pos, risk.collFactor);
+    require(ltv <= risk.safetyLTV, 'borrow/not-safe');
   }
 
   /// @dev Repays tokens on the given position. Payer must be position owner or sender.
@@ -303,15 +441,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _pid,
     uint _amount
   ) external override lock whenNotPaused isPermittedByOwner(_owner) checkPID(_owner, _pid) {
-    // 1. pre-conditions
-    Position memory pos = positions[_owner][_pid];
-    require(pos.blockBorrowPut != uint32(block.number), 'repay/bad-block');
-    // 2. perform the repayment and update the position - no collateral check required
-    uint share = BToken(pos.bToken).repay(msg.sender, _amount);
-    pos.debtShare -= share;
-    positions[_owner][_pid].debtShare = pos.debtShare;
-    positions[_owner][_pid].blockRepayTake = uint32(block.number);
-    emit Repay(_owner, _pid, _amount, share, msg.sender);
+    _repay(_owner, _pid, _amount);
   }
 
   /// @dev Puts more collateral to the given position. Payer must be position owner or sender.
@@ -323,27 +453,7 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _pid,
     uint _amount
   ) external override lock whenNotPaused isPermittedByOwner(_owner) checkPID(_owner, _pid) {
-    // 1. pre-conditions
-    Position memory pos = positions[_owner][_pid];
-    require(pos.blockRepayTake != uint32(block.number), 'put/bad-block');
-    // 2. transfer collateral tokens in
-    uint amount;
-    {
-      uint balBefore = IERC20(pos.collateral).balanceOf(address(this));
-      IERC20(pos.collateral).safeTransferFrom(msg.sender, address(this), _amount);
-      uint balAfter = IERC20(pos.collateral).balanceOf(address(this));
-      amount = balAfter - balBefore;
-    }
-    // 3. update the position and total collateral + check global collateral cap
-    pos.collateralSize += amount;
-    totalCollaterals[pos.collateral] += amount;
-    require(
-      totalCollaterals[pos.collateral] <= IBetaConfig(config).getCollMaxAmount(pos.collateral),
-      'put/too-much-collateral'
-    );
-    positions[_owner][_pid].collateralSize = pos.collateralSize;
-    positions[_owner][_pid].blockBorrowPut = uint32(block.number);
-    emit Put(_owner, _pid, _amount, msg.sender);
+    _put(_owner, _pid, _amount);
   }
 
   /// @dev Takes some collateral out of the position and send it out. Position must still be safe.
@@ -355,20 +465,56 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _pid,
     uint _amount
   ) external override lock whenNotPaused isPermittedByOwner(_owner) checkPID(_owner, _pid) {
-    // 1. pre-conditions
-    Position memory pos = positions[_owner][_pid];
-    require(pos.blockBorrowPut != uint32(block.number), 'take/bad-block');
-    // 2. update position collateral size and total collateral
-    pos.collateralSize -= _amount;
-    totalCollaterals[pos.collateral] -= _amount;
-    positions[_owner][_pid].collateralSize = pos.collateralSize;
-    positions[_owner][_pid].blockRepayTake = uint32(block.number);
-    // 3. make sure the position is still safe
-    uint ltv = _fetchPositionLTV(pos);
-    require(ltv <= IBetaConfig(config).getSafetyLTV(underlyings[pos.bToken]), 'take/not-safe');
-    // 4. transfer collateral tokens out
+    Position memory pos = _take(_owner, _pid, _amount);
+    // make sure the position is still safe
+    IBetaConfig.RiskParams memory risk = _getRiskParams(pos);
+    require(risk.safetyLTV > 0, 'take/no-safety-ltv');
+    uint ltv = _fetchPositionLTV(pos, risk.collFactor);
+    require(ltv <= risk.safetyLTV, 'take/not-safe');
+    // transfer collateral tokens out
     IERC20(pos.collateral).safeTransfer(msg.sender, _amount);
-    emit Take(_owner, _pid, _amount, msg.sender);
+  }
+
+  /// @dev Performs the given borrow/repay/put/take actions on the owner's positions in order.
+  /// Safety checks run once per touched position at the end, sharing price and config lookups.
+  /// @param _owner The owner of the positions. Sender must be allowed to act for.
+  /// @param _actions The list of actions to perform.
+  function batch(address _owner, Action[] calldata _actions)
+    external
+    lock
+    whenNotPaused
+    isPermittedByOwner(_owner)
+  {
+    uint nextPositionId = nextPositionIds[_owner];
+    uint[] memory toCheck = new uint[](_actions.length);
+    uint checkCount;
+    // 1. perform all actions, deferring safety checks and collateral transfers out
+    for (uint idx = 0; idx < _actions.length; idx++) {
+      Action calldata action = _actions[idx];
+      require(action.pid < nextPositionId, 'BetaBank/checkPID');
+      if (action.kind == ACTION_BORROW) {
+        _borrow(_owner, action.pid, action.amount);
+        checkCount = _addUnique(toCheck, checkCount, action.pid);
+      } else if (action.kind == ACTION_REPAY) {
+        _repay(_owner, action.pid, action.amount);
+      } else if (action.kind == ACTION_PUT) {
+        _put(_owner, action.pid, action.amount);
+      } else if (action.kind == ACTION_TAKE) {
+        _take(_owner, action.pid, action.amount);
+        checkCount = _addUnique(toCheck, checkCount, action.pid);
+      } else {
+        revert('batch/bad-action');
+      }
+    }
+    // 2. make sure all positions that borrowed or took are still safe
+    _checkPositionsSafe(_owner, toCheck, checkCount);
+    // 3. transfer collateral tokens out
+    for (uint idx = 0; idx < _actions.length; idx++) {
+      Action calldata action = _actions[idx];
+      if (action.kind == ACTION_TAKE) {
+        IERC20(_getPosition(_owner, action.pid).collateral).safeTransfer(msg.sender, action.amount);
+      }
+    }
   }
 
   /// @dev Liquidates the given position. Can be called by anyone but must be liquidatable.
@@ -381,31 +527,61 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _amount
   ) external override lock whenNotPaused checkPID(_owner, _pid) {
     // 1. check liquidation condition
-    Position memory pos = positions[_owner][_pid];
-    address underlying = underlyings[pos.bToken];
-    uint ltv = _fetchPositionLTV(pos);
-    require(ltv >= IBetaConfig(config).getLiquidationLTV(underlying), 'liquidate/not-liquidatable');
+    Position memory pos = _getPosition(_owner, _pid);
+    IBetaConfig.RiskParams memory risk = _getRiskParams(pos);
+    _checkLiquidationParams(risk);
+    (uint debtPrice, uint collPrice) = _fetchPrices(underlyings[pos.bToken], pos.collateral);
+    uint ltv = _computePositionLTV(pos, risk.collFactor, debtPrice, collPrice);
+    require(ltv >= risk.liquidationLTV, 'liquidate/not-liquidatable');
     // 2. perform repayment
     uint debtShare = BToken(pos.bToken).repay(msg.sender, _amount);
     require(debtShare <= (pos.debtShare + 1) / 2, 'liquidate/too-much-liquidation');
     // 3. calculate reward and payout
     uint debtValue = BToken(pos.bToken).fetchDebtShareValue(debtShare);
-    uint collValue = IBetaOracle(oracle).convert(underlying, pos.collateral, debtValue);
+    uint collValue = (debtValue * debtPrice) / collPrice; // same as oracle convert
     uint payout = Math.min(
-      collValue + (collValue * IBetaConfig(config).getKillBountyRate(underlying)) / 1e18,
+      collValue + (collValue * risk.killBountyRate) / 1e18,
       pos.collateralSize
     );
     // 4. update the position and total collateral
     pos.debtShare -= debtShare;
-    positions[_owner][_pid].debtShare = pos.debtShare;
     pos.collateralSize -= payout;
-    positions[_owner][_pid].collateralSize = pos.collateralSize;
+    _setPosition(_owner, _pid, pos);
     totalCollaterals[pos.collateral] -= payout;
     // 5. transfer the payout out
     IERC20(pos.collateral).safeTransfer(msg.sender, payout);
     emit Liquidate(_owner, _pid, _amount, debtShare, payout, msg.sender);
   }
 
+  /// @dev Liquidates the given positions, which must all share the same BToken and collateral.
+  /// Interest accrues once, prices are fetched once, and the repayment is pulled in one transfer.
+  /// @param _owners The position owners to be liquidated.
+  /// @param _pids The position ids to be liquidated. (owner, pid) pairs must be strictly increasing.
+  /// @param _amounts The amounts of debt to be repaid per position. Each must not exceed half debt (rounded up).
+  function liquidateMany(
+    address[] calldata _owners,
+    uint[] calldata _pids,
+    uint[] calldata _amounts
+  ) external lock whenNotPaused {
+    require(_owners.length > 0, 'liquidateMany/empty');
+    require(_owners.length == _pids.length, 'liquidateMany/bad-length');
+    require(_owners.length == _amounts.length, 'liquidateMany/bad-length');
+    // 1. check liquidation condition of every position with shared market values
+    LiquidationInfo memory info = _loadLiquidationInfo(_owners[0], _pids[0]);
+    _checkLiquidatable(info, _owners, _pids, _amounts);
+    // 2. perform repayment once for all positions
+    info.shareLeft = BToken(info.bToken).repay(msg.sender, info.amountLeft);
+    info.totalLoan = BToken(info.bToken).totalLoan();
+    info.totalDebtShare = BToken(info.bToken).totalDebtShare();
+    // 3. split repaid debt share pro rata and update the positions
+    for (uint idx = 0; idx < _owners.length; idx++) {
+      _liquidateShare(info, _owners[idx], _pids[idx], _amounts[idx]);
+    }
+    // 4. update total collateral and transfer the payout out
+    totalCollaterals[info.collateral] -= info.totalPayout;
+    IERC20(info.collateral).safeTransfer(msg.sender, info.totalPayout);
+  }
+
   /// @dev onlyGov selfless liquidation if collateral size = 0
   /// @param _owner The position owner to be liquidated.
   /// @param _pid The position id to be liquidated.
@@ -416,14 +592,14 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     uint _amount
   ) external onlyGov lock checkPID(_owner, _pid) {
     // 1. check positions collateral size
-    Position memory pos = positions[_owner][_pid];
+    Position memory pos = _getPosition(_owner, _pid);
     require(pos.collateralSize == 0, 'selflessLiquidate/positive-collateral');
     // 2. perform debt repayment
     uint debtValue = BToken(pos.bToken).fetchDebtShareValue(pos.debtShare);
     _amount = Math.min(_amount, debtValue);
     uint debtShare = BToken(pos.bToken).repay(msg.sender, _amount);
     pos.debtShare -= debtShare;
-    positions[_owner][_pid].debtShare = pos.debtShare;
+    _setPosition(_owner, _pid, pos);
     emit SelflessLiquidate(_owner, _pid, _amount, debtShare, msg.sender);
   }
 
@@ -440,23 +616,483 @@ contract BetaBank is IBetaBank, Initializable, Pausable {
     BToken(_bToken).recover(_token, msg.sender, _amount);
   }
 
-  /// @dev Returns the current LTV of the given position.
-  function _fetchPositionLTV(Position memory pos) internal returns (uint) {
+  /// @dev Moves the given positions from the legacy layout to the packed layout. Permissionless.
+  /// Positions are also migrated on their first write, so this only saves gas on later actions.
+  /// Positions with sizes above 96 bits stay in the legacy layout.
+  /// @param _owners The position owners to migrate.
+  /// @param _pids The position ids to migrate.
+  function migratePositions(address[] calldata _owners, uint[] calldata _pids) external lock {
+    require(_owners.length == _pids.length, 'migratePositions/bad-length');
+    for (uint idx = 0; idx < _owners.length; idx++) {
+      require(_pids[idx] < nextPositionIds[_owners[idx]], 'BetaBank/checkPID');
+      if (positionMarketIds[_owners[idx]][_pids[idx]] == 0) {
+        _setPosition(_owners[idx], _pids[idx], legacyPositions[_owners[idx]][_pids[idx]]);
+      }
+    }
+  }
+
+  /// @dev Borrows tokens on the given position without the safety check. Returns the position.
+  function _borrow(
+    address _owner,
+    uint _pid,
+    uint _amount
+  ) internal returns (Position memory pos) {
+    // 1. pre-conditions
+    pos = _getPosition(_owner, _pid);
+    require(pos.blockRepayTake != uint32(block.number), 'borrow/bad-block');
+    // 2. perform the borrow and update the position
+    uint share = BToken(pos.bToken).borrow(msg.sender, _amount);
+    pos.debtShare += share;
+    pos.blockBorrowPut = uint32(block.number);
+    _setPosition(_owner, _pid, pos);
+    emit Borrow(_owner, _pid, _amount, share, msg.sender);
+  }
+
+  /// @dev Repays tokens on the given position. No collateral check required.
+  function _repay(
+    address _owner,
+    uint _pid,
+    uint _amount
+  ) internal {
+    // 1. pre-conditions
+    Position memory pos = _getPosition(_owner, _pid);
+    require(pos.blockBorrowPut != uint32(block.number), 'repay/bad-block');
+    // 2. perform the repayment and update the position - no collateral check required
+    uint share = BToken(pos.bToken).repay(msg.sender, _amount);
+    pos.debtShare -= share;
+    pos.blockRepayTake = uint32(block.number);
+    _setPosition(_owner, _pid, pos);
+    emit Repay(_owner, _pid, _amount, share, msg.sender);
+  }
+
+  /// @dev Puts more collateral to the given position. No collateral check required.
+  function _put(
+    address _owner,
+    uint _pid,
+    uint _amount
+  ) internal {
+    // 1. pre-conditions
+    Position memory pos = _getPosition(_owner, _pid);
+    require(pos.blockRepayTake != uint32(block.number), 'put/bad-block');
+    // 2. transfer collateral tokens in, trusting the amount for standard tokens
+    uint amount = _amount;
+    if (standardCollaterals[pos.collateral]) {
+      IERC20(pos.collateral).safeTransferFrom(msg.sender, address(this), _amount);
+    } else {
+      uint balBefore = IERC20(pos.collateral).balanceOf(address(this));
+      IERC20(pos.collateral).safeTransferFrom(msg.sender, address(this), _amount);
+      uint balAfter = IERC20(pos.collateral).balanceOf(address(this));
+      amount = balAfter - balBefore;
+    }
+    // 3. update the position and total collateral + check global collateral cap
+    pos.collateralSize += amount;
+    totalCollaterals[pos.collateral] += amount;
+    require(
+      totalCollaterals[pos.collateral] <= IBetaConfig(config).getCollMaxAmount(pos.collateral),
+      'put/too-much-collateral'
+    );
+    pos.blockBorrowPut = uint32(block.number);
+    _setPosition(_owner, _pid, pos);
+    emit Put(_owner, _pid, _amount, msg.sender);
+  }
+
+  /// @dev Takes collateral out of the position without the safety check or the transfer out.
+  function _take(
+    address _owner,
+    uint _pid,
+    uint _amount
+  ) internal returns (Position memory pos) {
+    // 1. pre-conditions
+    pos = _getPosition(_owner, _pid);
+    require(pos.blockBorrowPut != uint32(block.number), 'take/bad-block');
+    // 2. update position collateral size and total collateral
+    pos.collateralSize -= _amount;
+    totalCollaterals[pos.collateral] -= _amount;
+    pos.blockRepayTake = uint32(block.number);
+    _setPosition(_owner, _pid, pos);
+    emit Take(_owner, _pid, _amount, msg.sender);
+  }
+
+  /// @dev Returns the given position, reading the legacy layout if not migrated yet.
+  function _getPosition(address _owner, uint _pid) internal view returns (Position memory pos) {
+    uint marketId = positionMarketIds[_owner][_pid];
+    if (marketId == 0) {
+      return legacyPositions[_owner][_pid];
+    }
+    Market storage market = markets[marketId];
+    pos.bToken = market.bToken;
+    pos.collateral = market.collateral;
+    uint word = positionWords[_owner][_pid];
+    pos.blockBorrowPut = uint32(word);
+    pos.blockRepayTake = uint32(word >> 32);
+    pos.collateralSize = uint96(word >> 64);
+    pos.debtShare = word >> 160;
+  }
+
+  /// @dev Writes the block numbers and sizes of the given position in a single packed slot.
+  /// Migrates the position out of the legacy layout on its first write. Positions with a size
+  /// that does not fit in 96 bits are kept in (or moved back to) the legacy layout instead.
+  function _setPosition(
+    address _owner,
+    uint _pid,
+    Position memory pos
+  ) internal {
+    uint marketId = positionMarketIds[_owner][_pid];
+    if (pos.collateralSize > type(uint96).max || pos.debtShare > type(uint96).max) {
+      if (marketId != 0) {
+        positionMarketIds[_owner][_pid] = 0;
+        delete positionWords[_owner][_pid];
+      }
+      legacyPositions[_owner][_pid] = pos;
+      return;
+    }
+    if (marketId == 0) {
+      positionMarketIds[_owner][_pid] = _getMarketId(pos.bToken, pos.collateral);
+      delete legacyPositions[_owner][_pid];
+    }
+    positionWords[_owner][_pid] =
+      uint(pos.blockBorrowPut) |
+      (uint(pos.blockRepayTake) << 32) |
+      (pos.collateralSize << 64) |
+      (pos.debtShare << 160);
+  }
+
+  /// @dev Returns the id of the given (bToken, collateral) market, registering it if new.
+  /// New markets also sync the collateral standard flag, like bTokens do on initialize.
+  function _getMarketId(address _bToken, address _collateral) internal returns (uint marketId) {
+    marketId = marketIds[_bToken][_collateral];
+    if (marketId == 0) {
+      marketId = ++marketCount;
+      markets[marketId] = Market(_bToken, _collateral);
+      marketIds[_bToken][_collateral] = marketId;
+      standardCollaterals[_collateral] = IBetaConfig(config).standardTokens(_collateral);
+    }
+  }
+
+  /// @dev Accrues interest and loads the market values shared by a bulk liquidation.
+  function _loadLiquidationInfo(address _owner, uint _pid)
+    internal
+    returns (LiquidationInfo memory info)
+  {
+    require(_pid < nextPositionIds[_owner], 'BetaBank/checkPID');
+    Position memory pos = _getPosition(_owner, _pid);
+    info.bToken = pos.bToken;
+    info.collateral = pos.collateral;
+    address underlying = underlyings[info.bToken];
+    BToken(info.bToken).accrue();
+    info.totalLoan = BToken(info.bToken).totalLoan();
+    info.totalDebtShare = BToken(info.bToken).totalDebtShare();
+    (info.debtPrice, info.collPrice) = _fetchPrices(underlying, info.collateral);
+    IBetaConfig.RiskParams memory risk = _getRiskParams(pos);
+    _checkLiquidationParams(risk);
+    info.collFactor = risk.collFactor;
+    info.liquidationLTV = risk.liquidationLTV;
+    info.killBountyRate = risk.killBountyRate;
+  }
+
+  /// @dev Checks that the given positions are distinct, in the same market and liquidatable.
+  /// Sets the total amount to repay in the given info.
+  function _checkLiquidatable(
+    LiquidationInfo memory info,
+    address[] calldata _owners,
+    uint[] calldata _pids,
+    uint[] calldata _amounts
+  ) internal {
+    for (uint idx = 0; idx < _owners.length; idx++) {
+      require(
+        idx == 0 || _isBefore(_owners[idx - 1], _pids[idx - 1], _owners[idx], _pids[idx]),
+        'liquidateMany/unsorted'
+      );
+      _checkLiquidatableOne(info, _owners[idx], _pids[idx]);
+      info.amountLeft += _amounts[idx];
+    }
+  }
+
+  /// @dev Checks that the given position is in the info's market and is liquidatable.
+  function _checkLiquidatableOne(
+    LiquidationInfo memory info,
+    address _owner,
+    uint _pid
+  ) internal view {
+    require(_pid < nextPositionIds[_owner], 'BetaBank/checkPID');
+    Position memory pos = _getPosition(_owner, _pid);
+    require(
+      pos.bToken == info.bToken && pos.collateral == info.collateral,
+      'liquidateMany/bad-market'
+    );
+    uint ltv = _computeLTV(info, pos.debtShare, pos.collateralSize);
+    require(ltv >= info.liquidationLTV, 'liquidate/not-liquidatable');
+  }
+
+  /// @dev Returns whether (owner0, pid0) strictly precedes (owner1, pid1).
+  function _isBefore(
+    address _owner0,
+    uint _pid0,
+    address _owner1,
+    uint _pid1
+  ) internal pure returns (bool) {
+    return _owner0 < _owner1 || (_owner0 == _owner1 && _pid0 < _pid1);
+  }
+
+  /// @dev Applies the pro-rata share of the repaid debt share to the position and adds its payout.
+  function _liquidateShare(
+    LiquidationInfo memory info,
+    address _owner,
+    uint _pid,
+    uint _amount
+  ) internal {
+    // 1. split repaid debt share pro rata to the repaid amounts, last position takes the rest
+    uint debtShare = info.amountLeft == 0 ? 0 : (info.shareLeft * _amount) / info.amountLeft;
+    info.shareLeft -= debtShare;
+    info.amountLeft -= _amount;
+    // 2. calculate reward and payout
+    Position memory pos = _getPosition(_owner, _pid);
+    require(debtShare <= (pos.debtShare + 1) / 2, 'liquidate/too-much-liquidation');
+    uint payout;
+    {
+      uint debtValue = debtShare == 0
+        ? 0
+        : Math.ceilDiv(debtShare * info.totalLoan, info.totalDebtShare);
+      uint collValue = (debtValue * info.debtPrice) / info.collPrice;
+      payout = Math.min(collValue + (collValue * info.killBountyRate) / 1e18, pos.collateralSize);
+    }
+    // 3. update the position
+    pos.debtShare -= debtShare;
+    pos.collateralSize -= payout;
+    _setPosition(_owner, _pid, pos);
+    info.totalPayout += payout;
+    emit Liquidate(_owner, _pid, _amount, debtShare, payout, msg.sender);
+  }
+
+  /// @dev Returns the LTV of a position in the given market from its debt share and collateral size.
+  function _computeLTV(
+    LiquidationInfo memory info,
+    uint _debtShare,
+    uint _collateralSize
+  ) internal pure returns (uint) {
+    if (_debtShare == 0) {
+      return 0; // no debt means zero LTV
+    }
+    require(info.collFactor > 0, 'fetch/bad-collateral');
+    uint debtSize = Math.ceilDiv(_debtShare * info.totalLoan, info.totalDebtShare);
+    uint debtValue = (info.debtPrice * debtSize) >> 112;
+    uint collCred = (_collateralSize * info.collFactor) / 1e18;
+    uint collValue = (info.collPrice * collCred) >> 112;
+    if (debtValue >= collValue) {
+      return 1e18; // 100% LTV is very very bad and must always be liquidatable and unsafe
+    }
+    return (debtValue * 1e18) / collValue;
+  }
+
+  /// @dev Returns the risk parameters of the given position's market in a single config call.
+  function _getRiskParams(Position memory pos)
+    internal
+    view
+    returns (IBetaConfig.RiskParams memory)
+  {
+    return IBetaConfig(config).getRiskParams(underlyings[pos.bToken], pos.collateral);
+  }
+
+  /// @dev Reverts if the given risk parameters do not allow liquidations.
+  function _checkLiquidationParams(IBetaConfig.RiskParams memory risk) internal pure {
+    require(risk.collFactor > 0, 'liquidate/bad-collateral');
+    require(risk.liquidationLTV > 0, 'liquidate/no-liquidation-ltv');
+    require(risk.killBountyRate > 0, 'liquidate/no-kill-bounty-rate');
+  }
+
+  /// @dev Returns the current LTV of the given position with the given collateral factor.
+  function _fetchPositionLTV(Position memory pos, uint _collFactor) internal returns (uint) {
     if (pos.debtShare == 0) {
       return 0; // no debt means zero LTV
     }
+    (uint debtPrice, uint collPrice) = _fetchPrices(underlyings[pos.bToken], pos.collateral);
+    return _computePositionLTV(pos, _collFactor, debtPrice, collPrice);
+  }
 
+  /// @dev Returns the ETH prices of the given underlying and collateral, in one oracle call if
+  /// the oracle supports batched queries, or one call per token otherwise, e.g. on an older oracle.
+  function _fetchPrices(address _underlying, address _collateral)
+    internal
+    returns (uint debtPrice, uint collPrice)
+  {
     address oracle_ = oracle; // gas saving
-    uint collFactor = IBetaConfig(config).getCollFactor(pos.collateral);
-    require(collFactor > 0, 'fetch/bad-collateral');
+    if (!batchOracle) {
+      return (
+        IBetaOracle(oracle_).getAssetETHPrice(_underlying),
+        IBetaOracle(oracle_).getAssetETHPrice(_collateral)
+      );
+    }
+    address[] memory tokens = new address[](2);
+    tokens[0] = _underlying;
+    tokens[1] = _collateral;
+    uint[] memory prices = IBetaOracle(oracle_).getAssetETHPrices(tokens);
+    return (prices[0], prices[1]);
+  }
+
+  /// @dev Returns the current LTV of the given position with the given collateral factor and
+  /// the given debt and collateral prices, as returned by the oracle.
+  function _computePositionLTV(
+    Position memory pos,
+    uint _collFactor,
+    uint _debtPrice,
+    uint _collPrice
+  ) internal returns (uint) {
+    if (pos.debtShare == 0) {
+      return 0; // no debt means zero LTV
+    }
+
+    require(_collFactor > 0, 'fetch/bad-collateral');
     uint debtSize = BToken(pos.bToken).fetchDebtShareValue(pos.debtShare);
-    uint debtValue = IBetaOracle(oracle_).getAssetETHValue(underlyings[pos.bToken], debtSize);
-    uint collCred = (pos.collateralSize * collFactor) / 1e18;
-    uint collValue = IBetaOracle(oracle_).getAssetETHValue(pos.collateral, collCred);
+    uint debtValue = (_debtPrice * debtSize) >> 112;
+    uint collCred = (pos.collateralSize * _collFactor) / 1e18;
+    uint collValue = (_collPrice * collCred) >> 112;
 
     if (debtValue >= collValue) {
       return 1e18; // 100% LTV is very very bad and must always be liquidatable and unsafe
     }
     return (debtValue * 1e18) / collValue;
   }
+
+  /// @dev Reverts if any of the given positions is above its safety LTV. Shares all lookups.
+  /// @param _owner The owner of the positions.
+  /// @param _pids The position ids to check. Only the first `_count` entries are used.
+  /// @param _count The number of positions to check.
+  function _checkPositionsSafe(
+    address _owner,
+    uint[] memory _pids,
+    uint _count
+  ) internal {
+    TokenCache memory debts = _newTokenCache(_count);
+    TokenCache memory colls = _newTokenCache(_count);
+    for (uint idx = 0; idx < _count; idx++) {
+      Position memory pos = _getPosition(_owner, _pids[idx]);
+      if (pos.debtShare == 0) {
+        continue; // no debt means zero LTV
+      }
+      (uint ltv, uint safetyLTV) = _fetchPositionLTVCached(pos, debts, colls);
+      require(safetyLTV > 0, 'batch/no-safety-ltv');
+      require(ltv <= safetyLTV, 'batch/not-safe');
+    }
+  }
+
+  /// @dev Returns the current LTV and safety LTV of the given position, using the given caches.
+  /// @param pos The position to compute LTV. Must have non-zero debt share.
+  /// @param debts The cache of debt token prices and safety LTVs.
+  /// @param colls The cache of collateral token prices and collateral factors.
+  function _fetchPositionLTVCached(
+    Position memory pos,
+    TokenCache memory debts,
+    TokenCache memory colls
+  ) internal returns (uint ltv, uint safetyLTV) {
+    uint debtPrice;
+    uint collPrice;
+    uint collFactor;
+    (debtPrice, safetyLTV, collPrice, collFactor) = _lookup(
+      debts,
+      colls,
+      underlyings[pos.bToken],
+      pos.collateral
+    );
+    ltv = _computePositionLTV(pos, collFactor, debtPrice, collPrice);
+  }
+
+  /// @dev Appends the given position id to the list if not already present. Returns the new count.
+  function _addUnique(
+    uint[] memory _pids,
+    uint _count,
+    uint _pid
+  ) internal pure returns (uint) {
+    for (uint idx = 0; idx < _count; idx++) {
+      if (_pids[idx] == _pid) {
+        return _count;
+      }
+    }
+    _pids[_count] = _pid;
+    return _count + 1;
+  }
+
+  /// @dev Returns an empty token cache that can hold up to the given number of tokens.
+  function _newTokenCache(uint _capacity) internal pure returns (TokenCache memory cache) {
+    cache.tokens = new address[](_capacity);
+    cache.prices = new uint[](_capacity);
+    cache.params = new uint[](_capacity);
+  }
+
+  /// @dev Returns the cached prices and risk parameters of the given underlying and collateral.
+  /// On a cache miss, both caches are filled from a single config call.
+  /// @param debts The cache of debt token prices and safety LTVs.
+  /// @param colls The cache of collateral token prices and collateral factors.
+  /// @param _underlying The borrowed token to look up.
+  /// @param _collateral The collateral token to look up.
+  function _lookup(
+    TokenCache memory debts,
+    TokenCache memory colls,
+    address _underlying,
+    address _collateral
+  )
+    internal
+    returns (
+      uint debtPrice,
+      uint safetyLTV,
+      uint collPrice,
+      uint collFactor
+    )
+  {
+    bool debtHit;
+    bool collHit;
+    (debtHit, debtPrice, safetyLTV) = _find(debts, _underlying);
+    (collHit, collPrice, collFactor) = _find(colls, _collateral);
+    if (debtHit && collHit) {
+      return (debtPrice, safetyLTV, collPrice, collFactor);
+    }
+    IBetaConfig.RiskParams memory risk = IBetaConfig(config).getRiskParams(
+      _underlying,
+      _collateral
+    );
+    if (!debtHit && !collHit) {
+      (debtPrice, collPrice) = _fetchPrices(_underlying, _collateral);
+    } else if (!debtHit) {
+      debtPrice = IBetaOracle(oracle).getAssetETHPrice(_underlying);
+    } else {
+      collPrice = IBetaOracle(oracle).getAssetETHPrice(_collateral);
+    }
+    if (!debtHit) {
+      safetyLTV = risk.safetyLTV;
+      _store(debts, _underlying, debtPrice, safetyLTV);
+    }
+    if (!collHit) {
+      collFactor = risk.collFactor;
+      _store(colls, _collateral, collPrice, collFactor);
+    }
+  }
+
+  /// @dev Returns whether the given token is cached, with its cached price and risk parameter.
+  function _find(TokenCache memory cache, address _token)
+    internal
+    pure
+    returns (
+      bool found,
+      uint price,
+      uint param
+    )
+  {
+    for (uint idx = 0; idx < cache.size; idx++) {
+      if (cache.tokens[idx] == _token) {
+        return (true, cache.prices[idx], cache.params[idx]);
+      }
+    }
+  }
+
+  /// @dev Appends the given token, price and risk parameter to the cache.
+  function _store(
+    TokenCache memory cache,
+    address _token,
+    uint _price,
+    uint _param
+  ) internal pure {
+    cache.tokens[cache.size] = _token;
+    cache.prices[cache.size] = _price;
+    cache.params[cache.size] = _param;
+    cache.size++;
+  }
 }
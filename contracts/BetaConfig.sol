@@ -21,6 +21,7 @@ contract BetaConfig is IBetaConfig {
     uint64 killBountyRate
   );
   event SetReserveInfo(address indexed beneficiary, uint rate);
+  event SetStandardToken(address indexed token, bool ok);
 
   address public governor;
   address public pendingGovernor;
@@ -31,6 +32,7 @@ contract BetaConfig is IBetaConfig {
   mapping(address => uint) public cMaxAmounts; // collateral max amounts
   mapping(address => uint) public rLevels; // risk levels
   mapping(uint => RiskConfig) public rConfigs; // risk configurations
+  mapping(address => bool) public override standardTokens; // tokens without transfer fees
 
   constructor(address _reserveBeneficiary, uint _reserveRate) {
     governor = msg.sender;
@@ -104,7 +106,20 @@ contract BetaConfig is IBetaConfig {
     }
   }
 
-  /// @dev Sets the global reserve information.
+  /// @dev Marks the given tokens as standard, whose transfers always move the exact amount.
+  /// Transfers of standard tokens skip balance diff accounting, so never mark fee-on-transfer or
+  /// rebasing tokens. BTokens pick up changes on their next sync, through BetaBank.syncBTokens
+  /// or syncBTokenRange, and collaterals through BetaBank.syncCollaterals.
+  function setStandardTokens(address[] calldata tokens, bool ok) external {
+    require(msg.sender == governor, 'setStandardTokens/not-governor');
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      standardTokens[tokens[idx]] = ok;
+      emit SetStandardToken(tokens[idx], ok);
+    }
+  }
+
+  /// @dev Sets the global reserve information. BTokens keep accruing with the previous values
+  /// until synced through BetaBank.syncBTokens or syncBTokenRange.
   function setReserveInfo(address _reserveBeneficiary, uint _reserveRate) public {
     require(msg.sender == governor, 'setReserveInfo/not-governor');
     require(_reserveRate < 1e18, 'setReserveInfo/bad-rate');
@@ -155,4 +170,20 @@ contract BetaConfig is IBetaConfig {
     require(rate > 0, 'getKillBountyRate/no-rate');
     return rate;
   }
+
+  /// @dev Returns all risk parameters of the given underlying and collateral pair. Zero values are
+  /// returned as is, so callers must check the ones they use.
+  function getRiskParams(address _underlying, address _collateral)
+    external
+    view
+    override
+    returns (RiskParams memory params)
+  {
+    RiskConfig memory risk = rConfigs[getRiskLevel(_underlying)]; // all three in a single SLOAD
+    params.collFactor = cFactors[_collateral];
+    params.collMaxAmount = cMaxAmounts[_collateral];
+    params.safetyLTV = risk.safetyLTV;
+    params.liquidationLTV = risk.liquidationLTV;
+    params.killBountyRate = risk.killBountyRate;
+  }
 }
@@ -0,0 +1,146 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/utils/math/Math.sol';
+
+import './BToken.sol';
+import './BetaBank.sol';
+import './BetaConfig.sol';
+
+/// @dev Read-only helper that returns batched snapshots of BetaBank positions and markets.
+/// Market values are simulated as if accrue were called at the current block.
+contract BetaLens {
+  struct MarketSnapshot {
+    address bToken;
+    address underlying;
+    uint lastAccrueTime;
+    uint interestRate; // interest rate after the simulated accrual
+    uint totalLoanable;
+    uint totalLoan; // total loan including pending interest
+    uint totalDebtShare;
+    uint totalSupply; // bToken supply including pending reserve mint
+    uint pendingInterest;
+    uint riskLevel;
+    uint safetyLTV;
+    uint liquidationLTV;
+    uint killBountyRate;
+  }
+
+  struct PositionSnapshot {
+    address owner;
+    uint pid;
+    bool exists;
+    uint32 blockBorrowPut;
+    uint32 blockRepayTake;
+    address bToken;
+    address collateral;
+    uint collateralSize;
+    uint debtShare;
+    uint debtValue; // debt value including pending interest, rounded up
+    uint collFactor;
+    uint collMaxAmount;
+  }
+
+  address public immutable betaBank;
+
+  constructor(address _betaBank) {
+    require(_betaBank != address(0), 'constructor/bank-zero-address');
+    betaBank = _betaBank;
+  }
+
+  /// @dev Returns the next position id of each given owner.
+  /// @param _owners The position owners to query.
+  function getNextPositionIds(address[] calldata _owners)
+    external
+    view
+    returns (uint[] memory nextPids)
+  {
+    nextPids = new uint[](_owners.length);
+    for (uint idx = 0; idx < _owners.length; idx++) {
+      nextPids[idx] = BetaBank(betaBank).nextPositionIds(_owners[idx]);
+    }
+  }
+
+  /// @dev Returns the market snapshots of the given bTokens.
+  /// @param _bTokens The bTokens to query.
+  function getMarketSnapshots(address[] calldata _bTokens)
+    external
+    view
+    returns (MarketSnapshot[] memory snaps)
+  {
+    snaps = new MarketSnapshot[](_bTokens.length);
+    for (uint idx = 0; idx < _bTokens.length; idx++) {
+      snaps[idx] = _getMarketSnapshot(_bTokens[idx]);
+    }
+  }
+
+  /// @dev Returns the position snapshots of the given (owner, pid) pairs.
+  /// @param _owners The position owners to query.
+  /// @param _pids The position ids to query.
+  function getPositionSnapshots(address[] calldata _owners, uint[] calldata _pids)
+    external
+    view
+    returns (PositionSnapshot[] memory snaps)
+  {
+    require(_owners.length == _pids.length, 'getPositionSnapshots/bad-length');
+    snaps = new PositionSnapshot[](_owners.length);
+    MarketSnapshot memory market; // reused while consecutive positions share the same bToken
+    for (uint idx = 0; idx < _owners.length; idx++) {
+      PositionSnapshot memory snap = _getPosition(_owners[idx], _pids[idx]);
+      if (snap.debtShare > 0) {
+        if (market.bToken != snap.bToken) {
+          market = _getMarketSnapshot(snap.bToken);
+        }
+        snap.debtValue = Math.ceilDiv(snap.debtShare * market.totalLoan, market.totalDebtShare);
+      }
+      snaps[idx] = snap;
+    }
+  }
+
+  /// @dev Returns the stored position data of the given position, without debt value.
+  function _getPosition(address _owner, uint _pid)
+    internal
+    view
+    returns (PositionSnapshot memory snap)
+  {
+    BetaBank bank = BetaBank(betaBank);
+    snap.owner = _owner;
+    snap.pid = _pid;
+    snap.exists = _pid < bank.nextPositionIds(_owner);
+    if (!snap.exists) {
+      return snap;
+    }
+    (
+      snap.blockBorrowPut,
+      snap.blockRepayTake,
+      snap.bToken,
+      snap.collateral,
+      snap.collateralSize,
+      snap.debtShare
+    ) = bank.positions(_owner, _pid);
+    BetaConfig config = BetaConfig(bank.config());
+    snap.collFactor = config.cFactors(snap.collateral);
+    snap.collMaxAmount = config.cMaxAmounts(snap.collateral);
+  }
+
+  /// @dev Returns the market snapshot of the given bToken, simulating BToken.accrue.
+  function _getMarketSnapshot(address _bToken) internal view returns (MarketSnapshot memory snap) {
+    BToken bToken = BToken(_bToken);
+    snap.bToken = _bToken;
+    snap.underlying = BetaBank(betaBank).underlyings(_bToken);
+    snap.lastAccrueTime = bToken.lastAccrueTime();
+    snap.interestRate = bToken.interestRate();
+    snap.totalLoanable = bToken.totalLoanable();
+    snap.totalLoan = bToken.totalLoan();
+    snap.totalDebtShare = bToken.totalDebtShare();
+    snap.totalSupply = bToken.totalSupply() + bToken.pendingReserve();
+    (uint interest, uint nextRate, uint reserveCredit) = bToken.previewAccrue();
+    snap.pendingInterest = interest;
+    snap.totalLoan += interest;
+    snap.interestRate = nextRate;
+    snap.totalSupply += reserveCredit;
+    BetaConfig config = BetaConfig(BetaBank(betaBank).config());
+    snap.riskLevel = config.rLevels(snap.underlying);
+    (snap.safetyLTV, snap.liquidationLTV, snap.killBountyRate) = config.rConfigs(snap.riskLevel);
+  }
+}
@@ -12,21 +12,33 @@ contract BetaOracleUniswapV2 is IBetaOracle {
   event Initialize(address token);
   event Observe(address indexed token, uint224 price);
   event SetExternal(address indexed token, address ext);
+  event SetBatchExternal(address indexed ext, bool ok);
 
   struct Observation {
-    uint lastCumu;
-    uint224 lastPrice;
-    uint32 timestamp;
+    address pair; // token-WETH pair, resolved once at initialization
+    uint8 index; // position of the newest checkpoint
+    uint32[CHECKPOINTS] timestamps; // 0 for checkpoints not recorded yet
+    uint[CHECKPOINTS] cumus;
   }
 
+  struct CachedPrice {
+    uint224 price;
+    uint32 blockNumber;
+  }
+
+  uint public constant CHECKPOINTS = 8;
+
   address public immutable weth;
   address public immutable factory;
   uint32 public immutable minTwapTime;
+  uint32 public immutable checkpointSpacing;
 
   address public governor;
   address public pendingGovernor;
-  mapping(address => Observation) public observations;
+  mapping(address => Observation) internal pairObservations;
   mapping(address => address) public exts;
+  mapping(address => bool) public batchExts; // external oracles that implement getETHPxs
+  mapping(address => CachedPrice) public cachedPrices; // external or pair prices, valid for one block
 
   /// @dev Initializes the oracle contract.
   /// @param _weth WETH address.
@@ -43,6 +55,9 @@ contract BetaOracleUniswapV2 is IBetaOracle {
     weth = _weth;
     factory = _factory;
     minTwapTime = _minTwapTime;
+    // after a new checkpoint, the second oldest one is still at least minTwapTime old
+    uint32 spacing = _minTwapTime / uint32(CHECKPOINTS - 2);
+    checkpointSpacing = spacing > 0 ? spacing : 1;
     governor = msg.sender;
     emit SetGovernor(msg.sender);
   }
@@ -70,19 +85,68 @@ contract BetaOracleUniswapV2 is IBetaOracle {
     require(msg.sender == governor, 'setExternalOracle/not-governor');
     for (uint idx = 0; idx < _tokens.length; idx++) {
       exts[_tokens[idx]] = _ext;
+      delete cachedPrices[_tokens[idx]];
       emit SetExternal(_tokens[idx], _ext);
     }
   }
 
+  /// @dev Marks the given external oracles as supporting batched price queries by the governor.
+  /// @param _exts The external price oracle contracts to update.
+  /// @param _ok Whether the external oracles implement getETHPxs.
+  function setBatchExternalOracles(address[] calldata _exts, bool _ok) external {
+    require(msg.sender == governor, 'setBatchExternalOracles/not-governor');
+    for (uint idx = 0; idx < _exts.length; idx++) {
+      batchExts[_exts[idx]] = _ok;
+      emit SetBatchExternal(_exts[idx], _ok);
+    }
+  }
+
+  /// @dev Returns the newest checkpoint of the given token, in the layout of the former
+  /// observations getter. lastPrice is the pair TWAP ending at that checkpoint, or 0 if no
+  /// checkpoint is at least minTwapTime older. Never reflects external prices.
+  /// @param token The token to query.
+  function observations(address token)
+    external
+    view
+    returns (
+      uint lastCumu,
+      uint224 lastPrice,
+      uint32 timestamp
+    )
+  {
+    Observation storage obs = pairObservations[token];
+    uint index = obs.index;
+    uint32[CHECKPOINTS] memory timestamps = obs.timestamps;
+    uint32 time = timestamps[index];
+    uint cumu = obs.cumus[index];
+    return (cumu, uint224(_twap(obs, timestamps, index, time, cumu)), time);
+  }
+
+  /// @dev Returns the checkpoint ring buffer of the given token.
+  /// @param token The token to query.
+  function getObservation(address token)
+    external
+    view
+    returns (
+      address pair,
+      uint index,
+      uint32[CHECKPOINTS] memory timestamps,
+      uint[CHECKPOINTS] memory cumus
+    )
+  {
+    Observation storage obs = pairObservations[token];
+    return (obs.pair, obs.index, obs.timestamps, obs.cumus);
+  }
+
   /// @dev Initializes data points for price from pair for the given token.
   /// @param token The token to initialize the price.
   function initPriceFromPair(address token) public {
-    Observation storage obs = observations[token];
-    require(obs.timestamp == 0, 'initPriceFromPair/already-initialized');
+    Observation storage obs = pairObservations[token];
+    require(obs.pair == address(0), 'initPriceFromPair/already-initialized');
     address pair = IUniswapV2Factory(factory).getPair(token, weth);
-    obs.lastCumu = token < weth ? currentPrice0Cumu(pair) : currentPrice1Cumu(pair);
-    obs.lastPrice = 0;
-    obs.timestamp = uint32(block.timestamp);
+    obs.pair = pair;
+    obs.timestamps[0] = uint32(block.timestamp);
+    obs.cumus[0] = token < weth ? currentPrice0Cumu(pair) : currentPrice1Cumu(pair);
     emit Initialize(token);
   }
 
@@ -94,30 +158,63 @@ contract BetaOracleUniswapV2 is IBetaOracle {
     }
   }
 
-  /// @dev Updates price info for the given token and returns the last price.
+  /// @dev Returns the TWAP of the given token since its newest checkpoint that is at least
+  /// minTwapTime old, and records a new checkpoint if the newest one is checkpointSpacing old.
+  /// The price is cached for repeated queries in the same block.
   /// @param token The token to update token-WETH pair price.
   function updatePriceFromPair(address token) public returns (uint) {
-    Observation storage obs = observations[token];
-    uint32 lastObserved = obs.timestamp;
-    require(lastObserved > 0, 'updatePriceFromPair/uninitialized');
+    CachedPrice memory cached = cachedPrices[token];
+    if (cached.blockNumber == uint32(block.number)) {
+      return cached.price;
+    }
+    Observation storage obs = pairObservations[token];
+    address pair = obs.pair;
+    require(pair != address(0), 'updatePriceFromPair/uninitialized');
+    uint index = obs.index;
+    uint32[CHECKPOINTS] memory timestamps = obs.timestamps;
+    uint currCumu = token < weth ? currentPrice0Cumu(pair) : currentPrice1Cumu(pair);
     unchecked {
-      uint32 timeElapsed = uint32(block.timestamp) - lastObserved; // overflow is desired
-      if (timeElapsed < minTwapTime) {
-        uint lastPrice = obs.lastPrice;
-        require(lastPrice > 0, 'updatePriceFromPair/no-price');
-        return lastPrice;
+      uint32 currTime = uint32(block.timestamp);
+      // 1. Walk back from the newest checkpoint to the first one old enough for a TWAP
+      uint price = _twap(obs, timestamps, index, currTime, currCumu);
+      require(price > 0, 'updatePriceFromPair/no-price');
+      // 2. Record a checkpoint over the oldest one, once the newest is old enough
+      if (currTime - timestamps[index] >= checkpointSpacing) {
+        index = (index + 1) % CHECKPOINTS;
+        obs.index = uint8(index);
+        obs.timestamps[index] = currTime;
+        obs.cumus[index] = currCumu;
+        emit Observe(token, uint224(price));
       }
-      address pair = IUniswapV2Factory(factory).getPair(token, weth);
-      uint currCumu = token < weth ? currentPrice0Cumu(pair) : currentPrice1Cumu(pair);
-      uint224 price = uint224((currCumu - obs.lastCumu) / timeElapsed); // overflow is desired
-      obs.lastPrice = price;
-      obs.lastCumu = currCumu;
-      obs.timestamp = uint32(block.timestamp);
-      emit Observe(token, price);
+      _cachePrice(token, price);
       return price;
     }
   }
 
+  /// @dev Returns the TWAP up to the given time and cumulative price, from the newest checkpoint
+  /// at or before index that is at least minTwapTime older, or 0 if there is none.
+  function _twap(
+    Observation storage obs,
+    uint32[CHECKPOINTS] memory timestamps,
+    uint index,
+    uint32 time,
+    uint cumu
+  ) internal view returns (uint) {
+    unchecked {
+      for (uint step = 0; step < CHECKPOINTS; step++) {
+        uint idx = (index + CHECKPOINTS - step) % CHECKPOINTS;
+        if (timestamps[idx] == 0) {
+          break;
+        }
+        uint32 timeElapsed = time - timestamps[idx]; // overflow is desired
+        if (timeElapsed >= minTwapTime) {
+          return uint224((cumu - obs.cumus[idx]) / timeElapsed); // overflow is desired
+        }
+      }
+      return 0;
+    }
+  }
+
   /// @dev Utility functions to update multiple pair prices at once.
   /// @param tokens Token list to mass update prices.
   function massUpdatePriceFromPair(address[] calldata tokens)
@@ -138,11 +235,102 @@ contract BetaOracleUniswapV2 is IBetaOracle {
     }
     address ext = exts[token];
     if (ext != address(0)) {
-      return IExternalOracle(ext).getETHPx(token);
+      return _getExternalPrice(token, ext);
     }
     return updatePriceFromPair(token);
   }
 
+  /// @dev Returns the external price of the given token, cached for repeated queries in the same block.
+  /// @param token The token to get asset price of.
+  /// @param ext The external price oracle contract of the token.
+  function _getExternalPrice(address token, address ext) internal returns (uint) {
+    CachedPrice memory cached = cachedPrices[token];
+    if (cached.blockNumber == uint32(block.number)) {
+      return cached.price;
+    }
+    uint price = IExternalOracle(ext).getETHPx(token);
+    _cachePrice(token, price);
+    return price;
+  }
+
+  /// @dev Stores the given price in the price cache for the current block.
+  /// @param token The token of the price.
+  /// @param price The price to cache.
+  function _cachePrice(address token, uint price) internal {
+    if (price <= type(uint224).max) {
+      cachedPrices[token] = CachedPrice(uint224(price), uint32(block.number));
+    }
+  }
+
+  /// @dev Returns the prices of the given assets in terms of ETH (wei), multiplied by 2**112.
+  /// Uncached prices from the same batch-capable external oracle are fetched in a single call.
+  /// @param tokens The tokens to get asset prices of.
+  function getAssetETHPrices(address[] calldata tokens)
+    external
+    override
+    returns (uint[] memory prices)
+  {
+    prices = new uint[](tokens.length);
+    address[] memory pending = new address[](tokens.length); // batch oracle of unpriced tokens
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      address token = tokens[idx];
+      if (token == weth) {
+        prices[idx] = (1 << 112);
+        continue;
+      }
+      address ext = exts[token];
+      if (ext == address(0)) {
+        prices[idx] = updatePriceFromPair(token);
+      } else if (batchExts[ext] && cachedPrices[token].blockNumber != uint32(block.number)) {
+        pending[idx] = ext;
+      } else {
+        prices[idx] = _getExternalPrice(token, ext);
+      }
+    }
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      if (pending[idx] != address(0)) {
+        _fetchBatchExternalPrices(tokens, pending, prices, pending[idx]);
+      }
+    }
+  }
+
+  /// @dev Fetches and caches the prices of all pending tokens of the given batch oracle in one
+  /// call, and clears them from the pending list.
+  /// @param tokens The tokens to get asset prices of.
+  /// @param pending The batch oracle of each token still to be priced, or zero.
+  /// @param prices The price list to fill in.
+  /// @param ext The batch-capable external oracle to query.
+  function _fetchBatchExternalPrices(
+    address[] calldata tokens,
+    address[] memory pending,
+    uint[] memory prices,
+    address ext
+  ) internal {
+    uint count = 0;
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      if (pending[idx] == ext) {
+        count++;
+      }
+    }
+    address[] memory batch = new address[](count);
+    count = 0;
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      if (pending[idx] == ext) {
+        batch[count++] = tokens[idx];
+      }
+    }
+    uint[] memory batchPrices = IExternalBatchOracle(ext).getETHPxs(batch);
+    require(batchPrices.length == count, 'getAssetETHPrices/bad-length');
+    count = 0;
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      if (pending[idx] == ext) {
+        prices[idx] = batchPrices[count++];
+        pending[idx] = address(0);
+        _cachePrice(tokens[idx], prices[idx]);
+      }
+    }
+  }
+
   /// @dev Returns the given asset value in ETH (wei)
   /// @param token The token to query for asset value
   /// @param amount The amount of token to query
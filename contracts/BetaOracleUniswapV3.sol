@@ -782,6 +782,11 @@ interface IAlphaAggOracle {
 }
 
 contract UniswapV3PriceOracle {
+  event SetGovernor(address governor);
+  event SetPendingGovernor(address pendingGovernor);
+  event SetFeeTiers(uint24[] feeTiers);
+  event SetPools(address indexed token, address[] pools);
+
   uint128 public constant BASE_AMOUNT = 2**112;
   address public constant QUOTE_ADDRESS = 0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2;
 
@@ -790,6 +795,17 @@ contract UniswapV3PriceOracle {
   uint16 public immutable minCardinality;
   IAlphaAggOracle public immutable aggOracle;
 
+  struct CachedPrice {
+    uint224 price;
+    uint32 blockNumber;
+  }
+
+  address public governor;
+  address public pendingGovernor;
+  uint24[] public feeTiers; // fee tiers scanned when registering pools
+  mapping(address => address[]) public pools; // registered token-WETH pools, per token
+  mapping(address => CachedPrice) public cachedPrices; // valid for one block
+
   constructor(
     address _factory,
     uint32 _twapPeriod,
@@ -800,6 +816,124 @@ contract UniswapV3PriceOracle {
     twapPeriod = _twapPeriod;
     aggOracle = IAlphaAggOracle(_aggOracle);
     minCardinality = uint16(_twapPeriod / 12);
+    feeTiers.push(10000);
+    feeTiers.push(3000);
+    feeTiers.push(500);
+    governor = msg.sender;
+    emit SetGovernor(msg.sender);
+  }
+
+  /// @dev Sets the next governor, which will be in effect when they accept.
+  /// @param _pendingGovernor The next governor address.
+  function setPendingGovernor(address _pendingGovernor) external {
+    require(msg.sender == governor, 'setPendingGovernor/not-governor');
+    pendingGovernor = _pendingGovernor;
+    emit SetPendingGovernor(_pendingGovernor);
+  }
+
+  /// @dev Accepts to become the next governor. Must only be called by the pending governor.
+  function acceptGovernor() external {
+    require(msg.sender == pendingGovernor, 'acceptGovernor/not-pending-governor');
+    pendingGovernor = address(0);
+    governor = msg.sender;
+    emit SetGovernor(msg.sender);
+  }
+
+  /// @dev Updates the fee tiers scanned by registerPools. Registered pools are not affected.
+  /// @param _feeTiers The list of Uniswap V3 fee tiers to scan.
+  function setFeeTiers(uint24[] calldata _feeTiers) external {
+    require(msg.sender == governor, 'setFeeTiers/not-governor');
+    feeTiers = _feeTiers;
+    emit SetFeeTiers(_feeTiers);
+  }
+
+  /// @dev Registers, for each given token, its token-WETH pools across the configured fee tiers
+  /// that exist, have enough observation cardinality, and can serve a full TWAP period. Replaces
+  /// any previous registration. Tokens without an eligible pool end up with an empty list.
+  /// @param _tokens The list of tokens to (re-)register pools for.
+  function registerPools(address[] calldata _tokens) external {
+    require(msg.sender == governor, 'registerPools/not-governor');
+    uint24[] memory fees = feeTiers;
+    for (uint idx = 0; idx < _tokens.length; idx++) {
+      address token = _tokens[idx];
+      address[] memory eligible = new address[](fees.length);
+      uint count = 0;
+      for (uint fidx = 0; fidx < fees.length; fidx++) {
+        address pool = PoolAddress.computeAddress(
+          factory,
+          PoolAddress.getPoolKey(token, QUOTE_ADDRESS, fees[fidx])
+        );
+        if (_isEligiblePool(pool)) {
+          eligible[count++] = pool;
+        }
+      }
+      assembly {
+        mstore(eligible, count) // shrink to the eligible pools
+      }
+      pools[token] = eligible;
+      emit SetPools(token, eligible);
+    }
+  }
+
+  /// @dev Returns the registered pools of the given token.
+  /// @param _token The token to query.
+  function getPools(address _token) external view returns (address[] memory) {
+    return pools[_token];
+  }
+
+  /// @dev Returns whether the given pool exists and can serve a TWAP of twapPeriod.
+  /// @param _pool The pool to check.
+  function _isEligiblePool(address _pool) internal view returns (bool) {
+    if (!Address.isContract(_pool)) {
+      return false;
+    }
+    (, , , , uint16 observationCardinalityNext, , ) = IUniswapV3PoolState(_pool).slot0();
+    if (observationCardinalityNext < minCardinality) {
+      return false;
+    }
+    (bool ok, ) = _consult(_pool, _twapSecondsAgos());
+    return ok;
+  }
+
+  /// @dev Returns the observe arguments for a TWAP of twapPeriod up to now.
+  function _twapSecondsAgos() internal view returns (uint32[] memory secondsAgos) {
+    secondsAgos = new uint32[](2);
+    secondsAgos[0] = twapPeriod;
+    secondsAgos[1] = 0;
+  }
+
+  /// @dev Observes the given pool over twapPeriod, computing the same result as
+  /// WeightedOracleLibrary.consult without an external self-call. Returns false instead of
+  /// reverting if the pool cannot serve the observation.
+  /// @param _pool The pool to observe.
+  /// @param _secondsAgos The observe arguments, from _twapSecondsAgos.
+  function _consult(address _pool, uint32[] memory _secondsAgos)
+    internal
+    view
+    returns (bool ok, WeightedOracleLibrary.PeriodObservation memory observation)
+  {
+    try IUniswapV3PoolDerivedState(_pool).observe(_secondsAgos) returns (
+      int56[] memory tickCumulatives,
+      uint160[] memory secondsPerLiquidityCumulativeX128s
+    ) {
+      uint32 period = twapPeriod;
+      int56 tickCumulativesDelta = tickCumulatives[1] - tickCumulatives[0];
+      // We are shifting the liquidity delta to ensure that the result doesn't overflow uint128
+      uint192 liquidityDeltaX32 = uint192(
+        secondsPerLiquidityCumulativeX128s[1] - secondsPerLiquidityCumulativeX128s[0]
+      ) << 32;
+      if (liquidityDeltaX32 == 0) {
+        return (false, observation); // consult would revert on the division
+      }
+      observation.arithmeticMeanTick = int24(tickCumulativesDelta / period);
+      // Always round to negative infinity
+      if (tickCumulativesDelta < 0 && (tickCumulativesDelta % period != 0))
+        observation.arithmeticMeanTick--;
+      observation.harmonicMeanLiquidity = uint128(
+        (uint192(period) * type(uint160).max) / liquidityDeltaX32
+      );
+      ok = true;
+    } catch (bytes memory) {}
   }
 
   function consultWeightedOracle(address pool, uint32 period)
@@ -811,40 +945,75 @@ contract UniswapV3PriceOracle {
   }
 
   /// @dev Returns the price of the given asset in terms of ETH (wei), multiplied by 2**112.
+  /// Repeated queries in the same block are served from the price cache.
   /// @param _token The token to get asset price of.
   function getAssetETHPrice(address _token) public returns (uint) {
     if (_token == QUOTE_ADDRESS) {
       return BASE_AMOUNT;
     }
+    return _getAssetETHPrice(_token, _twapSecondsAgos());
+  }
+
+  /// @dev Returns the prices of the given assets in terms of ETH (wei), multiplied by 2**112.
+  /// The observe arguments are shared across all tokens of the batch.
+  /// @param _tokens The tokens to get asset prices of.
+  function getAssetETHPrices(address[] calldata _tokens) external returns (uint[] memory prices) {
+    prices = new uint[](_tokens.length);
+    uint32[] memory secondsAgos = _twapSecondsAgos();
+    for (uint idx = 0; idx < _tokens.length; idx++) {
+      address token = _tokens[idx];
+      prices[idx] = token == QUOTE_ADDRESS ? BASE_AMOUNT : _getAssetETHPrice(token, secondsAgos);
+    }
+  }
+
+  /// @dev Returns the cached price of the given non-quote asset, fetching and caching it if the
+  /// cache is stale.
+  /// @param _token The token to get asset price of.
+  /// @param _secondsAgos The observe arguments, from _twapSecondsAgos.
+  function _getAssetETHPrice(address _token, uint32[] memory _secondsAgos)
+    internal
+    returns (uint)
+  {
+    CachedPrice memory cached = cachedPrices[_token];
+    if (cached.blockNumber == uint32(block.number)) {
+      return cached.price;
+    }
+    uint price = _fetchAssetETHPrice(_token, _secondsAgos);
+    if (price <= type(uint224).max) {
+      cachedPrices[_token] = CachedPrice(uint224(price), uint32(block.number));
+    }
+    return price;
+  }
+
+  /// @dev Fetches the price of the given asset from the aggregate oracle or its registered
+  /// Uniswap V3 pools. Registered pools that fail to serve a TWAP are skipped.
+  /// @param _token The token to get asset price of.
+  /// @param _secondsAgos The observe arguments, from _twapSecondsAgos.
+  function _fetchAssetETHPrice(address _token, uint32[] memory _secondsAgos)
+    internal
+    view
+    returns (uint)
+  {
     if (aggOracle.primarySourceCount(_token) > 0) {
       return aggOracle.getETHPx(_token);
     }
 
-    uint24[3] memory fees = [uint24(10000), 3000, 500];
-    WeightedOracleLibrary.PeriodObservation[3] memory rawObs;
+    address[] memory tokenPools = pools[_token];
+    WeightedOracleLibrary.PeriodObservation[]
+      memory obs = new WeightedOracleLibrary.PeriodObservation[](tokenPools.length);
     uint obsCount = 0;
-    for (uint idx = 0; idx < fees.length; idx++) {
-      uint24 fee = fees[idx];
-      address pool = PoolAddress.computeAddress(
-        factory,
-        PoolAddress.getPoolKey(_token, QUOTE_ADDRESS, fee)
+    for (uint idx = 0; idx < tokenPools.length; idx++) {
+      (bool ok, WeightedOracleLibrary.PeriodObservation memory observation) = _consult(
+        tokenPools[idx],
+        _secondsAgos
       );
-      if (Address.isContract(pool)) {
-        (, , , , uint16 observationCardinalityNext, , ) = IUniswapV3PoolState(pool).slot0();
-        if (observationCardinalityNext >= minCardinality) {
-          try this.consultWeightedOracle(pool, twapPeriod) returns (
-            WeightedOracleLibrary.PeriodObservation memory observation
-          ) {
-            rawObs[obsCount++] = observation;
-          } catch (bytes memory) {}
-        }
+      if (ok) {
+        obs[obsCount++] = observation;
       }
     }
     require(obsCount > 0, 'no-obs');
-    WeightedOracleLibrary.PeriodObservation[]
-      memory obs = new WeightedOracleLibrary.PeriodObservation[](obsCount);
-    for (uint idx = 0; idx < obsCount; idx++) {
-      obs[idx] = rawObs[idx];
+    assembly {
+      mstore(obs, obsCount) // shrink to the successful observations
     }
     int24 tick = WeightedOracleLibrary.getArithmeticMeanTickWeightedByLiquidity(obs);
     return OracleLibrary.getQuoteAtTick(tick, BASE_AMOUNT, _token, QUOTE_ADDRESS);
@@ -3,10 +3,12 @@ pragma solidity 0.8.6;
 
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/access/Ownable.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/IERC20.sol';
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/extensions/draft-IERC20Permit.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/utils/SafeERC20.sol';
 import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/utils/math/Math.sol';
 
 import '../interfaces/IBetaBank.sol';
+import '../interfaces/IBetaConfig.sol';
 import '../interfaces/IWETH.sol';
 
 contract BetaRunnerBase is Ownable {
@@ -15,6 +17,15 @@ contract BetaRunnerBase is Ownable {
   address public immutable betaBank;
   address public immutable weth;
 
+  /// @dev EIP-2612 permit from the sender to this runner, consumed by the *WithPermit entry points.
+  struct Permit {
+    uint value;
+    uint deadline;
+    uint8 v;
+    bytes32 r;
+    bytes32 s;
+  }
+
   modifier onlyEOA() {
     require(msg.sender == tx.origin, 'BetaRunnerBase/not-eoa');
     _;
@@ -65,6 +76,33 @@ contract BetaRunnerBase is Ownable {
     IBetaBank(betaBank).take(_owner, _pid, _amountCollateral);
   }
 
+  function _liquidate(
+    address _owner,
+    uint _pid,
+    address _underlying,
+    address _collateral,
+    uint _amountRepay
+  ) internal {
+    (address collateral, address bToken) = IBetaBank(betaBank).getPositionTokens(_owner, _pid);
+    require(_collateral == collateral, '_liquidate/collateral-not-_collateral');
+    require(_underlying == IBetaBank(betaBank).underlyings(bToken), '_liquidate/bad-underlying');
+    _approve(_underlying, bToken, _amountRepay);
+    IBetaBank(betaBank).liquidate(_owner, _pid, _amountRepay);
+  }
+
+  /// @dev Calls the given token's EIP-2612 permit for the sender to approve this runner.
+  function _permit(address _token, Permit calldata _permitData) internal {
+    IERC20Permit(_token).permit(
+      msg.sender,
+      address(this),
+      _permitData.value,
+      _permitData.deadline,
+      _permitData.v,
+      _permitData.r,
+      _permitData.s
+    );
+  }
+
   function _transferIn(
     address _token,
     address _from,
@@ -112,6 +150,34 @@ contract BetaRunnerBase is Ownable {
     }
   }
 
+  /// @dev Returns the current debt and collateral size of the given position, or zeros for a new one.
+  function _fetchPositionSizes(address _owner, uint _pid)
+    internal
+    returns (uint debt, uint collateralSize)
+  {
+    if (_pid == type(uint).max) {
+      return (0, 0);
+    }
+    debt = IBetaBank(betaBank).fetchPositionDebt(_owner, _pid);
+    (, , , , collateralSize, ) = IBetaBank(betaBank).positions(_owner, _pid);
+  }
+
+  /// @dev Returns the debt to repay by selling collateral for the position to reach the target LTV.
+  /// Selling collateral worth v to repay v of debt moves LTV from d / c to (d - v) / (c - v * cf),
+  /// ignoring swap fees and price impact, so the resulting LTV ends up slightly above the target.
+  function _fetchDeleverageRepay(
+    address _owner,
+    uint _pid,
+    uint _targetLTV
+  ) internal returns (uint) {
+    uint ltv = IBetaBank(betaBank).fetchPositionLTV(_owner, _pid);
+    require(ltv > _targetLTV, '_fetchDeleverageRepay/below-target-ltv');
+    (address collateral, ) = IBetaBank(betaBank).getPositionTokens(_owner, _pid);
+    uint collFactor = IBetaConfig(IBetaBank(betaBank).config()).getCollFactor(collateral);
+    uint debt = IBetaBank(betaBank).fetchPositionDebt(_owner, _pid);
+    return (debt * (ltv - _targetLTV) * 1e18) / (ltv * (1e18 - (_targetLTV * collFactor) / 1e18));
+  }
+
   /// @dev Caps repay amount by current position's debt.
   function _capRepay(
     address _owner,
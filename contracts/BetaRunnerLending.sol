@@ -13,7 +13,7 @@ contract BetaRunnerLending is BetaRunnerBase {
     address _collateral,
     uint _amountBorrow,
     uint _amountPut
-  ) external payable onlyEOA {
+  ) public payable onlyEOA {
     _transferIn(_collateral, msg.sender, _amountPut);
     _borrow(msg.sender, _pid, _underlying, _collateral, _amountBorrow, _amountPut);
     _transferOut(_underlying, msg.sender, _amountBorrow);
@@ -26,10 +26,36 @@ contract BetaRunnerLending is BetaRunnerBase {
     address _collateral,
     uint _amountRepay,
     uint _amountTake
-  ) external payable onlyEOA {
+  ) public payable onlyEOA {
     _amountRepay = _capRepay(msg.sender, _pid, _amountRepay);
     _transferIn(_underlying, msg.sender, _amountRepay);
     _repay(msg.sender, _pid, _underlying, _collateral, _amountRepay, _amountTake);
     _transferOut(_collateral, msg.sender, _amountTake);
   }
+
+  /// @dev Similar to borrow function, but with an additional call to the collateral's EIP-2612 permit.
+  function borrowWithPermit(
+    uint _pid,
+    address _underlying,
+    address _collateral,
+    uint _amountBorrow,
+    uint _amountPut,
+    Permit calldata _permitData
+  ) external {
+    _permit(_collateral, _permitData);
+    borrow(_pid, _underlying, _collateral, _amountBorrow, _amountPut);
+  }
+
+  /// @dev Similar to repay function, but with an additional call to the underlying's EIP-2612 permit.
+  function repayWithPermit(
+    uint _pid,
+    address _underlying,
+    address _collateral,
+    uint _amountRepay,
+    uint _amountTake,
+    Permit calldata _permitData
+  ) external {
+    _permit(_underlying, _permitData);
+    repay(_pid, _underlying, _collateral, _amountRepay, _amountTake);
+  }
 }
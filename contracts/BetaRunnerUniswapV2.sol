@@ -5,7 +5,6 @@ import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/utils/Sa
 
 import './BetaRunnerBase.sol';
 import './BetaRunnerWithCallback.sol';
-import './libraries/SafeCast.sol';
 import '../interfaces/IUniswapV2Pair.sol';
 import '../interfaces/IUniswapV2Callee.sol';
 import '../interfaces/IPancakeCallee.sol';
@@ -16,7 +15,6 @@ contract BetaRunnerUniswapV2 is
   IUniswapV2Callee,
   IPancakeCallee
 {
-  using SafeCast for uint;
   using SafeERC20 for IERC20;
 
   address public immutable factory;
@@ -32,12 +30,16 @@ contract BetaRunnerUniswapV2 is
     codeHash = _codeHash;
   }
 
-  struct CallbackData {
-    uint pid;
-    int memo; // positive if short (extra collateral) | negative if close (amount to take)
-    address[] path;
-    uint[] amounts;
-  }
+  uint8 internal constant SHORT = 0;
+  uint8 internal constant CLOSE = 1;
+  uint8 internal constant LIQUIDATE = 2;
+
+  /// Packed callback data: action (1) | owner (20) | pid (32) | memo (32), where owner is the
+  /// position owner to liquidate or zero, and memo is the extra collateral (short), the amount to
+  /// take (close) or the min profit (liquidate). Then, for each path token, token (20) |
+  /// amount (32) | pair (20) to the next token, without the pair for the last token.
+  uint internal constant HEADER_SIZE = 85;
+  uint internal constant HOP_SIZE = 72;
 
   function short(
     uint _pid,
@@ -45,18 +47,11 @@ contract BetaRunnerUniswapV2 is
     uint _amountPutExtra,
     address[] memory _path,
     uint _amountOutMin
-  ) external payable onlyEOA withCallback {
+  ) public payable onlyEOA withCallback {
     _transferIn(_path[_path.length - 1], msg.sender, _amountPutExtra);
-    uint[] memory amounts = _getAmountsOut(_amountBorrow, _path);
+    (uint[] memory amounts, address[] memory pairs) = _getAmountsOut(_amountBorrow, _path);
     require(amounts[amounts.length - 1] >= _amountOutMin, 'short/not-enough-out');
-    IUniswapV2Pair(_pairFor(_path[0], _path[1])).swap(
-      _path[0] < _path[1] ? 0 : amounts[1],
-      _path[0] < _path[1] ? amounts[1] : 0,
-      address(this),
-      abi.encode(
-        CallbackData({pid: _pid, memo: _amountPutExtra.toInt256(), path: _path, amounts: amounts})
-      )
-    );
+    _flashSwap(SHORT, address(0), _pid, _amountPutExtra, _path, pairs, amounts);
   }
 
   function close(
@@ -67,18 +62,182 @@ contract BetaRunnerUniswapV2 is
     uint _amountInMax
   ) external payable onlyEOA withCallback {
     _amountRepay = _capRepay(msg.sender, _pid, _amountRepay);
-    uint[] memory amounts = _getAmountsIn(_amountRepay, _path);
+    (uint[] memory amounts, address[] memory pairs) = _getAmountsIn(_amountRepay, _path);
     require(amounts[0] <= _amountInMax, 'close/too-much-in');
-    IUniswapV2Pair(_pairFor(_path[0], _path[1])).swap(
-      _path[0] < _path[1] ? 0 : amounts[1],
-      _path[0] < _path[1] ? amounts[1] : 0,
+    _flashSwap(CLOSE, address(0), _pid, _amountTake, _path, pairs, amounts);
+  }
+
+  /// @dev Brings the sender's position to the given debt and collateral sizes with one flash swap,
+  /// one put and one borrow. The missing debt is borrowed and swapped to collateral along the
+  /// given path. All swapped collateral is put, so the position may end above the target
+  /// collateral, and only the collateral still missing is pulled from the sender.
+  /// @param _pid The position id, or MAX_UINT256 to open a new position.
+  /// @param _targetDebt The debt size to reach. Must be above the current debt.
+  /// @param _targetCollateral The collateral size to reach, at least.
+  /// @param _path The swap path from the underlying to the collateral token.
+  /// @param _amountPutMax The maximum amount of collateral to pull from the sender.
+  function leverage(
+    uint _pid,
+    uint _targetDebt,
+    uint _targetCollateral,
+    address[] memory _path,
+    uint _amountPutMax
+  ) public payable onlyEOA withCallback {
+    (uint debt, uint collateralSize) = _fetchPositionSizes(msg.sender, _pid);
+    require(_targetDebt > debt, 'leverage/bad-target-debt');
+    (uint[] memory amounts, address[] memory pairs) = _getAmountsOut(_targetDebt - debt, _path);
+    uint amountPut = collateralSize + amounts[amounts.length - 1];
+    uint amountPutExtra = _targetCollateral > amountPut ? _targetCollateral - amountPut : 0;
+    require(amountPutExtra <= _amountPutMax, 'leverage/too-much-put');
+    _transferIn(_path[_path.length - 1], msg.sender, amountPutExtra);
+    _flashSwap(SHORT, address(0), _pid, amountPutExtra, _path, pairs, amounts);
+  }
+
+  /// @dev Brings the sender's position down to about the given LTV with one flash swap, one repay
+  /// and one take. Exactly the collateral needed for the swap is taken out of the position.
+  /// @param _pid The position id.
+  /// @param _targetLTV The LTV to reach, multiplied by 1e18. Swap fees leave it slightly above.
+  /// @param _path The swap path from the collateral to the underlying token.
+  /// @param _amountInMax The maximum amount of collateral to sell.
+  function deleverage(
+    uint _pid,
+    uint _targetLTV,
+    address[] memory _path,
+    uint _amountInMax
+  ) external onlyEOA withCallback {
+    uint amountRepay = _fetchDeleverageRepay(msg.sender, _pid, _targetLTV);
+    (uint[] memory amounts, address[] memory pairs) = _getAmountsIn(amountRepay, _path);
+    require(amounts[0] <= _amountInMax, 'deleverage/too-much-in');
+    _flashSwap(CLOSE, address(0), _pid, amounts[0], _path, pairs, amounts);
+  }
+
+  /// @dev Liquidates the given position with underlying flash-swapped from the collateral along
+  /// the given path. The seized collateral pays for the swap, and the rest is sent to the sender.
+  /// @param _owner The position owner to be liquidated.
+  /// @param _pid The position id to be liquidated.
+  /// @param _amountRepay The amount of debt to repay. Must not exceed half debt (rounded up).
+  /// @param _path The swap path from the collateral to the underlying token.
+  /// @param _minProfit The minimum amount of collateral to keep after paying for the swap.
+  function liquidate(
+    address _owner,
+    uint _pid,
+    uint _amountRepay,
+    address[] memory _path,
+    uint _minProfit
+  ) external onlyEOA withCallback {
+    require(_owner != address(0), 'liquidate/zero-owner');
+    (uint[] memory amounts, address[] memory pairs) = _getAmountsIn(_amountRepay, _path);
+    _flashSwap(LIQUIDATE, _owner, _pid, _minProfit, _path, pairs, amounts);
+  }
+
+  /// @dev Similar to short function, but with an additional call to the collateral's EIP-2612 permit.
+  function shortWithPermit(
+    uint _pid,
+    uint _amountBorrow,
+    uint _amountPutExtra,
+    address[] memory _path,
+    uint _amountOutMin,
+    Permit calldata _permitData
+  ) external {
+    _permit(_path[_path.length - 1], _permitData);
+    short(_pid, _amountBorrow, _amountPutExtra, _path, _amountOutMin);
+  }
+
+  /// @dev Similar to leverage function, but with an additional call to the collateral's EIP-2612 permit.
+  function leverageWithPermit(
+    uint _pid,
+    uint _targetDebt,
+    uint _targetCollateral,
+    address[] memory _path,
+    uint _amountPutMax,
+    Permit calldata _permitData
+  ) external {
+    _permit(_path[_path.length - 1], _permitData);
+    leverage(_pid, _targetDebt, _targetCollateral, _path, _amountPutMax);
+  }
+
+  /// @dev Flash-swaps out of the first pair of the path, continuing the action in the callback.
+  function _flashSwap(
+    uint8 _action,
+    address _owner,
+    uint _pid,
+    uint _memo,
+    address[] memory _path,
+    address[] memory _pairs,
+    uint[] memory _amounts
+  ) internal {
+    IUniswapV2Pair(_pairs[0]).swap(
+      _path[0] < _path[1] ? 0 : _amounts[1],
+      _path[0] < _path[1] ? _amounts[1] : 0,
       address(this),
-      abi.encode(
-        CallbackData({pid: _pid, memo: -_amountTake.toInt256(), path: _path, amounts: amounts})
-      )
+      _encodeCallbackData(_action, _owner, _pid, _memo, _path, _pairs, _amounts)
     );
   }
 
+  /// @dev Packs the callback data, see HEADER_SIZE and HOP_SIZE for the layout.
+  function _encodeCallbackData(
+    uint8 _action,
+    address _owner,
+    uint _pid,
+    uint _memo,
+    address[] memory _path,
+    address[] memory _pairs,
+    uint[] memory _amounts
+  ) internal pure returns (bytes memory data) {
+    uint len = _path.length;
+    data = new bytes(HEADER_SIZE + len * HOP_SIZE - 20);
+    assembly {
+      // every word written spills over into bytes that are written next, except the last one
+      let ptr := add(data, 32)
+      mstore(ptr, shl(248, _action))
+      mstore(add(ptr, 1), shl(96, _owner))
+      mstore(add(ptr, 21), _pid)
+      mstore(add(ptr, 53), _memo)
+      ptr := add(ptr, 85) // HEADER_SIZE
+      for {
+        let idx := 0
+      } lt(idx, len) {
+        idx := add(idx, 1)
+      } {
+        let offset := mul(add(idx, 1), 32)
+        mstore(ptr, shl(96, mload(add(_path, offset))))
+        mstore(add(ptr, 20), mload(add(_amounts, offset)))
+        if lt(idx, sub(len, 1)) {
+          mstore(add(ptr, 52), shl(96, mload(add(_pairs, offset))))
+        }
+        ptr := add(ptr, 72) // HOP_SIZE
+      }
+    }
+  }
+
+  /// @dev Returns the position id of the packed callback data.
+  function _pidOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[21:53]));
+  }
+
+  /// @dev Returns the memo of the packed callback data.
+  function _memoOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[53:85]));
+  }
+
+  /// @dev Returns the path token at the given index of the packed callback data.
+  function _tokenAt(bytes calldata data, uint idx) internal pure returns (address) {
+    uint offset = HEADER_SIZE + idx * HOP_SIZE;
+    return address(bytes20(data[offset:offset + 20]));
+  }
+
+  /// @dev Returns the swap amount at the given index of the packed callback data.
+  function _amountAt(bytes calldata data, uint idx) internal pure returns (uint) {
+    uint offset = HEADER_SIZE + idx * HOP_SIZE + 20;
+    return uint(bytes32(data[offset:offset + 32]));
+  }
+
+  /// @dev Returns the pair from the path token at the given index to the next one.
+  function _pairAt(bytes calldata data, uint idx) internal pure returns (address) {
+    uint offset = HEADER_SIZE + idx * HOP_SIZE + 52;
+    return address(bytes20(data[offset:offset + 20]));
+  }
+
   /// @dev Continues the action (uniswap / sushiswap)
   function uniswapV2Call(
     address sender,
@@ -101,37 +260,59 @@ contract BetaRunnerUniswapV2 is
     _pairCallback(data);
   }
 
-  /// @dev Continues the action (uniswap / sushiswap / pancakeswap)
+  /// @dev Continues the action (uniswap / sushiswap / pancakeswap). Only the first pair is checked
+  /// against the factory: it proves the data comes from this contract, which computed the others.
   function _pairCallback(bytes calldata data) internal {
-    CallbackData memory cb = abi.decode(data, (CallbackData));
-    require(msg.sender == _pairFor(cb.path[0], cb.path[1]), '_pairCallback/bad-caller');
-    uint len = cb.path.length;
+    uint len = (data.length + 20 - HEADER_SIZE) / HOP_SIZE;
+    address input = _tokenAt(data, 1);
+    require(msg.sender == _pairFor(_tokenAt(data, 0), input), '_pairCallback/bad-caller');
     if (len > 2) {
-      address pair = _pairFor(cb.path[1], cb.path[2]);
-      IERC20(cb.path[1]).safeTransfer(pair, cb.amounts[1]);
+      address pair = _pairAt(data, 1);
+      IERC20(input).safeTransfer(pair, _amountAt(data, 1));
       for (uint idx = 1; idx < len - 1; idx++) {
-        (address input, address output) = (cb.path[idx], cb.path[idx + 1]);
-        address to = idx < len - 2 ? _pairFor(output, cb.path[idx + 2]) : address(this);
-        uint amount0Out = input < output ? 0 : cb.amounts[idx + 1];
-        uint amount1Out = input < output ? cb.amounts[idx + 1] : 0;
+        address output = _tokenAt(data, idx + 1);
+        address to = idx < len - 2 ? _pairAt(data, idx + 1) : address(this);
+        uint amountOut = _amountAt(data, idx + 1);
+        uint amount0Out = input < output ? 0 : amountOut;
+        uint amount1Out = input < output ? amountOut : 0;
         IUniswapV2Pair(pair).swap(amount0Out, amount1Out, to, new bytes(0));
-        pair = to;
+        (input, pair) = (output, to);
       }
     }
-    if (cb.memo > 0) {
-      uint amountCollateral = uint(cb.memo);
-      (address und, address col) = (cb.path[0], cb.path[len - 1]);
-      _borrow(tx.origin, cb.pid, und, col, cb.amounts[0], cb.amounts[len - 1] + amountCollateral);
-      IERC20(und).safeTransfer(msg.sender, cb.amounts[0]);
+    uint8 action = uint8(data[0]);
+    if (action == SHORT) {
+      _shortCallback(data, len);
+    } else if (action == CLOSE) {
+      _closeCallback(data, len);
     } else {
-      uint amountTake = uint(-cb.memo);
-      (address und, address col) = (cb.path[len - 1], cb.path[0]);
-      _repay(tx.origin, cb.pid, und, col, cb.amounts[len - 1], amountTake);
-      IERC20(col).safeTransfer(msg.sender, cb.amounts[0]);
-      _transferOut(col, tx.origin, IERC20(col).balanceOf(address(this)));
+      _liquidateCallback(data, len);
     }
   }
 
+  function _shortCallback(bytes calldata data, uint len) internal {
+    (address und, address col) = (_tokenAt(data, 0), _tokenAt(data, len - 1));
+    uint amountPut = _amountAt(data, len - 1) + _memoOf(data);
+    _borrow(tx.origin, _pidOf(data), und, col, _amountAt(data, 0), amountPut);
+    IERC20(und).safeTransfer(msg.sender, _amountAt(data, 0));
+  }
+
+  function _closeCallback(bytes calldata data, uint len) internal {
+    (address und, address col) = (_tokenAt(data, len - 1), _tokenAt(data, 0));
+    _repay(tx.origin, _pidOf(data), und, col, _amountAt(data, len - 1), _memoOf(data));
+    IERC20(col).safeTransfer(msg.sender, _amountAt(data, 0));
+    _transferOut(col, tx.origin, IERC20(col).balanceOf(address(this)));
+  }
+
+  function _liquidateCallback(bytes calldata data, uint len) internal {
+    (address und, address col) = (_tokenAt(data, len - 1), _tokenAt(data, 0));
+    address owner = address(bytes20(data[1:21]));
+    _liquidate(owner, _pidOf(data), und, col, _amountAt(data, len - 1));
+    IERC20(col).safeTransfer(msg.sender, _amountAt(data, 0));
+    uint profit = IERC20(col).balanceOf(address(this));
+    require(profit >= _memoOf(data), 'liquidate/not-enough-profit');
+    _transferOut(col, tx.origin, profit);
+  }
+
   /// Internal UniswapV2 library functions
   /// See https://github.com/Uniswap/uniswap-v2-periphery/blob/master/contracts/libraries/UniswapV2Library.sol
   function _sortTokens(address tokenA, address tokenB)
@@ -150,14 +331,13 @@ contract BetaRunnerUniswapV2 is
     return address(uint160(uint(keccak256(abi.encodePacked(hex'ff', factory, salt, codeHash)))));
   }
 
-  function _getReserves(address tokenA, address tokenB)
-    internal
-    view
-    returns (uint reserveA, uint reserveB)
-  {
-    (address token0, ) = _sortTokens(tokenA, tokenB);
-    (uint reserve0, uint reserve1, ) = IUniswapV2Pair(_pairFor(tokenA, tokenB)).getReserves();
-    (reserveA, reserveB) = tokenA == token0 ? (reserve0, reserve1) : (reserve1, reserve0);
+  function _getReserves(
+    address pair,
+    address tokenA,
+    address tokenB
+  ) internal view returns (uint reserveA, uint reserveB) {
+    (uint reserve0, uint reserve1, ) = IUniswapV2Pair(pair).getReserves();
+    (reserveA, reserveB) = tokenA < tokenB ? (reserve0, reserve1) : (reserve1, reserve0);
   }
 
   function _getAmountOut(
@@ -185,30 +365,36 @@ contract BetaRunnerUniswapV2 is
     amountIn = (numerator / denominator) + 1;
   }
 
+  /// @dev Also returns the pairs along the path, each derived from the factory exactly once.
   function _getAmountsOut(uint amountIn, address[] memory path)
     internal
     view
-    returns (uint[] memory amounts)
+    returns (uint[] memory amounts, address[] memory pairs)
   {
     require(path.length >= 2, 'INVALID_PATH');
     amounts = new uint[](path.length);
+    pairs = new address[](path.length - 1);
     amounts[0] = amountIn;
     for (uint i; i < path.length - 1; i++) {
-      (uint reserveIn, uint reserveOut) = _getReserves(path[i], path[i + 1]);
+      pairs[i] = _pairFor(path[i], path[i + 1]);
+      (uint reserveIn, uint reserveOut) = _getReserves(pairs[i], path[i], path[i + 1]);
       amounts[i + 1] = _getAmountOut(amounts[i], reserveIn, reserveOut);
     }
   }
 
+  /// @dev Also returns the pairs along the path, each derived from the factory exactly once.
   function _getAmountsIn(uint amountOut, address[] memory path)
     internal
     view
-    returns (uint[] memory amounts)
+    returns (uint[] memory amounts, address[] memory pairs)
   {
     require(path.length >= 2, 'INVALID_PATH');
     amounts = new uint[](path.length);
+    pairs = new address[](path.length - 1);
     amounts[amounts.length - 1] = amountOut;
     for (uint i = path.length - 1; i > 0; i--) {
-      (uint reserveIn, uint reserveOut) = _getReserves(path[i - 1], path[i]);
+      pairs[i - 1] = _pairFor(path[i - 1], path[i]);
+      (uint reserveIn, uint reserveOut) = _getReserves(pairs[i - 1], path[i - 1], path[i]);
       amounts[i - 1] = _getAmountIn(amounts[i], reserveIn, reserveOut);
     }
   }
@@ -12,6 +12,7 @@ import '../interfaces/IUniswapV3SwapCallback.sol';
 
 contract BetaRunnerUniswapV3 is BetaRunnerBase, BetaRunnerWithCallback, IUniswapV3SwapCallback {
   using SafeERC20 for IERC20;
+  using BytesLib for bytes;
   using Path for bytes;
   using SafeCast for uint;
 
@@ -33,6 +34,12 @@ contract BetaRunnerUniswapV3 is BetaRunnerBase, BetaRunnerWithCallback, IUniswap
     codeHash = _codeHash;
   }
 
+  uint8 internal constant SHORT = 0;
+  uint8 internal constant CLOSE = 1;
+  uint8 internal constant LIQUIDATE = 2;
+  uint8 internal constant LEVERAGE = 3;
+  uint8 internal constant DELEVERAGE = 4;
+
   struct ShortData {
     uint pid;
     uint amountBorrow;
@@ -49,59 +56,169 @@ contract BetaRunnerUniswapV3 is BetaRunnerBase, BetaRunnerWithCallback, IUniswap
     uint amountInMax;
   }
 
-  struct CallbackData {
+  struct LeverageData {
+    uint pid;
+    uint targetDebt;
+    uint targetCollateral;
+    bytes path;
+    uint amountPutMax;
+  }
+
+  struct DeleverageData {
+    uint pid;
+    uint targetLTV;
+    bytes path;
+    uint amountInMax;
+  }
+
+  struct LiquidateData {
+    address owner;
     uint pid;
-    address path0;
-    uint amount0;
-    int memo; // positive if short (extra collateral) | negative if close (amount to take)
+    uint amountRepay;
     bytes path;
+    uint minProfit;
   }
 
+  /// Packed callback data: action (1) | owner (20) | pid (32) | amount0 (32) | memo (32) |
+  /// putMax (32) | cursor (32), followed by the full swap path. Owner is the position owner to
+  /// liquidate or zero, amount0 the amount borrowed (short, leverage) or repaid (close, deleverage,
+  /// liquidate), and memo the extra collateral (short), the min collateral to put (leverage), the
+  /// amount to take (close) or the min profit (liquidate). putMax is the max collateral to pull
+  /// from the sender (leverage) or zero. Cursor is the offset of the current pool in the data,
+  /// so each hop moves it forward instead of slicing and re-encoding the path.
+  uint internal constant HEADER_SIZE = 181;
+
   /// @dev Borrows the asset using the given collateral, and swaps it using the given path.
-  function short(ShortData calldata _data) external payable onlyEOA withCallback {
-    (, address collateral, ) = _data.path.decodeLastPool();
+  function short(ShortData calldata _data) public payable onlyEOA withCallback {
+    address collateral = _data.path.decodeLastToken();
     _transferIn(collateral, msg.sender, _data.amountPutExtra);
-    (address tokenIn, address tokenOut, uint24 fee) = _data.path.decodeFirstPool();
+    uint amountReceived = _swapExactIn(
+      SHORT,
+      _data.pid,
+      _data.amountBorrow,
+      _data.amountPutExtra,
+      0,
+      _data.path
+    );
+    require(amountReceived >= _data.amountOutMin, '!slippage');
+  }
+
+  /// @dev Swaps the collateral to the underlying asset using the given path, and repays it to the pool.
+  function close(CloseData calldata _data) external payable onlyEOA withCallback {
+    uint amountRepay = _capRepay(msg.sender, _data.pid, _data.amountRepay);
+    uint amountPaid = _swapExactOut(
+      CLOSE,
+      address(0),
+      _data.pid,
+      amountRepay,
+      _data.amountTake,
+      _data.path
+    );
+    require(amountPaid <= _data.amountInMax, '!slippage');
+  }
+
+  /// @dev Brings the sender's position to the given debt and collateral sizes with one swap,
+  /// one put and one borrow. The missing debt is borrowed and swapped to collateral along the
+  /// given path. All swapped collateral is put, so the position may end above the target
+  /// collateral, and only the collateral still missing is pulled from the sender, up to
+  /// amountPutMax. For ETH collateral, the missing amount is wrapped from the ETH sent along,
+  /// and the unused ETH is refunded.
+  function leverage(LeverageData calldata _data) public payable onlyEOA withCallback {
+    (uint debt, uint collateralSize) = _fetchPositionSizes(msg.sender, _data.pid);
+    require(_data.targetDebt > debt, 'leverage/bad-target-debt');
+    uint amountPut = _data.targetCollateral > collateralSize
+      ? _data.targetCollateral - collateralSize
+      : 0;
+    uint amountPutMax = _data.amountPutMax;
+    if (_data.path.decodeLastToken() == weth) {
+      amountPutMax = Math.min(amountPutMax, msg.value);
+    }
+    uint ethBalance = address(this).balance; // ETH wrapped in the callback is the ETH used
+    _swapExactIn(LEVERAGE, _data.pid, _data.targetDebt - debt, amountPut, amountPutMax, _data.path);
+    uint refund = msg.value - (ethBalance - address(this).balance);
+    if (refund > 0) {
+      (bool success, ) = msg.sender.call{value: refund}(new bytes(0));
+      require(success, 'leverage/eth-transfer-failed');
+    }
+  }
+
+  /// @dev Brings the sender's position down to about the given LTV with one swap, one repay and
+  /// one take. Exactly the collateral paid for the swap is taken out of the position. Swap fees
+  /// leave the LTV slightly above the target.
+  function deleverage(DeleverageData calldata _data) external onlyEOA withCallback {
+    uint amountRepay = _fetchDeleverageRepay(msg.sender, _data.pid, _data.targetLTV);
+    uint amountPaid = _swapExactOut(DELEVERAGE, address(0), _data.pid, amountRepay, 0, _data.path);
+    require(amountPaid <= _data.amountInMax, '!slippage');
+  }
+
+  /// @dev Liquidates the given position with underlying flash-swapped from the collateral along
+  /// the given path (underlying first). The seized collateral pays for the swap, and the rest is
+  /// sent to the sender.
+  function liquidate(LiquidateData calldata _data) external onlyEOA withCallback {
+    require(_data.owner != address(0), 'liquidate/zero-owner');
+    _swapExactOut(
+      LIQUIDATE,
+      _data.owner,
+      _data.pid,
+      _data.amountRepay,
+      _data.minProfit,
+      _data.path
+    );
+  }
+
+  /// @dev Similar to short function, but with an additional call to the collateral's EIP-2612 permit.
+  function shortWithPermit(ShortData calldata _data, Permit calldata _permitData) external {
+    _permit(_data.path.decodeLastToken(), _permitData);
+    short(_data);
+  }
+
+  /// @dev Similar to leverage function, but with an additional call to the collateral's EIP-2612 permit.
+  function leverageWithPermit(LeverageData calldata _data, Permit calldata _permitData) external {
+    _permit(_data.path.decodeLastToken(), _permitData);
+    leverage(_data);
+  }
+
+  /// @dev Swaps the given amount of the first token of the path, continuing the action in the callback.
+  function _swapExactIn(
+    uint8 _action,
+    uint _pid,
+    uint _amountIn,
+    uint _memo,
+    uint _putMax,
+    bytes calldata _path
+  ) internal returns (uint amountReceived) {
+    (address tokenIn, address tokenOut, uint24 fee) = _path.decodePoolAt(0);
     bool zeroForOne = tokenIn < tokenOut;
-    CallbackData memory cb = CallbackData({
-      pid: _data.pid,
-      path0: tokenIn,
-      amount0: _data.amountBorrow,
-      memo: _data.amountPutExtra.toInt256(),
-      path: _data.path
-    });
     (int amount0, int amount1) = IUniswapV3Pool(_poolFor(tokenIn, tokenOut, fee)).swap(
       address(this),
       zeroForOne,
-      _data.amountBorrow.toInt256(),
+      _amountIn.toInt256(),
       zeroForOne ? MIN_SQRT_RATIO + 1 : MAX_SQRT_RATIO - 1,
-      abi.encode(cb)
+      abi.encodePacked(_action, address(0), _pid, _amountIn, _memo, _putMax, HEADER_SIZE, _path)
     );
-    uint amountReceived = amount0 > 0 ? uint(-amount1) : uint(-amount0);
-    require(amountReceived >= _data.amountOutMin, '!slippage');
+    amountReceived = amount0 > 0 ? uint(-amount1) : uint(-amount0);
   }
 
-  /// @dev Swaps the collateral to the underlying asset using the given path, and repays it to the pool.
-  function close(CloseData calldata _data) external payable onlyEOA withCallback {
-    uint amountRepay = _capRepay(msg.sender, _data.pid, _data.amountRepay);
-    (address tokenOut, address tokenIn, uint24 fee) = _data.path.decodeFirstPool();
+  /// @dev Swaps for the given amount of the first token of the path, continuing the action in the
+  /// callback. Returns the amount paid to the first pool.
+  function _swapExactOut(
+    uint8 _action,
+    address _owner,
+    uint _pid,
+    uint _amountOut,
+    uint _memo,
+    bytes calldata _path
+  ) internal returns (uint amountPaid) {
+    (address tokenOut, address tokenIn, uint24 fee) = _path.decodePoolAt(0);
     bool zeroForOne = tokenIn < tokenOut;
-    CallbackData memory cb = CallbackData({
-      pid: _data.pid,
-      path0: tokenOut,
-      amount0: amountRepay,
-      memo: -_data.amountTake.toInt256(),
-      path: _data.path
-    });
     (int amount0, int amount1) = IUniswapV3Pool(_poolFor(tokenIn, tokenOut, fee)).swap(
       address(this),
       zeroForOne,
-      -amountRepay.toInt256(),
+      -_amountOut.toInt256(),
       zeroForOne ? MIN_SQRT_RATIO + 1 : MAX_SQRT_RATIO - 1,
-      abi.encode(cb)
+      abi.encodePacked(_action, _owner, _pid, _amountOut, _memo, uint(0), HEADER_SIZE, _path)
     );
-    uint amountPaid = amount0 > 0 ? uint(amount0) : uint(amount1);
-    require(amountPaid <= _data.amountInMax, '!slippage');
+    amountPaid = amount0 > 0 ? uint(amount0) : uint(amount1);
   }
 
   /// @dev Continues the action through uniswapv3
@@ -110,65 +227,141 @@ contract BetaRunnerUniswapV3 is BetaRunnerBase, BetaRunnerWithCallback, IUniswap
     int _amount1Delta,
     bytes calldata _data
   ) external override isCallback {
-    CallbackData memory data = abi.decode(_data, (CallbackData));
     (uint amountToPay, uint amountReceived) = _amount0Delta > 0
       ? (uint(_amount0Delta), uint(-_amount1Delta))
       : (uint(_amount1Delta), uint(-_amount0Delta));
-    if (data.memo > 0) {
-      _shortCallback(amountToPay, amountReceived, data);
+    uint8 action = _actionOf(_data);
+    if (action == SHORT || action == LEVERAGE) {
+      _shortCallback(amountToPay, amountReceived, _data);
     } else {
-      _closeCallback(amountToPay, amountReceived, data);
+      _closeCallback(amountToPay, _data);
     }
   }
 
   function _shortCallback(
     uint _amountToPay,
     uint _amountReceived,
-    CallbackData memory data
+    bytes calldata data
   ) internal {
-    (address tokenIn, address tokenOut, uint24 prevFee) = data.path.decodeFirstPool();
-    require(msg.sender == _poolFor(tokenIn, tokenOut, prevFee), '_shortCallback/bad-caller');
-    if (data.path.hasMultiplePools()) {
-      data.path = data.path.skipToken();
-      (, address tokenNext, uint24 fee) = data.path.decodeFirstPool();
+    uint cursor = _cursorOf(data);
+    (address tokenIn, address tokenOut, uint24 fee) = data.decodePoolAt(cursor);
+    require(msg.sender == _poolFor(tokenIn, tokenOut, fee), '_shortCallback/bad-caller');
+    if (data.hasMultiplePoolsAt(cursor)) {
+      cursor = Path.skipTokenAt(cursor);
+      address tokenNext;
+      (, tokenNext, fee) = data.decodePoolAt(cursor);
       bool zeroForOne = tokenOut < tokenNext;
       IUniswapV3Pool(_poolFor(tokenOut, tokenNext, fee)).swap(
         address(this),
         zeroForOne,
         _amountReceived.toInt256(),
         zeroForOne ? MIN_SQRT_RATIO + 1 : MAX_SQRT_RATIO - 1,
-        abi.encode(data)
+        _withCursor(data, cursor)
       );
     } else {
-      uint amountPut = _amountReceived + uint(data.memo);
-      _borrow(tx.origin, data.pid, data.path0, tokenOut, data.amount0, amountPut);
+      uint amountPut = _memoOf(data);
+      if (_actionOf(data) == SHORT) {
+        amountPut += _amountReceived; // amountPutExtra was pulled before the swap
+      } else if (amountPut > _amountReceived) {
+        _pullPutExtra(tokenOut, amountPut - _amountReceived, _putMaxOf(data));
+      } else {
+        amountPut = _amountReceived; // all swapped collateral is put, as on V2
+      }
+      _borrow(tx.origin, _pidOf(data), _path0Of(data), tokenOut, _amount0Of(data), amountPut);
     }
     IERC20(tokenIn).safeTransfer(msg.sender, _amountToPay);
   }
 
-  function _closeCallback(
-    uint _amountToPay,
-    uint,
-    CallbackData memory data
-  ) internal {
-    (address tokenOut, address tokenIn, uint24 prevFee) = data.path.decodeFirstPool();
-    require(msg.sender == _poolFor(tokenIn, tokenOut, prevFee), '_closeCallback/bad-caller');
-    if (data.path.hasMultiplePools()) {
-      data.path = data.path.skipToken();
-      (, address tokenNext, uint24 fee) = data.path.decodeFirstPool();
+  function _closeCallback(uint _amountToPay, bytes calldata data) internal {
+    uint cursor = _cursorOf(data);
+    (address tokenOut, address tokenIn, uint24 fee) = data.decodePoolAt(cursor);
+    require(msg.sender == _poolFor(tokenIn, tokenOut, fee), '_closeCallback/bad-caller');
+    if (data.hasMultiplePoolsAt(cursor)) {
+      cursor = Path.skipTokenAt(cursor);
+      address tokenNext;
+      (, tokenNext, fee) = data.decodePoolAt(cursor);
       bool zeroForOne = tokenNext < tokenIn;
       IUniswapV3Pool(_poolFor(tokenIn, tokenNext, fee)).swap(
         msg.sender,
         zeroForOne,
         -_amountToPay.toInt256(),
         zeroForOne ? MIN_SQRT_RATIO + 1 : MAX_SQRT_RATIO - 1,
-        abi.encode(data)
+        _withCursor(data, cursor)
       );
-    } else {
-      uint amountTake = uint(-data.memo);
-      _repay(tx.origin, data.pid, data.path0, tokenIn, data.amount0, amountTake);
+    } else if (_actionOf(data) != LIQUIDATE) {
+      uint amountTake = _actionOf(data) == CLOSE ? _memoOf(data) : _amountToPay;
+      _repay(tx.origin, _pidOf(data), _path0Of(data), tokenIn, _amount0Of(data), amountTake);
       IERC20(tokenIn).safeTransfer(msg.sender, _amountToPay);
       _transferOut(tokenIn, tx.origin, IERC20(tokenIn).balanceOf(address(this)));
+    } else {
+      _liquidate(_ownerOf(data), _pidOf(data), _path0Of(data), tokenIn, _amount0Of(data));
+      IERC20(tokenIn).safeTransfer(msg.sender, _amountToPay);
+      uint profit = IERC20(tokenIn).balanceOf(address(this));
+      require(profit >= _memoOf(data), 'liquidate/not-enough-profit');
+      _transferOut(tokenIn, tx.origin, profit);
+    }
+  }
+
+  /// @dev Pulls the collateral still missing after a leverage swap from the sender, or wraps it
+  /// from the ETH sent along.
+  function _pullPutExtra(
+    address _collateral,
+    uint _amount,
+    uint _amountMax
+  ) internal {
+    require(_amount <= _amountMax, 'leverage/too-much-put');
+    if (_collateral == weth) {
+      IWETH(weth).deposit{value: _amount}(); // within the ETH sent, as capped by leverage
+    } else {
+      IERC20(_collateral).safeTransferFrom(tx.origin, address(this), _amount);
+    }
+  }
+
+  /// @dev Returns the action of the packed callback data.
+  function _actionOf(bytes calldata data) internal pure returns (uint8) {
+    return uint8(data[0]);
+  }
+
+  /// @dev Returns the position owner of the packed callback data.
+  function _ownerOf(bytes calldata data) internal pure returns (address) {
+    return address(bytes20(data[1:21]));
+  }
+
+  /// @dev Returns the position id of the packed callback data.
+  function _pidOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[21:53]));
+  }
+
+  /// @dev Returns the amount borrowed or repaid of the packed callback data.
+  function _amount0Of(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[53:85]));
+  }
+
+  /// @dev Returns the memo of the packed callback data.
+  function _memoOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[85:117]));
+  }
+
+  /// @dev Returns the max collateral to pull from the sender of the packed callback data.
+  function _putMaxOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[117:149]));
+  }
+
+  /// @dev Returns the offset of the current pool in the packed callback data.
+  function _cursorOf(bytes calldata data) internal pure returns (uint) {
+    return uint(bytes32(data[149:181]));
+  }
+
+  /// @dev Returns the first token of the path in the packed callback data.
+  function _path0Of(bytes calldata data) internal pure returns (address) {
+    return data.toAddressCalldata(HEADER_SIZE);
+  }
+
+  /// @dev Copies the packed callback data for the next pool, with the cursor moved to the given offset.
+  function _withCursor(bytes calldata data, uint cursor) internal pure returns (bytes memory next) {
+    next = data;
+    assembly {
+      mstore(add(next, 181), cursor) // length word (32) + cursor position (149)
     }
   }
 
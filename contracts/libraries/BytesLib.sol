@@ -99,4 +99,16 @@ library BytesLib {
 
     return tempUint;
   }
+
+  /// @dev Reads an address at the given offset of calldata bytes, without copying them to memory.
+  function toAddressCalldata(bytes calldata _bytes, uint _start) internal pure returns (address) {
+    require(_bytes.length >= _start + 20, 'toAddress_outOfBounds');
+    return address(bytes20(_bytes[_start:_start + 20]));
+  }
+
+  /// @dev Reads a uint24 at the given offset of calldata bytes, without copying them to memory.
+  function toUint24Calldata(bytes calldata _bytes, uint _start) internal pure returns (uint24) {
+    require(_bytes.length >= _start + 3, 'toUint24_outOfBounds');
+    return uint24(bytes3(_bytes[_start:_start + 3]));
+  }
 }
@@ -76,4 +76,46 @@ library Path {
   function skipToken(bytes memory path) internal pure returns (bytes memory) {
     return path.slice(NEXT_OFFSET, path.length - NEXT_OFFSET);
   }
+
+  /// @notice Returns true iff the calldata path contains two or more pools from the given offset
+  /// @param path The encoded swap path
+  /// @param offset The offset of the current pool in path
+  /// @return True if path contains two or more pools from offset, otherwise false
+  function hasMultiplePoolsAt(bytes calldata path, uint offset) internal pure returns (bool) {
+    return path.length >= offset + MULTIPLE_POOLS_MIN_LENGTH;
+  }
+
+  /// @notice Decodes the pool at the given offset of the calldata path, without copying it
+  /// @param path The bytes encoded swap path
+  /// @param offset The offset of the pool in path
+  /// @return tokenA The first token of the given pool
+  /// @return tokenB The second token of the given pool
+  /// @return fee The fee level of the pool
+  function decodePoolAt(bytes calldata path, uint offset)
+    internal
+    pure
+    returns (
+      address tokenA,
+      address tokenB,
+      uint24 fee
+    )
+  {
+    tokenA = path.toAddressCalldata(offset);
+    fee = path.toUint24Calldata(offset + ADDR_SIZE);
+    tokenB = path.toAddressCalldata(offset + NEXT_OFFSET);
+  }
+
+  /// @notice Decodes the last token of the calldata path, without copying it
+  /// @param path The bytes encoded swap path
+  /// @return The last token of the path
+  function decodeLastToken(bytes calldata path) internal pure returns (address) {
+    return path.toAddressCalldata(path.length - ADDR_SIZE);
+  }
+
+  /// @notice Moves the given offset past a token + fee element, onto the next pool
+  /// @param offset The offset of the current pool in a path
+  /// @return The offset of the next pool
+  function skipTokenAt(uint offset) internal pure returns (uint) {
+    return offset + NEXT_OFFSET;
+  }
 }
@@ -17,6 +17,34 @@ library SafeCast {
     require((z = uint160(y)) == y);
   }
 
+  /// @notice Cast a uint256 to a uint96, revert on overflow
+  /// @param y The uint256 to be downcasted
+  /// @return z The downcasted integer, now type uint96
+  function toUint96(uint y) internal pure returns (uint96 z) {
+    require((z = uint96(y)) == y);
+  }
+
+  /// @notice Cast a uint256 to a uint128, revert on overflow
+  /// @param y The uint256 to be downcasted
+  /// @return z The downcasted integer, now type uint128
+  function toUint128(uint y) internal pure returns (uint128 z) {
+    require((z = uint128(y)) == y);
+  }
+
+  /// @notice Cast a uint256 to a uint64, revert on overflow
+  /// @param y The uint256 to be downcasted
+  /// @return z The downcasted integer, now type uint64
+  function toUint64(uint y) internal pure returns (uint64 z) {
+    require((z = uint64(y)) == y);
+  }
+
+  /// @notice Cast a uint256 to a uint32, revert on overflow
+  /// @param y The uint256 to be downcasted
+  /// @return z The downcasted integer, now type uint32
+  function toUint32(uint y) internal pure returns (uint32 z) {
+    require((z = uint32(y)) == y);
+  }
+
   /// @notice Cast a int256 to a int128, revert on overflow or underflow
   /// @param y The int256 to be downcasted
   /// @return z The downcasted integer, now type int128
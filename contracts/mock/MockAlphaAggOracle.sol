@@ -0,0 +1,16 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+contract MockAlphaAggOracle {
+  mapping(address => uint) public prices;
+  mapping(address => uint) public primarySourceCount;
+
+  function getETHPx(address token) external view returns (uint) {
+    return prices[token];
+  }
+
+  function setETHPrice(address token, uint price) external {
+    prices[token] = price;
+    primarySourceCount[token] = price > 0 ? 1 : 0;
+  }
+}
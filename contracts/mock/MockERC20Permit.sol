@@ -0,0 +1,12 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+import 'OpenZeppelin/openzeppelin-contracts@4.2.0/contracts/token/ERC20/extensions/draft-ERC20Permit.sol';
+
+contract MockERC20Permit is ERC20Permit {
+  constructor(string memory name_, string memory symbol_) ERC20(name_, symbol_) ERC20Permit(name_) {}
+
+  function mint(address account, uint amount) external {
+    _mint(account, amount);
+  }
+}
@@ -3,13 +3,20 @@ pragma solidity 0.8.6;
 
 import '../../interfaces/IExternalOracle.sol';
 
-contract MockExternalOracle is IExternalOracle {
+contract MockExternalOracle is IExternalBatchOracle {
   mapping(address => uint) public prices;
 
   function getETHPx(address token) external view override returns (uint) {
     return prices[token];
   }
 
+  function getETHPxs(address[] calldata tokens) external view override returns (uint[] memory pxs) {
+    pxs = new uint[](tokens.length);
+    for (uint idx = 0; idx < tokens.length; idx++) {
+      pxs[idx] = prices[tokens[idx]];
+    }
+  }
+
   function setETHPrice(address token, uint price) external returns (uint) {
     prices[token] = price;
   }
@@ -0,0 +1,19 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+import '../BetaBank.sol';
+
+/// @dev BetaBank that can seed positions in the legacy layout, as left behind by an upgrade.
+contract MockLegacyBetaBank is BetaBank {
+  function setLegacyPosition(
+    address _owner,
+    uint _pid,
+    Position calldata _pos
+  ) external {
+    legacyPositions[_owner][_pid] = _pos;
+    totalCollaterals[_pos.collateral] += _pos.collateralSize;
+    if (nextPositionIds[_owner] <= _pid) {
+      nextPositionIds[_owner] = _pid + 1;
+    }
+  }
+}
@@ -0,0 +1,29 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+/// @dev Oracle with a fixed price per token and no batched getAssetETHPrices, as deployed
+/// before batched price queries were added.
+contract MockLegacyBetaOracle {
+  mapping(address => uint) public prices;
+
+  function setETHPrice(address token, uint price) external {
+    prices[token] = price;
+  }
+
+  function getAssetETHPrice(address token) public view returns (uint) {
+    require(prices[token] > 0, 'getAssetETHPrice/no-price');
+    return prices[token];
+  }
+
+  function getAssetETHValue(address token, uint amount) external view returns (uint) {
+    return (getAssetETHPrice(token) * amount) >> 112;
+  }
+
+  function convert(
+    address from,
+    address to,
+    uint amount
+  ) external view returns (uint) {
+    return (amount * getAssetETHPrice(from)) / getAssetETHPrice(to);
+  }
+}
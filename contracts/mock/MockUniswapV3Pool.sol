@@ -0,0 +1,56 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.8.6;
+
+/// @dev Uniswap V3 pool with a constant tick and liquidity, whose observe call can be made to fail
+/// or to report no liquidity in range.
+contract MockUniswapV3Pool {
+  int24 public tick;
+  uint16 public observationCardinalityNext = type(uint16).max;
+  bool public failing;
+  bool public noLiquidity;
+
+  function setTick(int24 _tick) external {
+    tick = _tick;
+  }
+
+  function setFailing(bool _failing) external {
+    failing = _failing;
+  }
+
+  function setNoLiquidity(bool _noLiquidity) external {
+    noLiquidity = _noLiquidity;
+  }
+
+  function slot0()
+    external
+    view
+    returns (
+      uint160,
+      int24,
+      uint16,
+      uint16,
+      uint16,
+      uint8,
+      bool
+    )
+  {
+    return (0, tick, 0, observationCardinalityNext, observationCardinalityNext, 0, true);
+  }
+
+  function observe(uint32[] calldata secondsAgos)
+    external
+    view
+    returns (int56[] memory tickCumulatives, uint160[] memory secondsPerLiquidityCumulativeX128s)
+  {
+    require(!failing, 'observe/failing');
+    tickCumulatives = new int56[](secondsAgos.length);
+    secondsPerLiquidityCumulativeX128s = new uint160[](secondsAgos.length);
+    for (uint idx = 0; idx < secondsAgos.length; idx++) {
+      uint32 secondsAgo = secondsAgos[idx];
+      tickCumulatives[idx] = -int56(tick) * int56(uint56(secondsAgo));
+      secondsPerLiquidityCumulativeX128s[idx] = noLiquidity
+        ? type(uint160).max
+        : type(uint160).max - uint160(secondsAgo) * 2**64;
+    }
+  }
+}
@@ -0,0 +1,18 @@
+// SPDX-License-Identifier: BUSL-1.1
+pragma solidity 0.7.6;
+pragma abicoder v2;
+
+import '../BetaOracleUniswapV3.sol';
+
+/// @dev Uniswap V3 price oracle whose pools can be set directly, bypassing pool address derivation.
+contract MockUniswapV3PriceOracle is UniswapV3PriceOracle {
+  constructor(
+    address _factory,
+    uint32 _twapPeriod,
+    address _aggOracle
+  ) UniswapV3PriceOracle(_factory, _twapPeriod, _aggOracle) {}
+
+  function setPools(address _token, address[] calldata _pools) external {
+    pools[_token] = _pools;
+  }
+}
@@ -17,6 +17,19 @@ interface IBetaBank {
   /// @dev Returns the interest rate model smart contract.
   function interestModel() external view returns (address);
 
+  /// @dev Returns the position info of the given owner and position id.
+  function positions(address _owner, uint _pid)
+    external
+    view
+    returns (
+      uint32 blockBorrowPut,
+      uint32 blockRepayTake,
+      address bToken,
+      address collateral,
+      uint collateralSize,
+      uint debtShare
+    );
+
   /// @dev Returns the position's collateral token and AmToken.
   function getPositionTokens(address _owner, uint _pid)
     external
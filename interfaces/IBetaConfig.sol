@@ -2,6 +2,17 @@
 pragma solidity 0.8.6;
 
 interface IBetaConfig {
+  struct RiskParams {
+    uint collFactor; // collateral factor of the collateral token
+    uint collMaxAmount; // collateral max amount of the collateral token
+    uint safetyLTV; // safety LTV of the underlying token
+    uint liquidationLTV; // liquidation LTV of the underlying token
+    uint killBountyRate; // kill bounty rate of the underlying token
+  }
+
+  /// @dev Returns whether the given token always transfers the exact requested amount.
+  function standardTokens(address token) external view returns (bool);
+
   /// @dev Returns the risk level for the given asset.
   function getRiskLevel(address token) external view returns (uint);
 
@@ -25,4 +36,10 @@ interface IBetaConfig {
 
   /// @dev Returns the bonus incentive reward factor for liquidators.
   function getKillBountyRate(address token) external view returns (uint);
+
+  /// @dev Returns all risk parameters of the given underlying and collateral pair in one call.
+  function getRiskParams(address underlying, address collateral)
+    external
+    view
+    returns (RiskParams memory);
 }
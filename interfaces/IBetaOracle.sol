@@ -6,6 +6,11 @@ interface IBetaOracle {
   /// @param token The token to query for asset price
   function getAssetETHPrice(address token) external returns (uint);
 
+  /// @dev Returns the given asset prices in ETH (wei), multiplied by 2**112. BetaBank falls
+  /// back to getAssetETHPrice per token if this call fails, so older oracles remain usable.
+  /// @param tokens The tokens to query for asset prices
+  function getAssetETHPrices(address[] calldata tokens) external returns (uint[] memory);
+
   /// @dev Returns the given asset value in ETH (wei)
   /// @param token The token to query for asset value
   /// @param amount The amount of token to query
@@ -5,3 +5,8 @@ interface IExternalOracle {
   /// @dev Returns the price in terms of ETH for the given token, multiplifed by 2**112.
   function getETHPx(address token) external view returns (uint);
 }
+
+interface IExternalBatchOracle is IExternalOracle {
+  /// @dev Returns the prices in terms of ETH for the given tokens, multiplied by 2**112.
+  function getETHPxs(address[] calldata tokens) external view returns (uint[] memory);
+}
@@ -0,0 +1,273 @@
+import json
+import os
+import time
+
+from brownie import (
+    a,
+    chain,
+    BetaBank,
+    BToken,
+    BetaConfig,
+    BetaOracleUniswapV2,
+    BetaInterestModelV1,
+    BetaRunnerLending,
+    MockExternalOracle,
+    MockUniswapV2Factory,
+    MockUniswapV2Pair,
+    MockWETH,
+    ERC20Contract,
+    BTokenDeployer,
+)
+
+
+# Usage:
+#   brownie run gas_benchmark                               -> compare against the stored baseline
+#   brownie run gas_benchmark main --update-baseline        -> run and (over)write the baseline
+#   brownie run gas_benchmark update_baseline               -> same as above
+# The baseline lives next to this script as gas_baseline.json and is meant to be committed.
+# On a fresh checkout, bootstrap it once with --update-baseline on the reference toolchain,
+# commit the file, and from then on comparing fails if the file or any entry is missing.
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, "gas_baseline.json")
+REPORT_PATH = os.path.join(HERE, "..", "reports", "gas_report.json")
+TOLERANCE = 0.02  # flag anything that costs more than 2% over the baseline
+
+
+def mathval(val):
+    return int(val * 1000000) * 10 ** 12
+
+
+def deploy():
+    chain.reset()
+    weth = a[0].deploy(MockWETH)
+    betaBank = a[0].deploy(BetaBank)
+    config = a[0].deploy(BetaConfig, a[0], mathval(0.1))
+    config.setRiskConfigs(
+        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
+    )
+    ext = a[0].deploy(MockExternalOracle)
+    factory = a[0].deploy(MockUniswapV2Factory)
+    oracle = a[0].deploy(BetaOracleUniswapV2, weth, factory, 3600)
+    im = a[0].deploy(
+        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0.5)
+    )
+    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
+    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
+    ptoken = a[0].deploy(ERC20Contract, "My Pair Token Name", "PMYSYM")
+    for token in [utoken, ctoken]:
+        token.mint(a[0], mathval(1000000))
+        token.mint(a[1], mathval(1000000))
+    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
+    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
+    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
+    pair = a[0].deploy(MockUniswapV2Pair)
+    factory.setPair(ptoken, weth, pair)
+    pair.setReserves(mathval(100), mathval(50))
+    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
+    create_first = betaBank.create(utoken).gas_used  # also deploys the BToken implementation
+    betaBank.create(weth)
+    config.setCollInfos([ctoken], [mathval(0.8)], [2 ** 256 - 1], {"from": a[0]})
+    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
+    btoken = BToken.at(betaBank.bTokens(utoken))
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[1]})
+    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
+    btoken.mint(a[0], mathval(1000), {"from": a[0]})  # first mint locks minimum liquidity
+    runner = a[0].deploy(BetaRunnerLending, betaBank, weth)
+    betaBank.setRunnerWhitelists([runner], True, {"from": a[0]})
+    utoken.approve(runner, 2 ** 256 - 1, {"from": a[1]})
+    ctoken.approve(runner, 2 ** 256 - 1, {"from": a[1]})
+    return {
+        "weth": weth,
+        "betaBank": betaBank,
+        "config": config,
+        "ext": ext,
+        "oracle": oracle,
+        "im": im,
+        "utoken": utoken,
+        "ctoken": ctoken,
+        "ptoken": ptoken,
+        "pair": pair,
+        "btoken": btoken,
+        "runner": runner,
+        "createFirstGas": create_first,
+    }
+
+
+def bench_create(env, results):
+    # The first market of a bank deploys the full BToken implementation, which is what every
+    # market cost before clones. Later markets only deploy and initialize a minimal proxy.
+    token = a[0].deploy(ERC20Contract, "My Listed Token Name", "LMYSYM")
+    env["ext"].setETHPrice(token, 2 ** 112, {"from": a[0]})
+    env["oracle"].setExternalOracle([token], env["ext"], {"from": a[0]})
+    results["BetaBank.create(implementation)"] = env["createFirstGas"]
+    results["BetaBank.create"] = env["betaBank"].create(token, {"from": a[0]}).gas_used
+
+
+def bench_btoken(env, results):
+    btoken = env["btoken"]
+    results["BToken.mint"] = btoken.mint(a[0], mathval(100), {"from": a[0]}).gas_used
+    chain.sleep(86400)
+    results["BToken.accrue"] = btoken.accrue({"from": a[0]}).gas_used
+    chain.sleep(86400)
+    results["BToken.burn"] = btoken.burn(a[0], mathval(50), {"from": a[0]}).gas_used
+
+
+def bench_betabank(env, results):
+    betaBank, utoken, ctoken = env["betaBank"], env["utoken"], env["ctoken"]
+    tx = betaBank.open(a[1], utoken, ctoken, {"from": a[1]})
+    pid = tx.return_value
+    results["BetaBank.open"] = tx.gas_used
+    results["BetaBank.put"] = betaBank.put(a[1], pid, mathval(500), {"from": a[1]}).gas_used
+    results["BetaBank.borrow"] = betaBank.borrow(
+        a[1], pid, mathval(40), {"from": a[1]}
+    ).gas_used
+    chain.sleep(3600)
+    results["BetaBank.repay"] = betaBank.repay(
+        a[1], pid, mathval(5), {"from": a[1]}
+    ).gas_used
+    chain.sleep(3600)
+    results["BetaBank.take"] = betaBank.take(
+        a[1], pid, mathval(50), {"from": a[1]}
+    ).gas_used
+    # crash the collateral price to make the position liquidatable
+    env["ext"].setETHPrice(ctoken, 2 ** 112 // 2, {"from": a[0]})
+    chain.sleep(3600)
+    results["BetaBank.liquidate"] = betaBank.liquidate(
+        a[1], pid, mathval(10), {"from": a[0]}
+    ).gas_used
+    env["ext"].setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
+
+
+def bench_betabank_batch(env, results):
+    betaBank, utoken, ctoken = env["betaBank"], env["utoken"], env["ctoken"]
+    pids = [betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value for _ in range(4)]
+    results["BetaBank.batch(4x put+borrow)"] = betaBank.batch(
+        a[1],
+        [[2, pid, mathval(100)] for pid in pids] + [[0, pid, mathval(5)] for pid in pids],
+        {"from": a[1]},
+    ).gas_used
+    chain.sleep(3600)
+    results["BetaBank.batch(4x repay+take)"] = betaBank.batch(
+        a[1],
+        [[1, pid, mathval(5)] for pid in pids] + [[3, pid, mathval(50)] for pid in pids],
+        {"from": a[1]},
+    ).gas_used
+
+
+def bench_betabank_liquidate_many(env, results):
+    betaBank, utoken, ctoken = env["betaBank"], env["utoken"], env["ctoken"]
+    pids = [betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value for _ in range(4)]
+    for pid in pids:
+        betaBank.put(a[1], pid, mathval(100), {"from": a[1]})
+        betaBank.borrow(a[1], pid, mathval(8), {"from": a[1]})
+    # crash the collateral price to make the positions liquidatable
+    env["ext"].setETHPrice(ctoken, 2 ** 112 // 2, {"from": a[0]})
+    chain.sleep(3600)
+    results["BetaBank.liquidateMany(4x)"] = betaBank.liquidateMany(
+        [a[1]] * len(pids), pids, [mathval(2)] * len(pids), {"from": a[0]}
+    ).gas_used
+    env["ext"].setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
+
+
+def bench_runner_lending(env, results):
+    runner, utoken, ctoken = env["runner"], env["utoken"], env["ctoken"]
+    results["BetaRunnerLending.borrow(new)"] = runner.borrow(
+        2 ** 256 - 1, utoken, ctoken, mathval(20), mathval(500), {"from": a[1]}
+    ).gas_used
+    pid = env["betaBank"].nextPositionIds(a[1]) - 1
+    results["BetaRunnerLending.borrow(existing)"] = runner.borrow(
+        pid, utoken, ctoken, mathval(10), mathval(100), {"from": a[1]}
+    ).gas_used
+    chain.sleep(3600)
+    results["BetaRunnerLending.repay"] = runner.repay(
+        pid, utoken, ctoken, mathval(10), mathval(100), {"from": a[1]}
+    ).gas_used
+
+
+def bench_oracle(env, results):
+    oracle, ptoken = env["oracle"], env["ptoken"]
+    results["BetaOracleUniswapV2.initPriceFromPair"] = oracle.initPriceFromPair(
+        ptoken, {"from": a[0]}
+    ).gas_used
+    chain.sleep(3600)
+    results["BetaOracleUniswapV2.getAssetETHPrice(pair)"] = oracle.getAssetETHPrice(
+        ptoken, {"from": a[0]}
+    ).gas_used
+    results["BetaOracleUniswapV2.getAssetETHPrice(external)"] = oracle.getAssetETHPrice(
+        env["ctoken"], {"from": a[0]}
+    ).gas_used
+    results["BetaOracleUniswapV2.getAssetETHPrices"] = oracle.getAssetETHPrices(
+        [ptoken, env["ctoken"]], {"from": a[0]}
+    ).gas_used
+
+
+def run():
+    env = deploy()
+    results = {}
+    bench_create(env, results)
+    bench_btoken(env, results)
+    bench_betabank(env, results)
+    bench_betabank_batch(env, results)
+    bench_betabank_liquidate_many(env, results)
+    bench_runner_lending(env, results)
+    bench_oracle(env, results)
+    return results
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, gas in sorted(results.items()):
+        base = baseline.get(name)
+        if base is not None and gas > base * (1 + TOLERANCE):
+            regressions.append({"name": name, "baseline": base, "gas": gas})
+    return regressions
+
+
+def write_report(results, baseline, regressions):
+    report = {
+        "timestamp": int(time.time()),
+        "tolerance": TOLERANCE,
+        "results": results,
+        "baseline": baseline,
+        "regressions": regressions,
+    }
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def main(*args):
+    if "--update-baseline" in args:
+        return update_baseline()
+    if not os.path.exists(BASELINE_PATH):
+        raise Exception(
+            "no baseline at {}, bootstrap it with "
+            "`brownie run gas_benchmark main --update-baseline` and commit it".format(BASELINE_PATH)
+        )
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    results = run()
+    regressions = compare(results, baseline)
+    write_report(results, baseline, regressions)
+    for name, gas in sorted(results.items()):
+        base = baseline.get(name)
+        diff = "" if base is None else " ({:+d})".format(gas - base)
+        print("{:<56}{:>10}{}".format(name, gas, diff))
+    missing = sorted(name for name in results if name not in baseline)
+    if missing:
+        raise Exception(
+            "missing from baseline, run `brownie run gas_benchmark main --update-baseline`: {}".format(
+                ", ".join(missing)
+            )
+        )
+    if regressions:
+        raise Exception("gas regressions: {}".format(", ".join(r["name"] for r in regressions)))
+
+
+def update_baseline():
+    results = run()
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    write_report(results, results, [])
+    print("baseline written to {}".format(BASELINE_PATH))
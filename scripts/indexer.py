@@ -0,0 +1,219 @@
+import copy
+import json
+import os
+
+from brownie import chain, web3, BetaBank, BToken
+from eth_utils import event_abi_to_log_topic
+
+
+# Usage:
+#   brownie run indexer main <betaBank> [fromBlock]
+#
+# Folds BetaBank and BToken events into compact position and market tables. Only blocks at
+# least REORG_DEPTH deep are folded into the persisted state and checkpointed, so a restart
+# resumes from the checkpoint. The unconfirmed tip is folded on top of a copy on every sync,
+# which makes reorgs within REORG_DEPTH blocks harmless.
+HERE = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(HERE, "..", "reports", "index.json")
+BLOCK_CHUNK = 5000  # max block range per log query, to keep RPC providers happy
+REORG_DEPTH = 12  # blocks to wait before a block is considered final
+MINIMUM_LIQUIDITY = 10 ** 6  # BToken.MINIMUM_LIQUIDITY
+ZERO = "0x0000000000000000000000000000000000000000"
+BANK_EVENTS = ["Create", "Open", "Borrow", "Repay", "Put", "Take", "Liquidate", "SelflessLiquidate"]
+BTOKEN_EVENTS = ["Accrue", "Mint", "Burn", "Transfer"]
+
+
+def event_decoders(abi, names):
+    """Returns a map from topic0 to (event name, web3 event decoder) for the given events."""
+    contract = web3.eth.contract(abi=abi)
+    decoders = {}
+    for entry in abi:
+        if entry["type"] == "event" and entry["name"] in names:
+            decoders[bytes(event_abi_to_log_topic(entry))] = (
+                entry["name"],
+                getattr(contract.events, entry["name"])(),
+            )
+    return decoders
+
+
+def new_state(bank, from_block):
+    return {
+        "bank": str(bank),
+        "block": from_block - 1,
+        "blockHash": None,
+        "positions": {},
+        "markets": {},
+    }
+
+
+def load_state(bank, from_block=0, path=INDEX_PATH):
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state["bank"] == str(bank):
+            return state
+    return new_state(bank, from_block)
+
+
+def save_state(state, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # never leave a half-written checkpoint behind
+
+
+def position_key(owner, pid):
+    return "{}:{}".format(owner, pid)
+
+
+def add(table, field, delta):
+    """Adds `delta` to an integer field, stored as a decimal string to keep JSON exact."""
+    table[field] = str(int(table[field]) + delta)
+
+
+def apply_bank_event(state, name, args):
+    positions, markets = state["positions"], state["markets"]
+    if name == "Create":
+        markets[str(args["bToken"])] = {
+            "underlying": str(args["underlying"]),
+            "totalLoanable": "0",
+            "totalLoan": "0",
+            "totalDebtShare": "0",
+            "totalSupply": "0",  # minted supply, without the pending reserve
+            "totalInterest": "0",
+        }
+        return
+    if name == "Open":
+        positions[position_key(args["owner"], args["pid"])] = {
+            "owner": str(args["owner"]),
+            "pid": int(args["pid"]),
+            "bToken": str(args["bToken"]),
+            "collateral": str(args["collateral"]),
+            "collateralSize": "0",
+            "debtShare": "0",
+        }
+        return
+    pos = positions[position_key(args["owner"], args["pid"])]
+    market = markets[pos["bToken"]]
+    if name == "Borrow":
+        add(pos, "debtShare", args["share"])
+        add(market, "totalDebtShare", args["share"])
+        add(market, "totalLoan", args["amount"])
+        add(market, "totalLoanable", -args["amount"])
+    elif name in ("Repay", "Liquidate", "SelflessLiquidate"):
+        # events carry the requested amount, which matches the received one for regular tokens
+        add(pos, "debtShare", -args["share"])
+        add(market, "totalDebtShare", -args["share"])
+        add(market, "totalLoan", -args["amount"])
+        add(market, "totalLoanable", args["amount"])
+        if name == "Liquidate":
+            add(pos, "collateralSize", -args["reward"])
+    elif name == "Put":
+        add(pos, "collateralSize", args["amount"])
+    elif name == "Take":
+        add(pos, "collateralSize", -args["amount"])
+
+
+def apply_btoken_event(state, btoken, name, args):
+    market = state["markets"][btoken]
+    if name == "Accrue":
+        add(market, "totalLoan", args["interest"])
+        add(market, "totalInterest", args["interest"])
+    elif name == "Mint":
+        if int(market["totalDebtShare"]) == 0:
+            # first mint locks MINIMUM_LIQUIDITY as both loan and debt share
+            add(market, "totalLoanable", args["credit"])
+            add(market, "totalLoan", MINIMUM_LIQUIDITY)
+            add(market, "totalDebtShare", MINIMUM_LIQUIDITY)
+        else:
+            add(market, "totalLoanable", args["amount"])
+    elif name == "Burn":
+        add(market, "totalLoanable", -args["amount"])
+    elif name == "Transfer":
+        if args["from"] == ZERO:
+            add(market, "totalSupply", args["value"])
+        if args["to"] == ZERO:
+            add(market, "totalSupply", -args["value"])
+
+
+def fetch_logs(state, start, end, bank_decoders, btoken_decoders):
+    """Returns decoded (blockNumber, logIndex, address, name, args) tuples for the range, in order."""
+    bank = state["bank"]
+    logs = web3.eth.get_logs({"fromBlock": start, "toBlock": end, "address": bank})
+    decoded = []
+    btokens = set(state["markets"])
+    for log in logs:
+        topic = bytes(log["topics"][0]) if log["topics"] else None
+        if topic in bank_decoders:
+            name, decoder = bank_decoders[topic]
+            event = decoder.processLog(log)
+            decoded.append((log["blockNumber"], log["logIndex"], bank, name, event["args"]))
+            if name == "Create":
+                btokens.add(str(event["args"]["bToken"]))
+    if btokens:
+        logs = web3.eth.get_logs({"fromBlock": start, "toBlock": end, "address": sorted(btokens)})
+        for log in logs:
+            topic = bytes(log["topics"][0]) if log["topics"] else None
+            if topic in btoken_decoders:
+                name, decoder = btoken_decoders[topic]
+                event = decoder.processLog(log)
+                address = web3.toChecksumAddress(log["address"])
+                decoded.append((log["blockNumber"], log["logIndex"], address, name, event["args"]))
+    return sorted(decoded, key=lambda log: log[:2])
+
+
+def fold(state, start, end):
+    """Folds all events in blocks [start, end] into the given state, in place."""
+    bank_decoders = event_decoders(BetaBank.abi, BANK_EVENTS)
+    btoken_decoders = event_decoders(BToken.abi, BTOKEN_EVENTS)
+    while start <= end:
+        chunk_end = min(start + BLOCK_CHUNK - 1, end)
+        for _, _, address, name, args in fetch_logs(
+            state, start, chunk_end, bank_decoders, btoken_decoders
+        ):
+            if address == state["bank"]:
+                apply_bank_event(state, name, args)
+            else:
+                apply_btoken_event(state, address, name, args)
+        state["block"] = chunk_end
+        start = chunk_end + 1
+    return state
+
+
+def check_reorg(state):
+    """Raises if the checkpointed block is no longer part of the canonical chain."""
+    if state["blockHash"] is None or state["block"] < 0:
+        return
+    block_hash = web3.eth.get_block(state["block"])["hash"].hex()
+    if block_hash != state["blockHash"]:
+        raise Exception(
+            "reorg deeper than {} blocks at block {}, increase REORG_DEPTH and reindex".format(
+                REORG_DEPTH, state["block"]
+            )
+        )
+
+
+def sync(state, head=None, depth=REORG_DEPTH, path=INDEX_PATH):
+    """Folds and checkpoints final blocks, then returns a view that includes the unconfirmed tip."""
+    head = chain.height if head is None else head
+    check_reorg(state)
+    final = head - depth
+    if final > state["block"]:
+        fold(state, state["block"] + 1, final)
+        state["blockHash"] = web3.eth.get_block(final)["hash"].hex()
+        save_state(state, path)
+    view = copy.deepcopy(state)
+    if head > view["block"]:
+        fold(view, view["block"] + 1, head)
+    return view
+
+
+def main(bank_address, from_block=0):
+    bank = BetaBank.at(bank_address)
+    view = sync(load_state(bank, int(from_block)))
+    print(
+        "indexed {} positions in {} markets up to block {}".format(
+            len(view["positions"]), len(view["markets"]), view["block"]
+        )
+    )
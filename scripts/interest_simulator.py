@@ -0,0 +1,185 @@
+import itertools
+
+
+# Usage:
+#   brownie run interest_simulator   -> prints a small example sweep over adjustRate
+#
+# Bit-exact integer re-implementation of BetaInterestModelV1, BetaDynamicInterestRateModel and
+# the interest / reserve part of BToken.accrue, for fast off-chain parameter sweeps. Every
+# division is a floor division, mirroring uint arithmetic in Solidity. Python ints are used
+# instead of fixed-width arrays since intermediate products exceed 64 bits.
+DAY = 86400
+YEAR = 365 * DAY
+
+
+class InterestModelV1:
+    """Mirror of BetaInterestModelV1. All rates are per year, multiplied by 1e18."""
+
+    def __init__(self, initial_rate, min_rate, max_rate, adjust_rate):
+        assert min_rate < max_rate, "constructor/bad-min-max-rate"
+        assert adjust_rate < 10 ** 18, "constructor/bad-adjust-rate"
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.adjust_rate = adjust_rate
+
+    def next_rate(self, prev_rate, total_available, total_loan, time_passed):
+        total_liquidity = total_available + total_loan
+        if total_liquidity == 0:
+            return prev_rate
+        util_rate = (total_loan * 10 ** 18) // total_liquidity
+        capped_time_passed = min(time_passed, DAY)
+        if util_rate < 5 * 10 ** 17:
+            mult_rate = 10 ** 18 - (self.adjust_rate * capped_time_passed) // DAY
+        elif util_rate < 7 * 10 ** 17:
+            down_scale = (7 * 10 ** 17 - util_rate) * 5
+            mult_rate = (
+                10 ** 18 - (self.adjust_rate * down_scale * capped_time_passed) // DAY // 10 ** 18
+            )
+        elif util_rate < 8 * 10 ** 17:
+            mult_rate = 10 ** 18
+        else:
+            up_scale = (util_rate - 8 * 10 ** 17) * 5
+            up_max_rate = 10 ** 36 // (10 ** 18 - self.adjust_rate) - 10 ** 18
+            mult_rate = 10 ** 18 + (up_max_rate * up_scale * capped_time_passed) // DAY // 10 ** 18
+        target_rate = (prev_rate * mult_rate) // 10 ** 18
+        return min(max(target_rate, self.min_rate), self.max_rate)
+
+
+class DynamicInterestRateModel:
+    """Mirror of one BetaDynamicInterestRateModel.Config. Util and base rates are in bps."""
+
+    def __init__(
+        self,
+        adjust_rate,
+        lo_opt_util_rate,
+        hi_opt_util_rate,
+        max_mult,
+        opt_util_interest_rate,
+        max_util_interest_rate,
+    ):
+        assert adjust_rate <= 100 * 10 ** 18, "bad adjust rate"
+        assert 0 < lo_opt_util_rate <= hi_opt_util_rate < 10000, "bad lo/hi optimal util rate"
+        assert 10 ** 18 <= max_mult <= 10 * 10 ** 18, "bad max mult"
+        assert 0 < opt_util_interest_rate <= max_util_interest_rate < 50000, "bad opt/max util interest rate"
+        self.initial_rate = 0
+        self.adjust_rate = adjust_rate
+        self.lo_opt_util_rate = lo_opt_util_rate
+        self.hi_opt_util_rate = hi_opt_util_rate
+        self.max_mult = max_mult
+        self.opt_util_interest_rate = opt_util_interest_rate
+        self.max_util_interest_rate = max_util_interest_rate
+
+    def next_rate(self, prev_rate, total_available, total_loan, time_passed):
+        total_liquidity = total_available + total_loan
+        if total_liquidity == 0:
+            return prev_rate
+        util_rate = (total_loan * 10 ** 18) // total_liquidity
+        lo, hi = self.lo_opt_util_rate * 10 ** 14, self.hi_opt_util_rate * 10 ** 14
+        opt_rate = self.opt_util_interest_rate * 10 ** 14
+        if util_rate < lo:
+            mult_rate = 10 ** 36 // (10 ** 18 + (self.adjust_rate * time_passed) // DAY)
+            cur_rate = ratioed_y(0, lo, 0, opt_rate, util_rate)
+        elif util_rate < hi:
+            mult_rate = 10 ** 18
+            cur_rate = opt_rate
+        else:
+            mult_rate = 10 ** 18 + (self.adjust_rate * time_passed) // DAY
+            cur_rate = ratioed_y(
+                hi, 10 ** 18, opt_rate, self.max_util_interest_rate * 10 ** 14, util_rate
+            )
+        target_rate = (prev_rate * mult_rate) // 10 ** 18
+        min_rate = (cur_rate * 10 ** 18) // self.max_mult
+        max_rate = (cur_rate * self.max_mult) // 10 ** 18
+        return min(max(target_rate, min_rate), max_rate)
+
+
+def ratioed_y(min_x, max_x, min_y, max_y, x):
+    return min_y + ((max_y - min_y) * (x - min_x)) // (max_x - min_x)
+
+
+def new_market(model, total_loanable, total_loan=0, total_supply=None):
+    """Returns a market state as BToken stores it, with the model's initial rate."""
+    return {
+        "interestRate": model.initial_rate,
+        "totalLoanable": total_loanable,
+        "totalLoan": total_loan,
+        "totalSupply": total_loanable + total_loan if total_supply is None else total_supply,
+        "reserveSupply": 0,
+    }
+
+
+def accrue(market, model, time_passed, reserve_rate=0):
+    """Applies BToken.accrue to the market in place and returns the interest accrued."""
+    if time_passed == 0:
+        return 0
+    total_loan, total_loanable, interest_rate = (
+        market["totalLoan"],
+        market["totalLoanable"],
+        market["interestRate"],
+    )
+    interest = (interest_rate * total_loan * time_passed) // YEAR // 10 ** 18
+    total_loan += interest
+    market["totalLoan"] = total_loan
+    market["interestRate"] = model.next_rate(interest_rate, total_loanable, total_loan, time_passed)
+    if interest > 0 and reserve_rate > 0:
+        to_reserve = (interest * reserve_rate) // 10 ** 18
+        credit = (to_reserve * market["totalSupply"]) // (total_loan + total_loanable - to_reserve)
+        market["totalSupply"] += credit
+        market["reserveSupply"] += credit
+    return interest
+
+
+def set_utilization(market, util_rate):
+    """Borrows or repays at no cost so that the market's utilization becomes `util_rate` (1e18)."""
+    total = market["totalLoan"] + market["totalLoanable"]
+    market["totalLoan"] = (total * util_rate) // 10 ** 18
+    market["totalLoanable"] = total - market["totalLoan"]
+
+
+def simulate(market, model, path, reserve_rate=0):
+    """Runs a market along a path of (time_passed, util_rate) steps and returns the rate history.
+
+    Each step first accrues over `time_passed`, then moves utilization to `util_rate`, or keeps
+    it if `util_rate` is None. The market is updated in place.
+    """
+    rates = []
+    for time_passed, util_rate in path:
+        accrue(market, model, time_passed, reserve_rate)
+        if util_rate is not None:
+            set_utilization(market, util_rate)
+        rates.append(market["interestRate"])
+    return rates
+
+
+def sweep(models, markets, paths, reserve_rate=0):
+    """Simulates every (model, market, path) combination. Markets are copied, not mutated.
+
+    Returns a list of (model index, market index, path index, final market, rate history).
+    """
+    results = []
+    for (mi, model), (ki, market), (pi, path) in itertools.product(
+        enumerate(models), enumerate(markets), enumerate(paths)
+    ):
+        state = dict(market)
+        rates = simulate(state, model, path, reserve_rate)
+        results.append((mi, ki, pi, state, rates))
+    return results
+
+
+def main():
+    models = [
+        InterestModelV1(2 * 10 ** 17, 10 ** 16, 10 ** 20, adjust * 10 ** 17)
+        for adjust in range(1, 10, 2)
+    ]
+    markets = [new_market(models[0], 1000 * 10 ** 18)]
+    paths = [[(3600, 9 * 10 ** 17)] * (24 * 30)]  # 90% utilization for 30 days, hourly accrue
+    for mi, _, _, state, rates in sweep(models, markets, paths, reserve_rate=10 ** 17):
+        print(
+            "adjustRate={:.1f} finalRate={:.4f} totalLoan={:.4f} reserve={:.4f}".format(
+                models[mi].adjust_rate / 1e18,
+                rates[-1] / 1e18,
+                state["totalLoan"] / 1e18,
+                state["reserveSupply"] / 1e18,
+            )
+        )
@@ -0,0 +1,82 @@
+from brownie import chain, interface, BetaBank, BToken
+
+from scripts.indexer import load_state, sync
+
+
+# Usage:
+#   brownie run liquidation_scanner main <betaBank> [fromBlock]
+#
+# Syncs the position tables of the event indexer, then recomputes every position's LTV
+# off-chain with the same integer math as BetaBank._fetchPositionLTV and BToken.accrue. Only
+# a handful of calls per market are made per scan, independent of the number of positions.
+YEAR = 365 * 86400
+
+
+def ceil_div(a, b):
+    return (a + b - 1) // b
+
+
+def load_markets(bank, positions, timestamp):
+    """Loads per-bToken debt state accrued to `timestamp`, as BToken.accrue would compute it."""
+    markets = {}
+    for btoken in {pos["bToken"] for pos in positions}:
+        bt = BToken.at(btoken)
+        total_loan = bt.totalLoan()
+        interest = (bt.interestRate() * total_loan * (timestamp - bt.lastAccrueTime())) // YEAR // 10 ** 18
+        markets[btoken] = {
+            "underlying": bank.underlyings(btoken),
+            "totalLoan": total_loan + interest,
+            "totalDebtShare": bt.totalDebtShare(),
+        }
+    return markets
+
+
+def compute_ltvs(positions, markets, prices, coll_factors):
+    """Returns the LTV of every position, matching BetaBank._fetchPositionLTV bit for bit."""
+    ltvs = []
+    for pos in positions:
+        debt_share = int(pos["debtShare"])
+        if debt_share == 0:
+            ltvs.append(0)
+            continue
+        market = markets[pos["bToken"]]
+        debt_size = ceil_div(debt_share * market["totalLoan"], market["totalDebtShare"])
+        debt_value = (prices[market["underlying"]] * debt_size) >> 112
+        coll_cred = (int(pos["collateralSize"]) * coll_factors[pos["collateral"]]) // 10 ** 18
+        coll_value = (prices[pos["collateral"]] * coll_cred) >> 112
+        if debt_value >= coll_value:
+            ltvs.append(10 ** 18)
+        else:
+            ltvs.append((debt_value * 10 ** 18) // coll_value)
+    return ltvs
+
+
+def scan(bank, state):
+    """Returns liquidatable positions ranked by how far they are past the liquidation LTV."""
+    positions = [pos for pos in state["positions"].values() if int(pos["debtShare"]) > 0]
+    if not positions:
+        return []
+    config = interface.IBetaConfig(bank.config())
+    oracle = interface.IBetaOracle(bank.oracle())
+    markets = load_markets(bank, positions, chain.time())
+    underlyings = {market["underlying"] for market in markets.values()}
+    collaterals = {pos["collateral"] for pos in positions}
+    prices = {token: oracle.getAssetETHPrice.call(token) for token in underlyings | collaterals}
+    coll_factors = {token: config.getCollFactor(token) for token in collaterals}
+    liquidation_ltvs = {token: config.getLiquidationLTV(token) for token in underlyings}
+    result = []
+    for pos, ltv in zip(positions, compute_ltvs(positions, markets, prices, coll_factors)):
+        liquidation_ltv = liquidation_ltvs[markets[pos["bToken"]]["underlying"]]
+        if ltv >= liquidation_ltv:
+            result.append(dict(pos, ltv=ltv, liquidationLTV=liquidation_ltv))
+    result.sort(key=lambda pos: (pos["ltv"] - pos["liquidationLTV"], int(pos["debtShare"])), reverse=True)
+    return result
+
+
+def main(bank_address, from_block=0):
+    bank = BetaBank.at(bank_address)
+    state = sync(load_state(bank, int(from_block)))
+    for pos in scan(bank, state):
+        print(
+            "{owner} {pid:>6} ltv={ltv} liquidation={liquidationLTV} debtShare={debtShare}".format(**pos)
+        )
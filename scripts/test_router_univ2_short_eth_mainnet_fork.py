@@ -127,11 +127,19 @@ def main():
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 2))
     # collateral - ctoken, underlying - utoken -> weth -> ctoken
+    # multi-hop amounts must match the router quotes, as with the abi-encoded path
+    amounts = router.getAmountsOut(mathval(2), [utoken, weth, ctoken])
     rt.short(
         2 ** 256 - 1, mathval(2), mathval(10), [utoken, weth, ctoken], 0, {"from": a[1]}
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 3))
+    collateral = betaBank.positions(a[1], 3)[4]
+    assert collateral == mathval(10) + amounts[-1]
+    amounts = router.getAmountsIn(
+        betaBank.fetchPositionDebt.call(a[1], 3), [ctoken, weth, utoken]
+    )
+    before = ctoken.balanceOf(a[1])
     rt.close(
         3,
         2 ** 256 - 1,
@@ -142,3 +150,46 @@ def main():
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 3))
+    assert ctoken.balanceOf(a[1]) - before == mathval(10) - amounts[0]
+    assert betaBank.positions(a[1], 3)[4] == collateral - mathval(10)
+    assert betaBank.positions(a[1], 3)[5] == 0
+    # flash liquidation, collateral - ctoken, underlying - utoken -> ctoken
+    rt.short(2 ** 256 - 1, mathval(2), mathval(10), [utoken, ctoken], 0, {"from": a[1]})
+    ext.setETHPrice(ctoken, 2 ** 112 * 4 // 10, {"from": a[0]})  # 0.4 ETH, above liquidation LTV
+    before = ctoken.balanceOf(a[2])
+    rt.liquidate(a[1], 4, mathval(1), [ctoken, utoken], 0, {"from": a[2]})
+    print(ctoken.balanceOf(a[2]) - before)
+    print(betaBank.positions(a[1], 4))
+    # leverage to 4 utoken debt and 20 ctoken collateral, then deleverage to 10% LTV
+    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
+    rt.leverage(
+        2 ** 256 - 1, mathval(4), mathval(20), [utoken, ctoken], mathval(20), {"from": a[1]}
+    )
+    print(betaBank.positions(a[1], 5))
+    rt.deleverage(5, mathval(0.1), [ctoken, utoken], mathval(100), {"from": a[1]})
+    print(betaBank.positions(a[1], 5))
+    print(betaBank.fetchPositionLTV.call(a[1], 5))
+    # collateral - weth, underlying - utoken -> ctoken -> weth
+    amounts = router.getAmountsOut(mathval(2), [utoken, ctoken, weth])
+    rt.short(
+        2 ** 256 - 1,
+        mathval(2),
+        mathval(10),
+        [utoken, ctoken, weth],
+        0,
+        {"value": mathval(10), "from": a[1]},
+    )
+    print(betaBank.positions(a[1], 6))
+    collateral = betaBank.positions(a[1], 6)[4]
+    assert collateral == mathval(10) + amounts[-1]
+    rt.close(6, 2 ** 256 - 1, mathval(10), [weth, ctoken, utoken], mathval(10), {"from": a[1]})
+    print(betaBank.positions(a[1], 6))
+    assert betaBank.positions(a[1], 6)[4] == collateral - mathval(10)
+    assert betaBank.positions(a[1], 6)[5] == 0
+    # leverage to a target collateral below the swap output, the surplus stays in the position
+    amounts = router.getAmountsOut(mathval(2), [utoken, ctoken])
+    before = ctoken.balanceOf(a[1])
+    rt.leverage(2 ** 256 - 1, mathval(2), mathval(1), [utoken, ctoken], 0, {"from": a[1]})
+    print(betaBank.positions(a[1], 7))
+    assert betaBank.positions(a[1], 7)[4] == amounts[-1] > mathval(1)
+    assert ctoken.balanceOf(a[1]) == before
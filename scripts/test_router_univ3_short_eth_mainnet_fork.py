@@ -1,3 +1,4 @@
+import brownie
 from brownie import (
     a,
     chain,
@@ -191,12 +192,17 @@ def main():
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 3))
+    collateral = betaBank.positions(a[1], 3)[4]
+    assert mathval(10) < collateral < mathval(12)  # ~2 ctoken out of the packed path walk
+    assert abs(betaBank.fetchPositionDebt.call(a[1], 3) - mathval(2)) <= 1
     rt2.close(
         [3, 2 ** 256 - 1, mathval(10), encode_path(path4, fee4), mathval(100)],
         {"from": a[1]},
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 3))
+    assert betaBank.positions(a[1], 3)[4] == collateral - mathval(10)
+    assert betaBank.positions(a[1], 3)[5] == 0
 
     # multi-path, hit for loop, collateral - ctoken, underlying - utoken -> utoken -> weth -> dtoken -> ctoken
     path5, fee5 = [utoken.address, weth.address, dtoken.address, ctoken.address], [
@@ -210,9 +216,107 @@ def main():
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 4))
+    collateral = betaBank.positions(a[1], 4)[4]
+    assert mathval(10) < collateral < mathval(12)
     rt2.close(
         [4, 2 ** 256 - 1, mathval(10), encode_path(path5, fee5), mathval(100)],
         {"from": a[1]},
     )
     print(ctoken.balanceOf(a[1]))
     print(betaBank.positions(a[1], 4))
+    assert betaBank.positions(a[1], 4)[4] == collateral - mathval(10)
+    assert betaBank.positions(a[1], 4)[5] == 0
+
+    # flash liquidation, collateral - ctoken, underlying - utoken -> ctoken
+    path6, fee6 = [utoken.address, ctoken.address, weth.address], [FEE, FEE]
+    rt2.short(
+        [2 ** 256 - 1, mathval(2), mathval(10), encode_path(path1, fee1), 0],
+        {"from": a[1]},
+    )
+    ext.setETHPrice(ctoken, 2 ** 112 * 4 // 10, {"from": a[0]})  # 0.4 ETH, above liquidation LTV
+    before = ctoken.balanceOf(a[2])
+    rt2.liquidate(
+        [a[1], 5, mathval(1), encode_path(path1, fee1), 0],
+        {"from": a[2]},
+    )
+    print(ctoken.balanceOf(a[2]) - before)
+    print(betaBank.positions(a[1], 5))
+
+    # leverage to 4 utoken debt and 20 ctoken collateral, then deleverage to 10% LTV
+    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
+    rt2.leverage(
+        [2 ** 256 - 1, mathval(4), mathval(20), encode_path(path1, fee1), mathval(20)],
+        {"from": a[1]},
+    )
+    print(betaBank.positions(a[1], 6))
+    rt2.deleverage(
+        [6, mathval(0.1), encode_path(path1, fee1), mathval(100)],
+        {"from": a[1]},
+    )
+    print(betaBank.positions(a[1], 6))
+    print(betaBank.fetchPositionLTV.call(a[1], 6))
+
+    # multi-hop flash liquidation, collateral - ctoken, underlying - utoken -> weth -> ctoken
+    rt2.short(
+        [2 ** 256 - 1, mathval(2), mathval(10), encode_path(path4, fee4), 0],
+        {"from": a[1]},
+    )
+    ext.setETHPrice(ctoken, 2 ** 112 * 4 // 10, {"from": a[0]})  # 0.4 ETH, above liquidation LTV
+    before = ctoken.balanceOf(a[2])
+    rt2.liquidate(
+        [a[1], 7, mathval(1), encode_path(path4, fee4), 0],
+        {"from": a[2]},
+    )
+    print(ctoken.balanceOf(a[2]) - before)
+    print(betaBank.positions(a[1], 7))
+    assert ctoken.balanceOf(a[2]) > before
+    assert abs(betaBank.fetchPositionDebt.call(a[1], 7) - mathval(1)) <= 1
+
+    # multi-hop leverage through utoken -> weth -> dtoken -> ctoken, pulling only what is missing
+    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
+    before = ctoken.balanceOf(a[1])
+    rt2.leverage(
+        [2 ** 256 - 1, mathval(4), mathval(20), encode_path(path5, fee5), mathval(20)],
+        {"from": a[1]},
+    )
+    print(betaBank.positions(a[1], 8))
+    assert betaBank.positions(a[1], 8)[4] == mathval(20)
+    assert abs(betaBank.fetchPositionDebt.call(a[1], 8) - mathval(4)) <= 1
+    assert mathval(15) < before - ctoken.balanceOf(a[1]) < mathval(20)  # 20 - ~4 swapped
+    assert ctoken.balanceOf(rt2) == 0
+    rt2.deleverage(
+        [8, mathval(0.1), encode_path(path5, fee5), mathval(100)],
+        {"from": a[1]},
+    )
+    print(betaBank.positions(a[1], 8))
+    ltv = betaBank.fetchPositionLTV.call(a[1], 8)
+    print(ltv)
+    assert mathval(0.1) <= ltv < mathval(0.11)
+
+    # multi-hop leverage with ETH collateral, utoken -> ctoken -> weth, unused ETH refunded
+    before = a[1].balance()
+    rt2.leverage(
+        [2 ** 256 - 1, mathval(2), mathval(10), encode_path(path6, fee6), mathval(10)],
+        {"value": mathval(10), "from": a[1]},
+    )
+    print(betaBank.positions(a[1], 9))
+    assert betaBank.positions(a[1], 9)[4] == mathval(10)
+    assert mathval(7) < before - a[1].balance() < mathval(10)  # 10 - ~2 swapped
+    assert rt2.balance() == 0
+    with brownie.reverts("leverage/too-much-put"):
+        rt2.leverage(
+            [9, mathval(4), mathval(20), encode_path(path6, fee6), mathval(1)],
+            {"value": mathval(1), "from": a[1]},
+        )
+
+    # leverage to a target collateral below the swap output, the surplus stays in the position
+    ctoken.transfer(rt2, mathval(1), {"from": a[9]})  # stray tokens are not swept to the caller
+    before = ctoken.balanceOf(a[1])
+    rt2.leverage(
+        [2 ** 256 - 1, mathval(2), mathval(1), encode_path(path1, fee1), 0],
+        {"from": a[1]},
+    )
+    print(betaBank.positions(a[1], 10))
+    assert betaBank.positions(a[1], 10)[4] > mathval(1)
+    assert ctoken.balanceOf(a[1]) == before
+    assert ctoken.balanceOf(rt2) == mathval(1)
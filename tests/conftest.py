@@ -0,0 +1,148 @@
+import pytest
+from brownie import (
+    a,
+    chain,
+    BetaBank,
+    BToken,
+    BetaConfig,
+    BetaOracleUniswapV2,
+    BetaInterestModelV1,
+    MockExternalOracle,
+    MockUniswapV2Factory,
+    MockUniswapV2Pair,
+    MockWETH,
+    MockLegacyBetaBank,
+    ERC20Contract,
+    BTokenDeployer,
+)
+
+
+# Shared deployments, built once per module and reverted after every test through `protocol`.
+# Tests that use them must not call chain.reset(), which would wipe the shared deployment.
+
+
+def mathval(val):
+    return int(val * 1000000) * 10 ** 12
+
+
+def set_pair_price(factory, weth, token, price):
+    """Deploys a token-WETH mock pair whose token price is `price` ETH, for an integer price."""
+    pair = a[0].deploy(MockUniswapV2Pair)
+    factory.setPair(token, weth, pair)
+    if str(token).lower() < str(weth).lower():
+        pair.setReserves(mathval(100), mathval(100 * price))
+    else:
+        pair.setReserves(mathval(100 * price), mathval(100))
+    return pair
+
+
+def deploy_protocol(bank, oracle_kind):
+    """Deploys `bank` with a utoken market (3 ETH) and ctoken collateral (1 ETH, 80% factor),
+    priced by an oracle quoting against a MockWETH.
+
+    The "external" kind prices both tokens through MockExternalOracle, the "pair" kind through
+    Uniswap V2 mock pairs with an initialized TWAP.
+    """
+    betaBank = a[0].deploy(bank)
+    config = a[0].deploy(BetaConfig, a[0], 0)
+    config.setRiskConfigs(
+        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
+    )
+    im = a[0].deploy(
+        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
+    )
+    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
+    utoken.mint(a[0], mathval(1000000))
+    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
+    ctoken.mint(a[1], mathval(1000000))
+    weth = a[0].deploy(MockWETH)
+    ext = a[0].deploy(MockExternalOracle)
+    factory = a[0].deploy(MockUniswapV2Factory)
+    oracle = a[0].deploy(BetaOracleUniswapV2, weth, factory, 3600)
+    if oracle_kind == "external":
+        ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
+        ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
+        oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
+    else:
+        set_pair_price(factory, weth, utoken, 3)  # utoken price is 3 ETH
+        set_pair_price(factory, weth, ctoken, 1)  # ctoken price is 1 ETH
+        oracle.massInitPriceFromPair([utoken, ctoken], {"from": a[0]})
+        chain.sleep(3600)
+        oracle.massUpdatePriceFromPair([utoken, ctoken], {"from": a[0]})
+    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
+    betaBank.create(utoken)
+    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
+    btoken = BToken.at(betaBank.bTokens(utoken))
+    config.setCollInfos(
+        [ctoken], [mathval(0.8)], [mathval(10000)], {"from": a[0]}
+    )  # 80% collateral factor
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
+    return {
+        "oracleKind": oracle_kind,
+        "betaBank": betaBank,
+        "config": config,
+        "im": im,
+        "ext": ext,
+        "factory": factory,
+        "oracle": oracle,
+        "weth": weth,
+        "utoken": utoken,
+        "ctoken": ctoken,
+        "btoken": btoken,
+    }
+
+
+@pytest.fixture(scope="module", params=["external", "pair"])
+def deployment(request, module_isolation):
+    """The shared BetaBank deployment, for both oracle kinds."""
+    return deploy_protocol(BetaBank, request.param)
+
+
+@pytest.fixture(scope="module", params=["external", "pair"])
+def legacy_deployment(request, module_isolation):
+    """The shared deployment around MockLegacyBetaBank, which can seed legacy layout positions."""
+    return deploy_protocol(MockLegacyBetaBank, request.param)
+
+
+@pytest.fixture
+def protocol(deployment, fn_isolation):
+    """The shared deployment, with every change reverted at the end of the test."""
+    return deployment
+
+
+@pytest.fixture
+def legacy_protocol(legacy_deployment, fn_isolation):
+    """The shared legacy deployment, with every change reverted at the end of the test."""
+    return legacy_deployment
+
+
+@pytest.fixture
+def set_price(protocol):
+    """Returns a function pricing a token through the external mock, in ETH times 2**112.
+
+    Works for both oracle variants, since the token is moved to the external oracle.
+    """
+    ext, oracle = protocol["ext"], protocol["oracle"]
+
+    def set_price(token, price):
+        ext.setETHPrice(token, price, {"from": a[0]})
+        oracle.setExternalOracle([token], ext, {"from": a[0]})
+
+    return set_price
+
+
+@pytest.fixture
+def create_market(protocol, set_price):
+    """Returns a function creating a new market on the shared bank, for an underlying priced at
+    1 ETH. The market uses the bank's interest model and config at the time of creation.
+    """
+    betaBank = protocol["betaBank"]
+
+    def create_market(token):
+        set_price(token, 2 ** 112)
+        betaBank.create(token, {"from": a[0]})
+        return BToken.at(betaBank.bTokens(token))
+
+    return create_market
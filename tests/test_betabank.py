@@ -3,37 +3,22 @@ import brownie
 from brownie import (
     a,
     chain,
-    BetaBank,
-    BToken,
-    BetaConfig,
-    BetaOracleUniswapV2,
-    BetaInterestModelV1,
-    MockExternalOracle,
     ERC20Contract,
-    MockExternalOracle,
     MockIsPermittedCallerTester,
-    BTokenDeployer,
     MockSameBlockTxTester,
+    MockLegacyBetaOracle,
 )
 
 
 ZERO = "0x0000000000000000000000000000000000000000"
-ONE = "0x0000000000000000000000000000000000000001"
-# Mocking arbitrary addresses
-WETH = "0x4de688DF50200AaAFada86898330Fc9aB2E6F4CC"
 
 
 def mathval(val):
     return int(val * 1000000) * 10 ** 12
 
 
-def test_betabank_governor():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), ONE, config, im)
+def test_betabank_governor(protocol):
+    betaBank = protocol["betaBank"]
     assert betaBank.governor() == a[0]
     assert betaBank.pendingGovernor() == ZERO
     with brownie.reverts("BetaBank/onlyGov"):
@@ -55,16 +40,11 @@ def test_betabank_governor():
     assert betaBank.pendingGovernor() == a[2]
 
 
-def test_betabank_setters_getters():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), a[1], config, im)
+def test_betabank_setters_getters(protocol):
+    betaBank, config, im = protocol["betaBank"], protocol["config"], protocol["im"]
     assert betaBank.config() == config
     assert betaBank.interestModel() == im
-    assert betaBank.oracle() == a[1]
+    assert betaBank.oracle() == protocol["oracle"]
     with brownie.reverts("BetaBank/onlyGov"):
         betaBank.setConfig(a[5], {"from": a[1]})
     with brownie.reverts("BetaBank/onlyGov"):
@@ -74,18 +54,14 @@ def test_betabank_setters_getters():
     betaBank.setConfig(a[2], {"from": a[0]})
     betaBank.setInterestModel(a[3], {"from": a[0]})
     betaBank.setOracle(a[4], {"from": a[0]})
+    assert not betaBank.batchOracle()  # not a contract, so no batched queries
     assert betaBank.config() == a[2]
     assert betaBank.interestModel() == a[3]
     assert betaBank.oracle() == a[4]
 
 
-def test_betabank_whitelist_setting_runner():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), ONE, config, im)
+def test_betabank_whitelist_setting_runner(protocol):
+    betaBank = protocol["betaBank"]
     with brownie.reverts("BetaBank/onlyGov"):
         betaBank.setRunnerWhitelists([a[5]], True, {"from": a[1]})
     assert not betaBank.runnerWhitelists(a[5])
@@ -96,44 +72,29 @@ def test_betabank_whitelist_setting_runner():
     assert not betaBank.runnerWhitelists(a[5])
 
 
-def test_betabank_whitelist_setting_owner():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), ONE, config, im)
+def test_betabank_whitelist_setting_owner(protocol):
+    betaBank = protocol["betaBank"]
     with brownie.reverts("BetaBank/onlyGov"):
-        betaBank.setOwnerWhitelists([a[1]], True, {"from": a[1]})
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    assert betaBank.ownerWhitelists(a[1])
+        betaBank.setOwnerWhitelists([a[2]], True, {"from": a[1]})
+    assert not betaBank.ownerWhitelists(a[2])
+    betaBank.setOwnerWhitelists([a[2]], True, {"from": a[0]})
+    assert betaBank.ownerWhitelists(a[2])
     assert not betaBank.ownerWhitelists(a[6])
-    betaBank.setOwnerWhitelists([a[1]], False, {"from": a[0]})
-    assert not betaBank.ownerWhitelists(a[1])
+    betaBank.setOwnerWhitelists([a[2]], False, {"from": a[0]})
+    assert not betaBank.ownerWhitelists(a[2])
 
 
-def test_betabank_allow_action_self():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), a[1], config, im)
+def test_betabank_allow_action_self(protocol):
+    betaBank = protocol["betaBank"]
     tester = a[0].deploy(MockIsPermittedCallerTester, betaBank)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
     assert tester.checkIsPermittedCaller(a[1], a[1], {"from": a[1]}).return_value
     assert tester.checkIsPermittedCaller(a[1], a[1], {"from": a[0]}).return_value
     assert not tester.checkIsPermittedCaller(a[1], a[0], {"from": a[1]}).return_value
     assert not tester.checkIsPermittedCaller(a[1], a[0], {"from": a[0]}).return_value
 
 
-def test_betabank_allow_action_global():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), a[1], config, im)
+def test_betabank_allow_action_global(protocol):
+    betaBank = protocol["betaBank"]
     tester = a[0].deploy(MockIsPermittedCallerTester, betaBank)
     assert not tester.checkIsPermittedCaller(a[1], a[5], {"from": a[1]}).return_value
     betaBank.setRunnerWhitelists([a[5]], True, {"from": a[0]})
@@ -141,21 +102,12 @@ def test_betabank_allow_action_global():
     assert tester.checkIsPermittedCaller(a[1], a[5], {"from": a[1]}).return_value
 
 
-def test_betabank_public_create():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
+def test_betabank_public_create(protocol, set_price):
+    betaBank = protocol["betaBank"]
     utoken1 = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
     utoken2 = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    ext.setETHPrice(utoken1, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(utoken2, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken1, utoken2], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
+    set_price(utoken1, 2 ** 112)
+    set_price(utoken2, 2 ** 112)
     betaBank.create(utoken1, {"from": a[0]})
     with brownie.reverts("create/unauthorized"):
         betaBank.create(utoken2, {"from": a[1]})
@@ -165,239 +117,124 @@ def test_betabank_public_create():
     betaBank.create(utoken2, {"from": a[1]})
 
 
-def test_betabank_open():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.setOwnerWhitelists([a[0], a[1]], True, {"from": a[0]})
+def test_betabank_open(protocol, set_price):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    otoken = a[0].deploy(ERC20Contract, "My Other Token Name", "OMYSYM")
+    set_price(otoken, 2 ** 112)
     with brownie.reverts("open/bad-underlying"):
-        betaBank.open(a[0], utoken, ctoken, {"from": a[0]})
-    betaBank.create(utoken)
-    btoken = BToken.at(betaBank.bTokens(utoken))
+        betaBank.open(a[1], otoken, ctoken, {"from": a[1]})
     with brownie.reverts("BetaBank/isPermittedByOwner"):
-        betaBank.open(a[0], utoken, ctoken, {"from": a[1]})
+        betaBank.open(a[1], utoken, ctoken, {"from": a[0]})
     with brownie.reverts("getCollFactor/no-collateral-factor"):
-        betaBank.open(a[0], utoken, ctoken, {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
+        betaBank.open(a[1], utoken, otoken, {"from": a[1]})
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
-    assert pid == 1
-    assert betaBank.nextPositionIds(a[0]) == 2
-    assert betaBank.nextPositionIds(a[1]) == 0
-    assert betaBank.positions(a[0], 1) == (0, 0, btoken, ctoken, 0, 0)
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    assert pid == 1
+    assert betaBank.nextPositionIds(a[1]) == 2
+    assert betaBank.nextPositionIds(a[0]) == 0
+    assert betaBank.positions(a[1], 1) == (0, 0, btoken, ctoken, 0, 0)
+    betaBank.setOwnerWhitelists([a[0]], True, {"from": a[0]})
+    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
     assert pid == 0
-    assert betaBank.nextPositionIds(a[0]) == 2
-    assert betaBank.nextPositionIds(a[1]) == 1
+    assert betaBank.nextPositionIds(a[1]) == 2
+    assert betaBank.nextPositionIds(a[0]) == 1
 
 
-def test_betabank_open_prices():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 0, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[0]], True, {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
+def test_betabank_open_prices(protocol, set_price):
+    betaBank, utoken, ctoken = protocol["betaBank"], protocol["utoken"], protocol["ctoken"]
+    set_price(ctoken, 0)
     with brownie.reverts("open/no-price"):
-        betaBank.open(a[0], utoken, ctoken, {"from": a[0]})
-    assert betaBank.nextPositionIds(a[0]) == 0
+        betaBank.open(a[1], utoken, ctoken, {"from": a[1]})
+    assert betaBank.nextPositionIds(a[1]) == 0
 
 
-def test_betabank_basic_put_take():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.setOwnerWhitelists([a[0], a[1]], True, {"from": a[0]})
-    betaBank.create(utoken)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
+def test_betabank_basic_put_take(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 1
+    ctoken.approve(betaBank, 0, {"from": a[1]})
     with brownie.reverts("ERC20: transfer amount exceeds allowance"):
-        betaBank.put(a[0], pid, mathval(100), {"from": a[0]})
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[0]})
+        betaBank.put(a[1], pid, mathval(100), {"from": a[1]})
+    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
     with brownie.reverts("BetaBank/checkPID"):
-        betaBank.put(a[0], 42, mathval(100), {"from": a[0]})
+        betaBank.put(a[1], 42, mathval(100), {"from": a[1]})
     with brownie.reverts("BetaBank/isPermittedByOwner"):
-        betaBank.put(a[0], pid, mathval(100), {"from": a[1]})
-    betaBank.put(a[0], pid, mathval(100), {"from": a[0]})
-    assert betaBank.positions(a[0], 1) == (25, 0, btoken, ctoken, mathval(100), 0)
+        betaBank.put(a[1], pid, mathval(100), {"from": a[0]})
+    betaBank.put(a[1], pid, mathval(100), {"from": a[1]})
+    put_block = chain.height
+    assert betaBank.positions(a[1], 1) == (put_block, 0, btoken, ctoken, mathval(100), 0)
     assert betaBank.totalCollaterals(ctoken) == mathval(100)
     with brownie.reverts("BetaBank/checkPID"):
-        betaBank.take(a[0], 42, mathval(25), {"from": a[0]})
+        betaBank.take(a[1], 42, mathval(25), {"from": a[1]})
     with brownie.reverts("BetaBank/isPermittedByOwner"):
-        betaBank.take(a[0], pid, mathval(25), {"from": a[1]})
+        betaBank.take(a[1], pid, mathval(25), {"from": a[0]})
     with brownie.reverts("Integer overflow"):
-        betaBank.take(a[0], pid, mathval(125), {"from": a[0]})
-    betaBank.take(a[0], pid, mathval(25), {"from": a[0]})
-    ctoken.transfer(a[3], mathval(25), {"from": a[0]})
-    assert betaBank.positions(a[0], 1) == (25, 29, btoken, ctoken, mathval(75), 0)
-    assert ctoken.balanceOf(a[3]) == mathval(25)
+        betaBank.take(a[1], pid, mathval(125), {"from": a[1]})
+    ctoken_bal = ctoken.balanceOf(a[1])
+    betaBank.take(a[1], pid, mathval(25), {"from": a[1]})
+    take_block = chain.height
+    assert betaBank.positions(a[1], 1) == (put_block, take_block, btoken, ctoken, mathval(75), 0)
+    assert ctoken.balanceOf(a[1]) - ctoken_bal == mathval(25)
     assert ctoken.balanceOf(betaBank) == mathval(75)
     assert betaBank.totalCollaterals(ctoken) == mathval(75)
 
 
-def test_betabank_put_over_cap():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.setOwnerWhitelists([a[0], a[1]], True, {"from": a[0]})
-    betaBank.create(utoken)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos([ctoken], [mathval(0.5)], [mathval(100)], {"from": a[0]})
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
+def test_betabank_put_over_cap(protocol):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    config.setCollInfos([ctoken], [mathval(0.8)], [mathval(100)], {"from": a[0]})
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
-    assert pid == 1
-    with brownie.reverts("ERC20: transfer amount exceeds allowance"):
-        betaBank.put(a[0], pid, mathval(100), {"from": a[0]})
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[0]})
-    with brownie.reverts("BetaBank/checkPID"):
-        betaBank.put(a[0], 42, mathval(100), {"from": a[0]})
-    with brownie.reverts("BetaBank/isPermittedByOwner"):
-        betaBank.put(a[0], pid, mathval(100), {"from": a[1]})
     with brownie.reverts("put/too-much-collateral"):
-        betaBank.put(a[0], pid, mathval(100) + 1, {"from": a[0]})
-    betaBank.put(a[0], pid, mathval(100), {"from": a[0]})
-    assert betaBank.positions(a[0], 1) == (26, 0, btoken, ctoken, mathval(100), 0)
-    with brownie.reverts("BetaBank/checkPID"):
-        betaBank.take(a[0], 42, mathval(25), {"from": a[0]})
-    with brownie.reverts("BetaBank/isPermittedByOwner"):
-        betaBank.take(a[0], pid, mathval(25), {"from": a[1]})
+        betaBank.put(a[1], pid, mathval(100) + 1, {"from": a[1]})
+    betaBank.put(a[1], pid, mathval(100), {"from": a[1]})
+    put_block = chain.height
+    assert betaBank.positions(a[1], pid) == (put_block, 0, btoken, ctoken, mathval(100), 0)
     with brownie.reverts("Integer overflow"):
-        betaBank.take(a[0], pid, mathval(125), {"from": a[0]})
-    betaBank.take(a[0], pid, mathval(25), {"from": a[0]})
-    ctoken.transfer(a[3], mathval(25), {"from": a[0]})
-    assert betaBank.positions(a[0], 1) == (26, 30, btoken, ctoken, mathval(75), 0)
-    assert ctoken.balanceOf(a[3]) == mathval(25)
+        betaBank.take(a[1], pid, mathval(125), {"from": a[1]})
+    betaBank.take(a[1], pid, mathval(25), {"from": a[1]})
+    take_block = chain.height
+    assert betaBank.positions(a[1], pid) == (put_block, take_block, btoken, ctoken, mathval(75), 0)
     assert ctoken.balanceOf(betaBank) == mathval(75)
 
 
-def test_betabank_multiple_put():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[0]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
-    assert pid == 0
-    pid = betaBank.open(a[0], utoken, ctoken, {"from": a[0]}).return_value
-    assert pid == 1
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[0]})
-    betaBank.put(a[0], pid, mathval(50), {"from": a[0]})
-    betaBank.put(a[0], pid, mathval(50), {"from": a[0]})
-    assert betaBank.positions(a[0], 1) == (23, 0, btoken, ctoken, mathval(100), 0)
-
-
-def test_betabank_basic_borrow_repay():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1] * 1, {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+def test_betabank_multiple_put(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    betaBank.put(a[1], pid, mathval(50), {"from": a[1]})
+    betaBank.put(a[1], pid, mathval(50), {"from": a[1]})
+    assert betaBank.positions(a[1], pid) == (chain.height, 0, btoken, ctoken, mathval(100), 0)
+
+
+def test_betabank_standard_collateral(protocol):
+    betaBank, config = protocol["betaBank"], protocol["config"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    assert not betaBank.standardCollaterals(ctoken)
+    config.setStandardTokens([ctoken], True, {"from": a[0]})
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    assert betaBank.standardCollaterals(ctoken)  # synced when the market is registered
+    betaBank.put(a[1], pid, mathval(100), {"from": a[1]})
+    assert betaBank.positions(a[1], pid)[4] == mathval(100)
+    config.setStandardTokens([ctoken], False, {"from": a[0]})
+    assert betaBank.standardCollaterals(ctoken)  # only applies once synced
+    betaBank.syncCollaterals([ctoken], {"from": a[2]})
+    assert not betaBank.standardCollaterals(ctoken)
+    betaBank.put(a[1], pid, mathval(50), {"from": a[1]})
+    assert betaBank.positions(a[1], pid)[4] == mathval(150)
+    assert betaBank.totalCollaterals(ctoken) == mathval(150)
+
+
+def test_betabank_basic_borrow_repay(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
     betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
     assert betaBank.fetchPositionLTV(a[1], pid).return_value == 0
     with brownie.reverts("BetaBank/checkPID"):
@@ -407,19 +244,15 @@ def test_betabank_basic_borrow_repay():
     with brownie.reverts("borrow/not-safe"):
         betaBank.borrow(a[1], pid, mathval(50), {"from": a[1]})
     betaBank.borrow(a[1], pid, mathval(20), {"from": a[1]})
-    assert betaBank.fetchPositionLTV(a[1], pid).return_value == mathval(
-        0.15
+    borrow_block = chain.height
+    assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
+        mathval(0.15)
     )  # (20*3) / (500*1*0.8)
-    assert betaBank.positions(a[1], pid) == (
-        28,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(20),
-    )
+    [*head, debt] = betaBank.positions(a[1], pid)
+    assert tuple(head) == (borrow_block, 0, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(20))
     assert utoken.balanceOf(a[1]) == mathval(20)
-    assert btoken.totalLoan() == 20000000000001000000
+    assert float(btoken.totalLoan()) == pytest.approx(mathval(20))
     with brownie.reverts("ERC20: transfer amount exceeds allowance"):
         betaBank.repay(a[1], pid, mathval(5), {"from": a[1]})
     utoken.approve(btoken, 2 ** 256 - 1, {"from": a[1]})
@@ -428,67 +261,31 @@ def test_betabank_basic_borrow_repay():
     with brownie.reverts("BetaBank/isPermittedByOwner"):
         betaBank.repay(a[1], pid, mathval(5), {"from": a[0]})
     betaBank.repay(a[1], pid, mathval(5), {"from": a[1]})
-    assert betaBank.fetchPositionLTV(a[1], pid).return_value == mathval(
-        0.1125
+    repay_block = chain.height
+    assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
+        mathval(0.1125)
     )  # (15*3) / (500*1*0.8)
-    assert betaBank.positions(a[1], pid) == (
-        28,
-        34,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(15),
-    )
+    [*head, debt] = betaBank.positions(a[1], pid)
+    assert tuple(head) == (borrow_block, repay_block, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(15))
     assert utoken.balanceOf(a[1]) == mathval(15)
-    assert btoken.totalLoan() == 15000000000001000000
+    assert float(btoken.totalLoan()) == pytest.approx(mathval(15))
 
 
-def test_betabank_interest_liquidate():
-    chain.reset()
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1] * 1, {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+def test_betabank_interest_liquidate(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
     betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
     assert betaBank.fetchPositionLTV(a[1], pid).return_value == 0
     assert betaBank.totalCollaterals(ctoken) == mathval(500)
     betaBank.borrow(a[1], pid, mathval(40), {"from": a[1]})
+    borrow_block = chain.height
     assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
         mathval(0.30)
     )  # (40*3) / (500*1*0.8)
-    assert betaBank.positions(a[1], pid) == (
-        25,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(40),
-    )
+    assert betaBank.positions(a[1], pid)[:5] == (borrow_block, 0, btoken, ctoken, mathval(500))
     chain.sleep(365 * 86400)
     assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
         mathval(0.36)
@@ -503,14 +300,9 @@ def test_betabank_interest_liquidate():
     assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
         mathval(0.5184)
     )  # 20% interest
-    assert betaBank.positions(a[1], pid) == (
-        25,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(40),
-    )
+    [*head, debt] = betaBank.positions(a[1], pid)
+    assert tuple(head) == (borrow_block, 0, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(40))
     assert float(btoken.totalLoan()) == pytest.approx(mathval(69.12))
     assert float(btoken.totalDebtShare()) == pytest.approx(mathval(40))
     with brownie.reverts("BetaBank/checkPID"):
@@ -538,32 +330,9 @@ def test_betabank_interest_liquidate():
     )
 
 
-def test_betabank_pausable():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1] * 1, {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+def test_betabank_pausable(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     with brownie.reverts("BetaBank/onlyGov"):
         betaBank.pause({"from": a[1]})
     betaBank.pause({"from": a[0]})
@@ -578,10 +347,8 @@ def test_betabank_pausable():
     with brownie.reverts("Pausable: not paused"):
         betaBank.unpause({"from": a[0]})
     assert not betaBank.paused()
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
     betaBank.pause({"from": a[0]})
     with brownie.reverts("Pausable: paused"):
         betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
@@ -606,33 +373,9 @@ def test_betabank_pausable():
     betaBank.liquidate(a[1], pid, mathval(27), {"from": a[0]})
 
 
-def test_betabank_borrowput_repaytake_same_block():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    btoken = BToken.at(betaBank.bTokens(utoken))
+def test_betabank_borrowput_repaytake_same_block(protocol):
+    betaBank, utoken, ctoken = protocol["betaBank"], protocol["utoken"], protocol["ctoken"]
     tester = a[0].deploy(MockSameBlockTxTester, betaBank, utoken, ctoken)
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1] * 1, {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
     betaBank.setOwnerWhitelists([tester], True, {"from": a[0]})
     ctoken.transfer(tester, mathval(1000), {"from": a[1]})
     tester.init(mathval(500), mathval(20), {"from": a[1]})
@@ -654,42 +397,17 @@ def test_betabank_borrowput_repaytake_same_block():
         tester.repayPut(mathval(10), {"from": a[1]})
 
 
-def test_betabank_altruistic_liquidate():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1] * 1, {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+def test_betabank_altruistic_liquidate(protocol, set_price):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
-    ctoken.approve(betaBank, 2 ** 256 - 1, {"from": a[1]})
     betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
     betaBank.borrow(a[1], pid, mathval(40), {"from": a[1]})
     with brownie.reverts("liquidate/not-liquidatable"):
         betaBank.liquidate(a[1], pid, mathval(10), {"from": a[0]})
     with brownie.reverts("selflessLiquidate/positive-collateral"):
         betaBank.selflessLiquidate(a[1], pid, mathval(40), {"from": a[0]})
-    ext.setETHPrice(ctoken, 1e-15 * 2 ** 112, {"from": a[0]})
+    set_price(ctoken, 1e-15 * 2 ** 112)
     betaBank.liquidate(a[1], pid, mathval(1e-6), {"from": a[0]})
     assert float(btoken.totalLoan()) == pytest.approx(mathval(40))
     assert float(btoken.totalDebtShare()) == pytest.approx(mathval(40))
@@ -704,36 +422,9 @@ def test_betabank_altruistic_liquidate():
     assert float(debt) == 0
 
 
-def test_betabank_recover_underlying():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    utoken.mint(a[1], mathval(100000))
-
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    config.setCollInfos(
-        [ctoken], [mathval(0.8)], [2 ** 256 - 1], {"from": a[0]}
-    )  # 80% collateral factor
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-
+def test_betabank_recover_underlying(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     with brownie.reverts("recover/not-bToken"):
         betaBank.recover(ctoken, utoken, 1, {"from": a[0]})
     with brownie.reverts("BetaBank/onlyGov"):
@@ -750,35 +441,12 @@ def test_betabank_recover_underlying():
     assert btoken_utoken_pos_bal - btoken_utoken_pre_bal == -mathval(10)
 
 
-def test_betabank_recover_non_underlying():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.2), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    utoken.mint(a[1], mathval(100000))
-
+def test_betabank_recover_non_underlying(protocol):
+    betaBank, btoken, ctoken = protocol["betaBank"], protocol["btoken"], protocol["ctoken"]
     mockToken = a[0].deploy(ERC20Contract, "Non Underlying Token Name", "NON")
     mockToken.mint(a[0], mathval(1000000))
     mockToken.mint(a[1], mathval(100000))
 
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})  # utoken price is 3 ETH
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})  # ctoken price is 1 ETH
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
-    btoken = BToken.at(betaBank.bTokens(utoken))
-
     mockToken.transfer(btoken, mathval(1000), {"from": a[1]})
 
     with brownie.reverts("recover/not-bToken"):
@@ -795,3 +463,268 @@ def test_betabank_recover_non_underlying():
     btoken_mockToken_pos_bal = mockToken.balanceOf(btoken)
     assert mockToken_pos_bal - mockToken_pre_bal == mathval(10)
     assert btoken_mockToken_pos_bal - btoken_mockToken_pre_bal == -mathval(10)
+
+
+def test_betabank_batch(protocol):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    pid0 = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    pid1 = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[1]})
+    BORROW, REPAY, PUT, TAKE = 0, 1, 2, 3
+    with brownie.reverts("BetaBank/isPermittedByOwner"):
+        betaBank.batch(a[1], [[PUT, pid0, mathval(500)]], {"from": a[0]})
+    with brownie.reverts("BetaBank/checkPID"):
+        betaBank.batch(a[1], [[PUT, 42, mathval(500)]], {"from": a[1]})
+    with brownie.reverts("batch/bad-action"):
+        betaBank.batch(a[1], [[4, pid0, mathval(500)]], {"from": a[1]})
+    with brownie.reverts("batch/not-safe"):
+        betaBank.batch(
+            a[1],
+            [
+                [PUT, pid0, mathval(500)],
+                [PUT, pid1, mathval(100)],
+                [BORROW, pid0, mathval(20)],
+                [BORROW, pid1, mathval(20)],  # (20*3) / (100*1*0.8) = 0.75
+            ],
+            {"from": a[1]},
+        )
+    betaBank.batch(
+        a[1],
+        [
+            [PUT, pid0, mathval(500)],
+            [PUT, pid1, mathval(100)],
+            [BORROW, pid0, mathval(20)],
+            [BORROW, pid1, mathval(5)],  # (5*3) / (100*1*0.8) = 0.1875
+        ],
+        {"from": a[1]},
+    )
+    [_, _, _, _, coll0, debt0] = betaBank.positions(a[1], pid0)
+    [_, _, _, _, coll1, debt1] = betaBank.positions(a[1], pid1)
+    assert (coll0, coll1) == (mathval(500), mathval(100))
+    assert float(debt0) == pytest.approx(mathval(20))
+    assert float(debt1) == pytest.approx(mathval(5))
+    assert betaBank.totalCollaterals(ctoken) == mathval(600)
+    assert utoken.balanceOf(a[1]) == mathval(25)
+    with brownie.reverts("take/bad-block"):
+        betaBank.batch(
+            a[1],
+            [[PUT, pid0, mathval(10)], [TAKE, pid0, mathval(10)]],
+            {"from": a[1]},
+        )
+    ctoken_bal = ctoken.balanceOf(a[1])
+    betaBank.batch(
+        a[1],
+        [
+            [REPAY, pid0, mathval(10)],
+            [REPAY, pid1, mathval(5)],
+            [TAKE, pid0, mathval(300)],
+            [TAKE, pid1, mathval(90)],
+        ],
+        {"from": a[1]},
+    )
+    [_, _, _, _, coll0, debt0] = betaBank.positions(a[1], pid0)
+    [_, _, _, _, coll1, debt1] = betaBank.positions(a[1], pid1)
+    assert (coll0, coll1) == (mathval(200), mathval(10))
+    assert float(debt0) == pytest.approx(mathval(10))
+    assert debt1 < mathval(0.001)  # only the interest accrued on the repaid 5 is left
+    assert ctoken.balanceOf(a[1]) - ctoken_bal == mathval(390)
+    assert betaBank.totalCollaterals(ctoken) == mathval(210)
+
+
+def test_betabank_liquidate_many(protocol, set_price, create_market):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    pids = [betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value for _ in range(3)]
+    for pid in pids:
+        betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
+        betaBank.borrow(a[1], pid, mathval(40), {"from": a[1]})
+    with brownie.reverts("liquidateMany/empty"):
+        betaBank.liquidateMany([], [], [], {"from": a[0]})
+    with brownie.reverts("liquidateMany/bad-length"):
+        betaBank.liquidateMany([a[1]], [0, 1], [mathval(10)], {"from": a[0]})
+    with brownie.reverts("liquidate/not-liquidatable"):
+        betaBank.liquidateMany([a[1]], [0], [mathval(10)], {"from": a[0]})
+    set_price(ctoken, 2 ** 112 // 2)  # ctoken price is 0.5 ETH
+    assert float(betaBank.fetchPositionLTV(a[1], 0).return_value) == pytest.approx(
+        mathval(0.6)
+    )  # (40*3) / (500*0.5*0.8)
+    with brownie.reverts("BetaBank/checkPID"):
+        betaBank.liquidateMany([a[1], a[1]], [0, 42], [1, 1], {"from": a[0]})
+    with brownie.reverts("liquidateMany/unsorted"):
+        betaBank.liquidateMany([a[1], a[1]], [1, 0], [1, 1], {"from": a[0]})
+    with brownie.reverts("liquidateMany/unsorted"):
+        betaBank.liquidateMany([a[1], a[1]], [0, 0], [1, 1], {"from": a[0]})
+    with brownie.reverts("liquidate/too-much-liquidation"):
+        betaBank.liquidateMany(
+            [a[1], a[1]], [0, 1], [mathval(10), mathval(21)], {"from": a[0]}
+        )
+    betaBank.liquidateMany([a[1], a[1]], [0, 1], [mathval(10), mathval(20)], {"from": a[0]})
+    assert float(btoken.totalLoan()) == pytest.approx(mathval(90))
+    assert float(btoken.totalDebtShare()) == pytest.approx(mathval(90))
+    assert ctoken.balanceOf(a[0]) == mathval(189)  # (10+20)*3/0.5*1.05
+    for pid, coll, debt in [(0, 437, 30), (1, 374, 20), (2, 500, 40)]:
+        [_, _, _, _, size, share] = betaBank.positions(a[1], pid)
+        assert size == mathval(coll)
+        assert float(share) == pytest.approx(mathval(debt))
+    assert betaBank.totalCollaterals(ctoken) == mathval(1500) - mathval(189)
+    # positions from another market cannot be mixed in
+    otoken = a[0].deploy(ERC20Contract, "My Other Token Name", "OMYSYM")
+    create_market(otoken)
+    pid = betaBank.open(a[1], otoken, ctoken, {"from": a[1]}).return_value
+    with brownie.reverts("liquidateMany/bad-market"):
+        betaBank.liquidateMany([a[1], a[1]], [2, pid], [1, 1], {"from": a[0]})
+
+
+def test_betabank_packed_positions(protocol):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    config.setCollInfos([ctoken], [mathval(0.8)], [2 ** 256 - 1], {"from": a[0]})
+    ctoken.mint(a[1], 2 ** 97)
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[1]})
+    pid0 = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    pid1 = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    assert betaBank.marketCount() == 1
+    assert betaBank.marketIds(btoken, ctoken) == 1
+    assert betaBank.markets(1) == (btoken, ctoken)
+    assert betaBank.positionMarketIds(a[1], pid0) == 1
+    assert betaBank.positionMarketIds(a[1], pid1) == 1
+    tx = betaBank.put(a[1], pid0, mathval(500), {"from": a[1]})
+    [put_block, _, _, _, coll, debt] = betaBank.positions(a[1], pid0)
+    assert (put_block, coll, debt) == (tx.block_number, mathval(500), 0)
+    tx = betaBank.borrow(a[1], pid0, mathval(40), {"from": a[1]})
+    [*head, debt] = betaBank.positions(a[1], pid0)
+    assert tuple(head) == (tx.block_number, 0, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(40))
+    tx = betaBank.repay(a[1], pid0, mathval(10), {"from": a[1]})
+    assert betaBank.positions(a[1], pid0)[1] == tx.block_number
+    assert float(betaBank.positions(a[1], pid0)[5]) == pytest.approx(mathval(30))
+    assert betaBank.legacyPositions(a[1], pid0) == (0, 0, ZERO, ZERO, 0, 0)
+    # sizes are packed into 96 bits, larger positions move to the legacy layout
+    betaBank.put(a[1], pid1, 2 ** 96 - 1, {"from": a[1]})
+    assert betaBank.positions(a[1], pid1)[4] == 2 ** 96 - 1
+    assert betaBank.positionMarketIds(a[1], pid1) == 1
+    betaBank.put(a[1], pid1, 2, {"from": a[1]})
+    assert betaBank.positionMarketIds(a[1], pid1) == 0
+    assert betaBank.legacyPositions(a[1], pid1)[2:] == (btoken, ctoken, 2 ** 96 + 1, 0)
+    assert betaBank.positions(a[1], pid1)[4] == 2 ** 96 + 1
+    betaBank.take(a[1], pid1, 2, {"from": a[1]})
+    assert betaBank.positionMarketIds(a[1], pid1) == 1
+    assert betaBank.legacyPositions(a[1], pid1) == (0, 0, ZERO, ZERO, 0, 0)
+    # already packed positions are left untouched by migration
+    with brownie.reverts("migratePositions/bad-length"):
+        betaBank.migratePositions([a[1]], [pid0, pid1], {"from": a[2]})
+    with brownie.reverts("BetaBank/checkPID"):
+        betaBank.migratePositions([a[1]], [42], {"from": a[2]})
+    debt = betaBank.positions(a[1], pid0)[5]
+    betaBank.migratePositions([a[1], a[1]], [pid0, pid1], {"from": a[2]})
+    assert betaBank.positions(a[1], pid0)[4:] == (mathval(500), debt)
+    assert betaBank.positions(a[1], pid1)[4:] == (2 ** 96 - 1, 0)
+
+
+def test_betabank_migrate_legacy_position(legacy_protocol):
+    betaBank, btoken = legacy_protocol["betaBank"], legacy_protocol["btoken"]
+    utoken, ctoken = legacy_protocol["utoken"], legacy_protocol["ctoken"]
+    # an ordinary position left in the legacy layout by an upgrade, backed by the bank's balance
+    ctoken.transfer(betaBank, mathval(500), {"from": a[1]})
+    betaBank.setLegacyPosition(a[1], 0, (1, 2, btoken, ctoken, mathval(500), 0))
+    assert betaBank.positionMarketIds(a[1], 0) == 0
+    assert betaBank.marketCount() == 0
+    assert betaBank.positions(a[1], 0) == (1, 2, btoken, ctoken, mathval(500), 0)
+    betaBank.migratePositions([a[1]], [0], {"from": a[2]})
+    assert betaBank.marketCount() == 1
+    assert betaBank.markets(1) == (btoken, ctoken)
+    assert betaBank.positionMarketIds(a[1], 0) == 1
+    assert betaBank.legacyPositions(a[1], 0) == (0, 0, ZERO, ZERO, 0, 0)
+    assert betaBank.positions(a[1], 0) == (1, 2, btoken, ctoken, mathval(500), 0)
+    assert betaBank.totalCollaterals(ctoken) == mathval(500)
+    # migrating again is a no-op, and the packed position works as any other
+    betaBank.migratePositions([a[1]], [0], {"from": a[2]})
+    assert betaBank.positions(a[1], 0) == (1, 2, btoken, ctoken, mathval(500), 0)
+    betaBank.borrow(a[1], 0, mathval(40), {"from": a[1]})
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 2, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(40))
+    assert betaBank.positionMarketIds(a[1], 0) == 1
+    assert utoken.balanceOf(a[1]) == mathval(40)
+
+
+def test_betabank_oversized_legacy_position(legacy_protocol):
+    betaBank, btoken = legacy_protocol["betaBank"], legacy_protocol["btoken"]
+    ext, oracle = legacy_protocol["ext"], legacy_protocol["oracle"]
+    utoken, ctoken = legacy_protocol["utoken"], legacy_protocol["ctoken"]
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[1]})
+    # a legacy position above the 96-bit packed limit, backed by the bank's balance
+    size = 2 ** 100
+    ctoken.mint(betaBank, size)
+    betaBank.setLegacyPosition(a[1], 0, (0, 0, btoken, ctoken, size, 0))
+    assert betaBank.positions(a[1], 0)[2:] == (btoken, ctoken, size, 0)
+    betaBank.borrow(a[1], 0, mathval(40), {"from": a[1]})
+    assert betaBank.positionMarketIds(a[1], 0) == 0
+    assert betaBank.positions(a[1], 0)[4] == size
+    assert float(betaBank.positions(a[1], 0)[5]) == pytest.approx(mathval(40))
+    ctoken_bal = ctoken.balanceOf(a[1])
+    betaBank.take(a[1], 0, 1, {"from": a[1]})
+    assert ctoken.balanceOf(a[1]) - ctoken_bal == 1
+    betaBank.repay(a[1], 0, mathval(10), {"from": a[1]})
+    assert betaBank.legacyPositions(a[1], 0)[4] == size - 1
+    assert float(betaBank.legacyPositions(a[1], 0)[5]) == pytest.approx(mathval(30))
+    betaBank.migratePositions([a[1]], [0], {"from": a[2]})  # stays in the legacy layout
+    assert betaBank.positionMarketIds(a[1], 0) == 0
+    # still liquidatable, and moved to the packed layout once it fits
+    ext.setETHPrice(ctoken, 1, {"from": a[0]})
+    oracle.setExternalOracle([ctoken], ext, {"from": a[0]})
+    betaBank.liquidate(a[1], 0, mathval(10), {"from": a[0]})
+    assert ctoken.balanceOf(a[0]) == size - 1
+    assert betaBank.positions(a[1], 0)[4] == 0
+    assert float(betaBank.positions(a[1], 0)[5]) == pytest.approx(mathval(20))
+    assert betaBank.positionMarketIds(a[1], 0) == 1
+    assert betaBank.legacyPositions(a[1], 0) == (0, 0, ZERO, ZERO, 0, 0)
+
+
+def test_betabank_zero_risk_params(protocol):
+    betaBank, config, ext = protocol["betaBank"], protocol["config"], protocol["ext"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    pids = [betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value for _ in range(2)]
+    for pid in pids:
+        betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
+        betaBank.borrow(a[1], pid, mathval(40), {"from": a[1]})
+    # a delisted collateral must not make every indebted position liquidatable
+    config.setCollInfos([ctoken], [0], [mathval(10000)], {"from": a[0]})
+    with brownie.reverts("liquidate/bad-collateral"):
+        betaBank.liquidateMany([a[1], a[1]], pids, [1, 1], {"from": a[0]})
+    with brownie.reverts("liquidate/bad-collateral"):
+        betaBank.liquidate(a[1], pids[0], 1, {"from": a[0]})
+    config.setCollInfos([ctoken], [mathval(0.8)], [mathval(10000)], {"from": a[0]})
+    # a zero safety LTV disables borrows and takes, as getSafetyLTV did
+    config.setRiskConfigs([0], [[0, mathval(0.5), mathval(0.05)]], {"from": a[0]})
+    with brownie.reverts("borrow/no-safety-ltv"):
+        betaBank.borrow(a[1], pids[0], 1, {"from": a[1]})
+    with brownie.reverts("take/no-safety-ltv"):
+        betaBank.take(a[1], pids[0], 1, {"from": a[1]})
+
+
+def test_betabank_legacy_oracle(protocol):
+    betaBank, utoken, ctoken = protocol["betaBank"], protocol["utoken"], protocol["ctoken"]
+    legacy = a[0].deploy(MockLegacyBetaOracle)
+    legacy.setETHPrice(utoken, 3 * 2 ** 112)  # utoken price is 3 ETH
+    legacy.setETHPrice(ctoken, 2 ** 112)  # ctoken price is 1 ETH
+    assert betaBank.batchOracle()
+    betaBank.setOracle(legacy, {"from": a[0]})
+    # without getAssetETHPrices, detected on setOracle, prices are fetched one token at a time
+    assert not betaBank.batchOracle()
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    betaBank.put(a[1], pid, mathval(300), {"from": a[1]})
+    betaBank.borrow(a[1], pid, mathval(25), {"from": a[1]})  # 75 / (300 * 0.8) LTV
+    assert float(betaBank.fetchPositionLTV(a[1], pid).return_value) == pytest.approx(
+        mathval(0.3125), rel=1e-6
+    )
+    with brownie.reverts("borrow/not-safe"):
+        betaBank.borrow(a[1], pid, mathval(10), {"from": a[1]})
+    # a failing price query still reverts with the oracle's reason
+    legacy.setETHPrice(ctoken, 0)
+    with brownie.reverts("getAssetETHPrice/no-price"):
+        betaBank.borrow(a[1], pid, 1, {"from": a[1]})
+    # switching back to a batched oracle is detected as well
+    betaBank.setOracle(protocol["oracle"], {"from": a[0]})
+    assert betaBank.batchOracle()
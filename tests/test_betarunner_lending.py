@@ -1,142 +1,110 @@
 import pytest
 import brownie
+from eth_account import Account
+from eth_account.messages import encode_structured_data
 from brownie import (
     a,
+    accounts,
     chain,
-    BetaBank,
     BToken,
-    BetaConfig,
-    BetaOracleUniswapV2,
-    BetaInterestModelV1,
     BetaRunnerLending,
-    MockExternalOracle,
-    ERC20Contract,
-    MockExternalOracle,
-    MockWETH,
-    BTokenDeployer,
+    MockERC20Permit,
 )
 
 
-ZERO = "0x0000000000000000000000000000000000000000"
-ONE = "0x0000000000000000000000000000000000000001"
-
-
 def mathval(val):
     return int(val * 1000000) * 10 ** 12
 
 
+def sign_permit(token, owner, spender, value, deadline=2 ** 256 - 1):
+    """Returns the (value, deadline, v, r, s) EIP-2612 permit of a local `owner` account."""
+    message = {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+                {"name": "verifyingContract", "type": "address"},
+            ],
+            "Permit": [
+                {"name": "owner", "type": "address"},
+                {"name": "spender", "type": "address"},
+                {"name": "value", "type": "uint256"},
+                {"name": "nonce", "type": "uint256"},
+                {"name": "deadline", "type": "uint256"},
+            ],
+        },
+        "primaryType": "Permit",
+        "domain": {
+            "name": token.name(),
+            "version": "1",
+            "chainId": chain.id,
+            "verifyingContract": token.address,
+        },
+        "message": {
+            "owner": owner.address,
+            "spender": str(spender),
+            "value": value,
+            "nonce": token.nonces(owner),
+            "deadline": deadline,
+        },
+    }
+    signed = Account.sign_message(encode_structured_data(message), owner.private_key)
+    return (value, deadline, signed.v, signed.r, signed.s)
+
+
 @pytest.fixture
-def weth():
-    chain.reset()
-    return a[0].deploy(MockWETH)
+def runner(protocol):
+    """A lending runner on the shared bank, which also gets the WETH market the runner needs."""
+    betaBank, weth = protocol["betaBank"], protocol["weth"]
+    betaBank.create(weth, {"from": a[0]})
+    return a[0].deploy(BetaRunnerLending, betaBank, weth)
 
 
-def test_rtlending_borrow_already_open(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    betaBank.setOwnerWhitelists([a[1]], True, {"from": a[0]})
+@pytest.fixture
+def bweth(protocol, runner):
+    """The WETH market, with 10 WETH supplied by a[0]."""
+    weth = protocol["weth"]
+    bweth = BToken.at(protocol["betaBank"].bTokens(weth))
+    weth.approve(bweth, 2 ** 256 - 1, {"from": a[0]})
+    weth.deposit({"value": mathval(10), "from": a[0]})
+    bweth.mint(a[0], mathval(10), {"from": a[0]})
+    return bweth
+
+
+def test_rtlending_borrow_already_open(protocol, runner):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
     pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
     assert pid == 0
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+    rt = runner
     ctoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     with brownie.reverts("BetaBank/isPermittedByOwner"):
         rt.borrow(pid, utoken, ctoken, mathval(20), mathval(500), {"from": a[1]})
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     rt.borrow(pid, utoken, ctoken, mathval(20), mathval(500), {"from": a[1]})
-    assert betaBank.positions(a[1], pid) == (
-        28,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(20),
-    )
+    [*head, debt] = betaBank.positions(a[1], pid)
+    assert tuple(head) == (chain.height, 0, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(20))
 
 
-def test_rtlending_borrow_new(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_borrow_new(protocol, runner):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    rt = runner
     ctoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     rt.borrow(2 ** 256 - 1, utoken, ctoken, mathval(20), mathval(500), {"from": a[1]})
-    assert betaBank.positions(a[1], 0) == (
-        25,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(20),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 0, btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(20))
 
 
-def test_rtlending_borrow_eth_collateral(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-    config.setCollInfos([weth], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_borrow_eth_collateral(protocol, runner):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, weth = protocol["utoken"], protocol["weth"]
+    config.setCollInfos([weth], [mathval(0.5)], [2 ** 256 - 1], {"from": a[0]})
+    rt = runner
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     rt.borrow(
         2 ** 256 - 1,
@@ -146,125 +114,53 @@ def test_rtlending_borrow_eth_collateral(weth):
         mathval(5),
         {"value": mathval(5), "from": a[1]},
     )
-    assert betaBank.positions(a[1], 0) == (
-        21,
-        0,
-        btoken,
-        weth,
-        mathval(5),
-        mathval(0.2),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 0, btoken, weth, mathval(5))
+    assert float(debt) == pytest.approx(mathval(0.2))
 
 
-def test_rtlending_borrow_eth_out(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(ctoken, 2 ** 112 // 4, {"from": a[0]})
-    oracle.setExternalOracle([ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(weth))
-    weth.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    weth.deposit({"value": mathval(10), "from": a[0]})
-    btoken.mint(a[0], mathval(10), {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_borrow_eth_out(protocol, runner, bweth, set_price):
+    betaBank, ctoken, weth = protocol["betaBank"], protocol["ctoken"], protocol["weth"]
+    set_price(ctoken, 2 ** 112 // 4)
+    rt = runner
     ctoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     bal0 = a[1].balance()
     rt.borrow(2 ** 256 - 1, weth, ctoken, mathval(1), mathval(500), {"from": a[1]})
     bal1 = a[1].balance()
     assert bal1 - bal0 == mathval(1)
-    assert betaBank.positions(a[1], 0) == (
-        22,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(1),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 0, bweth, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(1))
 
 
-def test_rtlending_repay_basic(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})
-    ext.setETHPrice(ctoken, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken, ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_repay_basic(protocol, runner):
+    betaBank, btoken = protocol["betaBank"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    rt = runner
     ctoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     rt.borrow(2 ** 256 - 1, utoken, ctoken, mathval(20), mathval(500), {"from": a[1]})
+    borrow_block = chain.height
     utoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     with brownie.reverts("Integer overflow"):
         rt.repay(0, utoken, ctoken, mathval(10), mathval(1000), {"from": a[1]})
     with brownie.reverts("take/not-safe"):
         rt.repay(0, utoken, ctoken, mathval(10), mathval(400), {"from": a[1]})
     rt.repay(0, utoken, ctoken, mathval(10), mathval(100), {"from": a[1]})
-    assert betaBank.positions(a[1], 0) == (
-        25,
-        29,
-        btoken,
-        ctoken,
-        mathval(400),
-        mathval(10),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (borrow_block, chain.height, btoken, ctoken, mathval(400))
+    assert float(debt) == pytest.approx(mathval(10))
+    utoken.transfer(a[1], mathval(1), {"from": a[0]})  # covers the interest accrued so far
     rt.repay(0, utoken, ctoken, mathval(1000), mathval(400), {"from": a[1]})
-    assert betaBank.positions(a[1], 0) == (25, 30, btoken, ctoken, 0, 0)
+    assert betaBank.positions(a[1], 0) == (borrow_block, chain.height, btoken, ctoken, 0, 0)
 
 
-def test_rtlending_repay_eth_collateral(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    utoken = a[0].deploy(ERC20Contract, "My Underlying Token Name", "UMYSYM")
-    utoken.mint(a[0], mathval(1000000))
-    ext.setETHPrice(utoken, 3 * 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([utoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(utoken)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(utoken))
-    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    btoken.mint(a[0], mathval(1000), {"from": a[0]})
-    config.setCollInfos([weth], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_repay_eth_collateral(protocol, runner):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, weth = protocol["utoken"], protocol["weth"]
+    config.setCollInfos([weth], [mathval(0.5)], [2 ** 256 - 1], {"from": a[0]})
+    rt = runner
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     rt.borrow(
         2 ** 256 - 1,
@@ -274,14 +170,9 @@ def test_rtlending_repay_eth_collateral(weth):
         mathval(5),
         {"value": mathval(5), "from": a[1]},
     )
-    assert betaBank.positions(a[1], 0) == (
-        21,
-        0,
-        btoken,
-        weth,
-        mathval(5),
-        mathval(0.2),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 0, btoken, weth, mathval(5))
+    assert float(debt) == pytest.approx(mathval(0.2))
     utoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     bal0 = a[1].balance()
     rt.repay(0, utoken, weth, mathval(0.1), mathval(2), {"from": a[1]})
@@ -289,40 +180,16 @@ def test_rtlending_repay_eth_collateral(weth):
     assert bal1 - bal0 == mathval(2)
 
 
-def test_rtlending_borrow_eth_underlying(weth):
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    config.setRiskConfigs(
-        [0], [[mathval(0.33), mathval(0.5), mathval(0.05)]], {"from": a[0]}
-    )
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, weth, ONE, 3600)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
-    ctoken = a[0].deploy(ERC20Contract, "My Collateral Token Name", "CMYSYM")
-    ctoken.mint(a[1], mathval(1000000))
-    ext.setETHPrice(ctoken, 2 ** 112 // 4, {"from": a[0]})
-    oracle.setExternalOracle([ctoken], ext, {"from": a[0]})
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    betaBank.create(weth)
-    btoken = BToken.at(betaBank.bTokens(weth))
-    weth.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
-    weth.deposit({"value": mathval(10), "from": a[0]})
-    btoken.mint(a[0], mathval(10), {"from": a[0]})
-    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1] * 1, {"from": a[0]})
-    rt = a[0].deploy(BetaRunnerLending, betaBank, weth)
+def test_rtlending_borrow_eth_underlying(protocol, runner, bweth, set_price):
+    betaBank, ctoken, weth = protocol["betaBank"], protocol["ctoken"], protocol["weth"]
+    set_price(ctoken, 2 ** 112 // 4)
+    rt = runner
     betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
     ctoken.approve(rt, 2 ** 256 - 1, {"from": a[1]})
     rt.borrow(2 ** 256 - 1, weth, ctoken, mathval(1), mathval(500), {"from": a[1]})
-    assert betaBank.positions(a[1], 0) == (
-        22,
-        0,
-        btoken,
-        ctoken,
-        mathval(500),
-        mathval(1),
-    )
+    [*head, debt] = betaBank.positions(a[1], 0)
+    assert tuple(head) == (chain.height, 0, bweth, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(1))
     with brownie.reverts(""):
         rt.repay(
             0,
@@ -343,3 +210,40 @@ def test_rtlending_borrow_eth_underlying(weth):
     )
     bal1 = a[1].balance()
     assert bal0 - bal1 == mathval(0.5)
+
+
+def test_rtlending_borrow_repay_with_permit(protocol, runner, create_market, set_price):
+    betaBank, config = protocol["betaBank"], protocol["config"]
+    owner = accounts.add()
+    a[0].transfer(owner, mathval(1))
+    utoken = a[0].deploy(MockERC20Permit, "My Underlying Token Name", "UMYSYM")
+    utoken.mint(a[0], mathval(1000000))
+    ctoken = a[0].deploy(MockERC20Permit, "My Collateral Token Name", "CMYSYM")
+    ctoken.mint(owner, mathval(1000))
+    btoken = create_market(utoken)
+    set_price(ctoken, 2 ** 112)
+    utoken.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    btoken.mint(a[0], mathval(1000), {"from": a[0]})
+    config.setCollInfos([ctoken], [mathval(0.5)], [2 ** 256 - 1], {"from": a[0]})
+    rt = runner
+    betaBank.setRunnerWhitelists([rt], True, {"from": a[0]})
+    # no prior approve transaction, the permit is consumed by the same call
+    permit = sign_permit(ctoken, owner, rt, mathval(500))
+    rt.borrowWithPermit(
+        2 ** 256 - 1, utoken, ctoken, mathval(20), mathval(500), permit, {"from": owner}
+    )
+    [*head, debt] = betaBank.positions(owner, 0)
+    assert tuple(head[2:]) == (btoken, ctoken, mathval(500))
+    assert float(debt) == pytest.approx(mathval(20))
+    assert ctoken.nonces(owner) == 1
+    assert ctoken.allowance(owner, rt) == 0
+    assert utoken.balanceOf(owner) == mathval(20)
+    with brownie.reverts("ERC20Permit: invalid signature"):
+        rt.borrowWithPermit(0, utoken, ctoken, mathval(1), mathval(1), permit, {"from": owner})
+    permit = sign_permit(utoken, owner, rt, mathval(10))
+    rt.repayWithPermit(0, utoken, ctoken, mathval(10), mathval(100), permit, {"from": owner})
+    [*head, debt] = betaBank.positions(owner, 0)
+    assert tuple(head[2:]) == (btoken, ctoken, mathval(400))
+    assert float(debt) == pytest.approx(mathval(10))
+    assert utoken.nonces(owner) == 1
+    assert ctoken.balanceOf(owner) == mathval(600)
@@ -1,87 +1,156 @@
 import pytest
 import brownie
+from eth_account import Account
+from eth_account.messages import encode_structured_data
 from brownie import (
     a,
+    accounts,
     chain,
-    BetaBank,
     BToken,
     BetaConfig,
-    BetaOracleUniswapV2,
     BetaInterestModelV1,
-    MockExternalOracle,
     ERC20Contract,
+    MockERC20Permit,
     BTokenDeployer,
+    web3,
 )
 
 
 ZERO = "0x0000000000000000000000000000000000000000"
 ONE = "0x0000000000000000000000000000000000000001"
-# Mocking arbitrary addresses
-WETH = "0x4de688DF50200AaAFada86898330Fc9aB2E6F4CC"
 
 
 def mathval(val):
     return int(val * 1000000) * 10 ** 12
 
 
-def test_btoken_deployer():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
-    )
-    token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+def test_btoken_deployer(protocol, create_market):
+    betaBank, btoken, token = protocol["betaBank"], protocol["btoken"], protocol["utoken"]
     assert btoken == BTokenDeployer.at(betaBank.deployer()).bTokenFor(betaBank, token)
+    deployer = BTokenDeployer.at(betaBank.deployer())
+    impl = BToken.at(deployer.implementationFor(betaBank))
+    assert impl.betaBank() == betaBank
+    assert impl.underlying() == ZERO
+    assert len(web3.eth.get_code(btoken.address)) == 45  # EIP-1167 minimal proxy
+    assert btoken.underlying() == token
+    assert btoken.interestRate() == mathval(0.20)
+    with brownie.reverts("initialize/not-deployer"):
+        btoken.initialize(token, {"from": a[0]})
+    with brownie.reverts("initialize/not-deployer"):
+        impl.initialize(token, {"from": a[0]})
+    # the implementation is reused for the next market
+    token2 = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
+    assert create_market(token2) == deployer.bTokenFor(betaBank, token2)
+    assert betaBank.allBTokensLength() == 2
 
 
-def test_btoken_details():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0.05), mathval(100), mathval(0.5)
+def test_btoken_permit(protocol):
+    btoken = protocol["btoken"]
+    owner = accounts.add()
+    message = {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+                {"name": "verifyingContract", "type": "address"},
+            ],
+            "Permit": [
+                {"name": "owner", "type": "address"},
+                {"name": "spender", "type": "address"},
+                {"name": "value", "type": "uint256"},
+                {"name": "nonce", "type": "uint256"},
+                {"name": "deadline", "type": "uint256"},
+            ],
+        },
+        "primaryType": "Permit",
+        "domain": {
+            "name": "B Token",
+            "version": "1",
+            "chainId": chain.id,
+            "verifyingContract": btoken.address,
+        },
+        "message": {
+            "owner": owner.address,
+            "spender": a[1].address,
+            "value": 100,
+            "nonce": 0,
+            "deadline": 2 ** 256 - 1,
+        },
+    }
+    signed = Account.sign_message(encode_structured_data(message), owner.private_key)
+    btoken.permit(owner, a[1], 100, 2 ** 256 - 1, signed.v, signed.r, signed.s, {"from": a[2]})
+    assert btoken.allowance(owner, a[1]) == 100
+    assert btoken.nonces(owner) == 1
+    with brownie.reverts("permit/invalid-signature"):
+        btoken.permit(owner, a[1], 100, 2 ** 256 - 1, signed.v, signed.r, signed.s, {"from": a[2]})
+
+
+def test_btoken_mint_with_permit(create_market):
+    token = a[0].deploy(MockERC20Permit, "My Token Name", "MYSYM")
+    btoken = create_market(token)
+    owner = accounts.add()
+    a[0].transfer(owner, mathval(1))
+    token.mint(owner, mathval(500))
+    message = {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+                {"name": "verifyingContract", "type": "address"},
+            ],
+            "Permit": [
+                {"name": "owner", "type": "address"},
+                {"name": "spender", "type": "address"},
+                {"name": "value", "type": "uint256"},
+                {"name": "nonce", "type": "uint256"},
+                {"name": "deadline", "type": "uint256"},
+            ],
+        },
+        "primaryType": "Permit",
+        "domain": {
+            "name": "My Token Name",
+            "version": "1",
+            "chainId": chain.id,
+            "verifyingContract": token.address,
+        },
+        "message": {
+            "owner": owner.address,
+            "spender": btoken.address,
+            "value": mathval(500),
+            "nonce": 0,
+            "deadline": 2 ** 256 - 1,
+        },
+    }
+    signed = Account.sign_message(encode_structured_data(message), owner.private_key)
+    btoken.mintWithPermit(
+        a[1], mathval(500), mathval(500), 2 ** 256 - 1, signed.v, signed.r, signed.s, {"from": owner}
     )
-    token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
-    assert btoken.name() == "B My Token Name"
-    assert btoken.symbol() == "bMYSYM"
+    assert token.nonces(owner) == 1
+    assert token.balanceOf(btoken) == mathval(500)
+    assert btoken.balanceOf(a[1]) == 499999999999999000000
+    with brownie.reverts("ERC20Permit: invalid signature"):
+        btoken.mintWithPermit(
+            a[1], mathval(500), mathval(500), 2 ** 256 - 1, signed.v, signed.r, signed.s, {"from": owner}
+        )
+
+
+def test_btoken_details(protocol, create_market):
+    btoken = protocol["btoken"]
+    assert btoken.name() == "B My Underlying Token Name"
+    assert btoken.symbol() == "bUMYSYM"
     assert btoken.decimals() == 18
-    ext.setETHPrice(config, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([config], ext, {"from": a[0]})
-    betaBank.create(config)
-    btoken = BToken.at(betaBank.bTokens(config))
+    btoken = create_market(protocol["config"])
     assert btoken.name() == "B Token"
     assert btoken.symbol() == "bTOKEN"
     assert btoken.decimals() == 18
 
 
-def test_btoken_basic_mint_burn():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
-    )
+def test_btoken_basic_mint_burn(create_market):
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     with brownie.reverts("ERC20: transfer amount exceeds allowance"):
         btoken.mint(a[0], mathval(500), {"from": a[0]})
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
@@ -102,21 +171,11 @@ def test_btoken_basic_mint_burn():
     assert token.balanceOf(a[2]) == mathval(300)
 
 
-def test_btoken_borrow_repay():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0), mathval(100), mathval(0)
-    )  # 20% per year
+def test_btoken_borrow_repay(protocol, create_market):
+    betaBank = protocol["betaBank"]  # 20% per year
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
     btoken.mint(a[0], mathval(500), {"from": a[0]})
     btoken.mint(a[1], mathval(500), {"from": a[0]})
@@ -153,21 +212,15 @@ def test_btoken_borrow_repay():
     assert float(btoken.totalDebtShare()) == pytest.approx(54545454545455545455)
 
 
-def test_btoken_interest_rebase():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
+def test_btoken_interest_rebase(protocol, create_market):
+    betaBank = protocol["betaBank"]
     im = a[0].deploy(
         BetaInterestModelV1, mathval(0.20), mathval(0), mathval(100), mathval(0.5)
     )  # 20% per year
+    betaBank.setInterestModel(im, {"from": a[0]})
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
     assert btoken.interestRate() == mathval(0.20)
     chain.sleep(365 * 86400)
@@ -187,21 +240,15 @@ def test_btoken_interest_rebase():
     assert float(btoken.interestRate()) == pytest.approx(mathval(0.1125), rel=1e-2)
 
 
-def test_btoken_accrue_interest():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
+def test_btoken_accrue_interest(protocol, create_market):
+    betaBank = protocol["betaBank"]
     im = a[0].deploy(
         BetaInterestModelV1, mathval(0.10), mathval(0), mathval(100), mathval(0.5)
     )  # 10% per year
+    betaBank.setInterestModel(im, {"from": a[0]})
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
     chain.sleep(86400)
     btoken.accrue({"from": a[0]})
@@ -213,21 +260,11 @@ def test_btoken_accrue_interest():
     assert float(btoken.interestRate()) == pytest.approx(mathval(0.090413), rel=1e-4)
 
 
-def test_btoken_beneficiary():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0.20), mathval(0), mathval(100), mathval(0)
-    )  # 20% per year
+def test_btoken_beneficiary(protocol, create_market):
+    betaBank, config = protocol["betaBank"], protocol["config"]  # 20% per year
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
     btoken.mint(a[0], mathval(500), {"from": a[0]})
     btoken.borrow(a[1], mathval(300), {"from": betaBank})
@@ -236,34 +273,116 @@ def test_btoken_beneficiary():
     assert float(btoken.totalLoan()) == pytest.approx(mathval(360))
     assert float(btoken.totalSupply()) == pytest.approx(mathval(500))
     config.setReserveInfo(a[2], mathval(0.2), {"from": a[0]})
+    assert btoken.reserveRate() == 0  # reserve info only applies once synced, by design
+    betaBank.syncBTokens([btoken], {"from": a[1]})
+    assert btoken.reserveRate() == mathval(0.2)
+    assert btoken.reserveBeneficiary() == a[2]
     chain.sleep(365 * 86400)
     btoken.accrue({"from": a[0]})
     assert float(btoken.totalLoan()) == pytest.approx(mathval(432))
+    # the reserve counts towards share prices but is only minted, and in the supply, on claim
+    assert float(btoken.totalSupply()) == pytest.approx(mathval(500))
+    assert btoken.balanceOf(a[2]) == 0
+    assert float(btoken.pendingReserve()) == pytest.approx(mathval(11.6580), rel=1e-3)
+    btoken.claimReserve({"from": a[1]})
+    assert btoken.pendingReserve() == 0
     assert float(btoken.totalSupply()) == pytest.approx(mathval(511.6580), rel=1e-3)
     assert float(btoken.balanceOf(a[2])) == pytest.approx(mathval(11.6580), rel=1e-3)
     btoken.burn(a[2], btoken.balanceOf(a[2]), {"from": a[2]})
-    assert float(token.balanceOf(a[2])) == pytest.approx(mathval(14.4))
+    assert float(token.balanceOf(a[2])) == pytest.approx(mathval(14.4), rel=1e-4)
+    # changing the beneficiary accrues and mints what is pending to the previous one
+    chain.sleep(365 * 86400)
+    chain.mine()
+    assert btoken.pendingReserve() == 0
+    _, _, credit = btoken.previewAccrue()
+    assert credit > 0
+    config.setReserveInfo(a[3], mathval(0.2), {"from": a[0]})
+    betaBank.syncBTokens([btoken], {"from": a[1]})
+    assert btoken.pendingReserve() == 0
+    assert float(btoken.balanceOf(a[2])) == pytest.approx(float(credit), rel=1e-4)
+    assert btoken.reserveBeneficiary() == a[3]
 
 
-def test_btoken_paused():
-    betaBank = a[0].deploy(BetaBank)
-    config = a[0].deploy(BetaConfig, a[0], 0)
-    im = a[0].deploy(
-        BetaInterestModelV1, mathval(0), mathval(0), mathval(100), mathval(0)
+def test_btoken_preview_accrue(protocol, create_market):
+    betaBank = protocol["betaBank"]  # 20% per year
+    protocol["config"].setReserveInfo(a[2], mathval(0.2), {"from": a[0]})
+    token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
+    token.mint(a[0], mathval(1000000))
+    btoken = create_market(token)
+    token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    btoken.mint(a[0], mathval(500), {"from": a[0]})
+    btoken.borrow(a[1], mathval(300), {"from": betaBank})
+    assert btoken.previewDebtShareValue(0) == 0
+    chain.sleep(365 * 86400)
+    chain.mine()
+    interest, rate, credit = btoken.previewAccrue()
+    assert float(interest) == pytest.approx(mathval(60))
+    assert rate == mathval(0.20)
+    assert float(credit) == pytest.approx(mathval(5.8823), rel=1e-3)  # 12 * 500 / (360 + 200 - 12)
+    assert float(btoken.pendingTotalLoan()) == pytest.approx(mathval(360))
+    assert float(btoken.previewDebtShareValue(mathval(150))) == pytest.approx(mathval(180))
+    assert btoken.totalLoan() == mathval(300)  # nothing written
+    btoken.accrue({"from": a[0]})
+    assert float(btoken.totalLoan()) == pytest.approx(mathval(360))
+    assert float(btoken.pendingReserve()) == pytest.approx(float(credit), rel=1e-3)
+
+
+def test_btoken_packed_state(protocol, create_market):
+    betaBank = protocol["betaBank"]
+    token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
+    token.mint(a[0], 2 ** 129)
+    btoken = create_market(token)
+    token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    btoken.mint(a[0], mathval(500), {"from": a[0]})
+    btoken.borrow(a[1], mathval(300), {"from": betaBank})
+    pool_word = web3.eth.get_storage_at(btoken.address, 8)
+    chain.sleep(86400)
+    btoken.accrue({"from": a[0]})
+    # accrue only writes the accrue slot; the pool slot is untouched
+    assert web3.eth.get_storage_at(btoken.address, 8) == pool_word
+    # slot 7 (after ERC20, ERC20Permit and ReentrancyGuard) holds AccrueState, slot 8 PoolState
+    word = int(web3.eth.get_storage_at(btoken.address, 7).hex(), 16)
+    assert word & (2 ** 32 - 1) == btoken.lastAccrueTime()
+    assert (word >> 32) & (2 ** 96 - 1) == btoken.interestRate()
+    assert word >> 128 == btoken.totalLoan()
+    word = int(web3.eth.get_storage_at(btoken.address, 8).hex(), 16)
+    assert word & (2 ** 128 - 1) == btoken.totalLoanable()
+    assert word >> 128 == btoken.totalDebtShare()
+    # amounts are bounded to 128 bits
+    with brownie.reverts():
+        btoken.mint(a[0], 2 ** 128, {"from": a[0]})
+
+
+def test_btoken_sync_required(protocol):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    im = btoken.interestModel()
+    new_im = a[0].deploy(
+        BetaInterestModelV1, mathval(0.1), mathval(0), mathval(100), mathval(0)
     )
+    new_config = a[0].deploy(BetaConfig, a[3], mathval(0.1))
+    betaBank.setInterestModel(new_im, {"from": a[0]})
+    betaBank.setConfig(new_config, {"from": a[0]})
+    config.setReserveInfo(a[2], mathval(0.2), {"from": a[0]})
+    # bTokens keep the previous values until synced
+    assert btoken.interestModel() == im
+    assert btoken.reserveBeneficiary() != a[3]
+    assert betaBank.allBTokens(0) == btoken
+    betaBank.syncBTokenRange(0, 2 ** 256 - 1, {"from": a[1]})
+    assert btoken.interestModel() == new_im
+    assert btoken.reserveBeneficiary() == a[3]
+    assert btoken.reserveRate() == mathval(0.1)
+    betaBank.syncBTokenRange(1, 1, {"from": a[1]})  # empty pages are no-ops
+
+
+def test_btoken_paused(protocol, create_market):
+    betaBank = protocol["betaBank"]
     token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
     token.mint(a[0], mathval(1000000))
-    ext = a[0].deploy(MockExternalOracle)
-    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
-    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
-    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
-    oracle.setExternalOracle([token], ext, {"from": a[0]})
-    betaBank.create(token)
-    btoken = BToken.at(betaBank.bTokens(token))
+    btoken = create_market(token)
     token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
     chain.sleep(86400)
     btoken.accrue({"from": a[0]})
-    betaBank.pause()
+    betaBank.pause()  # read by bTokens directly, no sync needed
     chain.sleep(86400)
     with brownie.reverts("BetaBank/paused"):
         btoken.mint(a[0], mathval(500), {"from": a[0]})
@@ -279,3 +398,22 @@ def test_btoken_paused():
     chain.sleep(365 * 86400)
     btoken.accrue({"from": a[0]})
     btoken.burn(a[2], mathval(100), {"from": a[0]})
+
+
+def test_btoken_standard_underlying(protocol):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    assert not btoken.standardUnderlying()
+    with brownie.reverts("setStandardTokens/not-governor"):
+        config.setStandardTokens([utoken, ctoken], True, {"from": a[1]})
+    config.setStandardTokens([utoken, ctoken], True, {"from": a[0]})
+    assert not btoken.standardUnderlying()  # only applies once synced
+    betaBank.syncBTokens([btoken], {"from": a[1]})
+    assert btoken.standardUnderlying()
+    loanable = btoken.totalLoanable()
+    btoken.mint(a[0], mathval(100), {"from": a[0]})
+    assert btoken.totalLoanable() == loanable + mathval(100)
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
+    assert betaBank.positions(a[1], pid)[4] == mathval(500)
+    assert ctoken.balanceOf(betaBank) == mathval(500)
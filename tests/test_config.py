@@ -212,3 +212,41 @@ def test_config_level_blacklist():
     with brownie.reverts("getRiskLevel/bad-risk-level"):
         config.getRiskLevel(TOKENB)
     assert config.getRiskLevel(TOKENA) == 1
+
+
+def test_config_risk_params():
+    config = a[0].deploy(BetaConfig, a[0], 0)
+    config.setRiskConfigs(
+        [0, 1],
+        [
+            [mathval(0.5), mathval(0.75), mathval(0.05)],
+            [mathval(0.4), mathval(0.6), mathval(0.04)],
+        ],
+        {"from": a[0]},
+    )
+    config.setCollInfos([TOKENB], [mathval(0.85)], [1000], {"from": a[0]})
+    config.setRiskLevels([TOKENA, TOKENC], [1, 2 ** 256 - 1], {"from": a[0]})
+    assert config.getRiskParams(TOKENA, TOKENB) == (
+        mathval(0.85),
+        1000,
+        mathval(0.4),
+        mathval(0.6),
+        mathval(0.04),
+    )
+    # zero values are returned as is
+    assert config.getRiskParams(TOKENB, TOKENA) == (0, 0, mathval(0.5), mathval(0.75), mathval(0.05))
+    with brownie.reverts("getRiskLevel/bad-risk-level"):
+        config.getRiskParams(TOKENC, TOKENB)
+
+
+def test_config_standard_tokens():
+    config = a[0].deploy(BetaConfig, a[0], 0)
+    assert not config.standardTokens(TOKENA)
+    with brownie.reverts("setStandardTokens/not-governor"):
+        config.setStandardTokens([TOKENA], True, {"from": a[1]})
+    config.setStandardTokens([TOKENA, TOKENB], True, {"from": a[0]})
+    assert config.standardTokens(TOKENA)
+    assert config.standardTokens(TOKENB)
+    config.setStandardTokens([TOKENB], False, {"from": a[0]})
+    assert config.standardTokens(TOKENA)
+    assert not config.standardTokens(TOKENB)
@@ -0,0 +1,89 @@
+from brownie import (
+    a,
+    chain,
+    BetaBank,
+    BToken,
+    BetaConfig,
+    BetaOracleUniswapV2,
+    BetaInterestModelV1,
+    BetaDynamicInterestRateModel,
+    MockExternalOracle,
+    ERC20Contract,
+    BTokenDeployer,
+)
+
+from scripts.interest_simulator import (
+    DynamicInterestRateModel,
+    InterestModelV1,
+    accrue,
+)
+
+
+ONE = "0x0000000000000000000000000000000000000001"
+# Mocking arbitrary addresses
+WETH = "0x4de688DF50200AaAFada86898330Fc9aB2E6F4CC"
+
+UTILS = [(100, 0), (60, 40), (45, 55), (30, 70), (25, 75), (15, 85), (1, 99), (0, 100)]
+TIMES = [1, 1000, 86400, 10 * 86400]
+
+
+def mathval(val):
+    return int(val * 1000000) * 10 ** 12
+
+
+def test_interest_simulator_v1():
+    for params in [(0.20, 0.05, 100, 0.5), (0.10, 0, 1, 0.9)]:
+        im = a[0].deploy(BetaInterestModelV1, *[mathval(p) for p in params])
+        model = InterestModelV1(*[mathval(p) for p in params])
+        for available, loan in UTILS:
+            for time_passed in TIMES:
+                args = (mathval(0.30), mathval(available), mathval(loan), time_passed)
+                assert model.next_rate(*args) == im.getNextInterestRate(*args)
+
+
+def test_interest_simulator_dynamic():
+    im = a[0].deploy(BetaDynamicInterestRateModel)
+    params = (mathval(2), 5000, 7000, mathval(3), 1000, 5000)
+    im.setConfigs([a[0]], [params], {"from": a[0]})
+    model = DynamicInterestRateModel(*params)
+    for available, loan in UTILS:
+        for time_passed in TIMES:
+            args = (mathval(0.30), mathval(available), mathval(loan), time_passed)
+            assert model.next_rate(*args) == im.getNextInterestRate(*args, {"from": a[0]})
+
+
+def test_interest_simulator_accrue():
+    betaBank = a[0].deploy(BetaBank)
+    config = a[0].deploy(BetaConfig, a[2], mathval(0.2))
+    im = a[0].deploy(
+        BetaInterestModelV1, mathval(0.20), mathval(0), mathval(100), mathval(0.5)
+    )
+    model = InterestModelV1(mathval(0.20), mathval(0), mathval(100), mathval(0.5))
+    token = a[0].deploy(ERC20Contract, "My Token Name", "MYSYM")
+    token.mint(a[0], mathval(1000000))
+    ext = a[0].deploy(MockExternalOracle)
+    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, ONE, 3600)
+    betaBank.initialize(a[0], a[0].deploy(BTokenDeployer), oracle, config, im)
+    ext.setETHPrice(token, 2 ** 112, {"from": a[0]})
+    oracle.setExternalOracle([token], ext, {"from": a[0]})
+    betaBank.create(token)
+    btoken = BToken.at(betaBank.bTokens(token))
+    token.approve(btoken, 2 ** 256 - 1, {"from": a[0]})
+    btoken.mint(a[0], mathval(500), {"from": a[0]})
+    btoken.borrow(a[1], mathval(420), {"from": betaBank})
+    for sleep in [86400, 3 * 86400, 365 * 86400]:
+        market = {
+            "interestRate": btoken.interestRate(),
+            "totalLoanable": btoken.totalLoanable(),
+            "totalLoan": btoken.totalLoan(),
+            "totalSupply": btoken.totalSupply() + btoken.pendingReserve(),
+            "reserveSupply": 0,
+        }
+        last = btoken.lastAccrueTime()
+        chain.sleep(sleep)
+        tx = btoken.accrue({"from": a[0]})
+        interest = accrue(market, model, tx.timestamp - last, mathval(0.2))
+        assert tx.events["Accrue"]["interest"] == interest
+        assert btoken.interestRate() == market["interestRate"]
+        assert btoken.totalLoan() == market["totalLoan"]
+        assert btoken.totalSupply() + btoken.pendingReserve() == market["totalSupply"]
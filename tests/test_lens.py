@@ -0,0 +1,56 @@
+import pytest
+import brownie
+from brownie import a, chain, BetaLens
+
+
+def mathval(val):
+    return int(val * 1000000) * 10 ** 12
+
+
+def test_lens_snapshots(protocol):
+    betaBank, config, btoken = protocol["betaBank"], protocol["config"], protocol["btoken"]
+    utoken, ctoken = protocol["utoken"], protocol["ctoken"]
+    config.setReserveInfo(a[0], mathval(0.1), {"from": a[0]})
+    betaBank.syncBTokens([btoken], {"from": a[0]})
+    pid = betaBank.open(a[1], utoken, ctoken, {"from": a[1]}).return_value
+    betaBank.put(a[1], pid, mathval(500), {"from": a[1]})
+    betaBank.borrow(a[1], pid, mathval(40), {"from": a[1]})
+    lens = a[0].deploy(BetaLens, betaBank)
+    assert lens.getNextPositionIds([a[1], a[2]]) == [1, 0]
+    with brownie.reverts("getPositionSnapshots/bad-length"):
+        lens.getPositionSnapshots([a[1]], [0, 1])
+    chain.sleep(365 * 86400)
+    chain.mine()
+    [market] = lens.getMarketSnapshots([btoken])
+    assert market["bToken"] == btoken
+    assert market["underlying"] == utoken
+    assert float(market["pendingInterest"]) == pytest.approx(mathval(8))  # 20% of 40
+    assert float(market["totalLoan"]) == pytest.approx(mathval(48))
+    assert market["totalLoanable"] == mathval(960)
+    assert market["totalDebtShare"] == mathval(40)
+    assert float(market["totalSupply"]) == pytest.approx(
+        mathval(1000) + mathval(0.8) * mathval(1000) // mathval(1007.2), rel=1e-4
+    )  # 10% of interest minted as reserve at the post-accrue share price
+    assert market["riskLevel"] == 0
+    assert market["safetyLTV"] == mathval(0.33)
+    assert market["liquidationLTV"] == mathval(0.5)
+    assert market["killBountyRate"] == mathval(0.05)
+    [pos, missing] = lens.getPositionSnapshots([a[1], a[1]], [pid, 42])
+    assert pos["exists"]
+    assert pos["owner"] == a[1]
+    assert pos["bToken"] == btoken
+    assert pos["collateral"] == ctoken
+    assert pos["collateralSize"] == mathval(500)
+    assert pos["debtShare"] == mathval(40)
+    assert float(pos["debtValue"]) == pytest.approx(mathval(48))
+    assert pos["collFactor"] == mathval(0.8)
+    assert pos["collMaxAmount"] == mathval(10000)
+    assert not missing["exists"]
+    assert missing["debtValue"] == 0
+    # the simulation must match the state after a real accrue
+    btoken.accrue()
+    assert float(btoken.totalLoan()) == pytest.approx(float(market["totalLoan"]))
+    assert float(btoken.interestRate()) == pytest.approx(float(market["interestRate"]))
+    assert float(btoken.totalSupply() + btoken.pendingReserve()) == pytest.approx(
+        float(market["totalSupply"])
+    )
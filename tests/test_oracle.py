@@ -4,9 +4,12 @@ from brownie import (
     a,
     chain,
     BetaOracleUniswapV2,
+    MockAlphaAggOracle,
     MockExternalOracle,
     MockUniswapV2Factory,
     MockUniswapV2Pair,
+    MockUniswapV3Pool,
+    MockUniswapV3PriceOracle,
 )
 
 
@@ -45,6 +48,24 @@ def test_oracle_from_external_oracle():
         oracle.initPriceFromPair(TOKENB)
 
 
+def test_oracle_external_price_cache():
+    ext = a[0].deploy(MockExternalOracle)
+    factory = a[0].deploy(MockUniswapV2Factory)
+    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, factory, 3600)
+    ext.setETHPrice(TOKENA, 3 * 2 ** 111)  # 1.5 ETH per token
+    oracle.setExternalOracle([TOKENA], ext, {"from": a[0]})
+    assert oracle.cachedPrices(TOKENA) == (0, 0)
+    tx = oracle.getAssetETHPrice(TOKENA)
+    assert tx.return_value == 3 * 2 ** 111
+    assert oracle.cachedPrices(TOKENA) == (3 * 2 ** 111, tx.block_number)
+    ext.setETHPrice(TOKENA, 2 ** 112)  # new block, cache is stale
+    tx = oracle.getAssetETHPrice(TOKENA)
+    assert tx.return_value == 2 ** 112
+    assert oracle.cachedPrices(TOKENA) == (2 ** 112, tx.block_number)
+    oracle.setExternalOracle([TOKENA], ext, {"from": a[0]})
+    assert oracle.cachedPrices(TOKENA) == (0, 0)
+
+
 def test_oracle_price0():
     factory = a[0].deploy(MockUniswapV2Factory)
     pair = a[0].deploy(MockUniswapV2Pair)
@@ -66,14 +87,18 @@ def test_oracle_price0():
     assert oracle.getAssetETHPrice(TOKENA).return_value == 2 ** 111
     assert oracle.getAssetETHValue(TOKENA, mathval(100)).return_value == mathval(50)
     pair.setReserves(100, 75)
-    chain.sleep(5400)
-    # average price = (0.5*1 + 0.75*3) / 4 = 0.6875
+    chain.sleep(1800)
+    # sliding window over the last hour = (0.5*1 + 0.75*1) / 2 = 0.625
     assert float(oracle.getAssetETHPrice(TOKENA).return_value) == pytest.approx(
-        2 ** 112 * 6875 // 10000, rel=1e-3
+        2 ** 112 * 625 // 1000, rel=1e-3
     )
     assert float(
         oracle.getAssetETHValue(TOKENA, mathval(10000)).return_value
-    ) == pytest.approx(mathval(6875), rel=1e-3)
+    ) == pytest.approx(mathval(6250), rel=1e-3)
+    chain.sleep(3600)
+    assert float(oracle.getAssetETHPrice(TOKENA).return_value) == pytest.approx(
+        2 ** 112 * 75 // 100, rel=1e-3
+    )
 
 
 def test_oracle_price1():
@@ -97,11 +122,132 @@ def test_oracle_price1():
     assert oracle.getAssetETHPrice(TOKENB).return_value == 2 ** 113
     assert oracle.getAssetETHValue(TOKENB, mathval(100)).return_value == mathval(200)
     pair.setReserves(100, 80)
-    chain.sleep(5400)
-    # average price = (2*1 + 1.25*3) / 4 = 1.4375
+    chain.sleep(1800)
+    # sliding window over the last hour = (2*1 + 1.25*1) / 2 = 1.625
     assert float(oracle.getAssetETHPrice(TOKENB).return_value) == pytest.approx(
-        2 ** 112 * 14375 // 10000, rel=1e-3
+        2 ** 112 * 1625 // 1000, rel=1e-3
     )
     assert float(
         oracle.getAssetETHValue(TOKENB, mathval(10000)).return_value
-    ) == pytest.approx(mathval(14375), rel=1e-3)
+    ) == pytest.approx(mathval(16250), rel=1e-3)
+    chain.sleep(3600)
+    assert float(oracle.getAssetETHPrice(TOKENB).return_value) == pytest.approx(
+        2 ** 112 * 125 // 100, rel=1e-3
+    )
+
+
+def test_oracle_checkpoints():
+    factory = a[0].deploy(MockUniswapV2Factory)
+    pair = a[0].deploy(MockUniswapV2Pair)
+    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, factory, 3600)
+    assert oracle.checkpointSpacing() == 600
+    factory.setPair(TOKENA, WETH, pair)
+    pair.setReserves(100, 50)
+    oracle.initPriceFromPair(TOKENA)
+    with brownie.reverts("initPriceFromPair/already-initialized"):
+        oracle.initPriceFromPair(TOKENA)
+    _, index, timestamps, _ = oracle.getObservation(TOKENA)
+    assert index == 0 and timestamps[1:] == (0,) * 7
+    chain.sleep(3600)
+    tx = oracle.updatePriceFromPair(TOKENA)
+    assert tx.events["Observe"]["price"] == 2 ** 111
+    # a new checkpoint is only recorded once the newest one is checkpointSpacing old
+    tx = oracle.updatePriceFromPair(TOKENA)
+    assert tx.return_value == 2 ** 111 and "Observe" not in tx.events
+    assert oracle.getObservation(TOKENA)[1] == 1
+    # the computed price is cached for the block, and the newest checkpoint stays readable
+    assert oracle.cachedPrices(TOKENA) == (2 ** 111, tx.block_number)
+    _, _, timestamps, cumus = oracle.getObservation(TOKENA)
+    assert oracle.observations(TOKENA) == (cumus[1], 2 ** 111, timestamps[1])
+    # external prices share the cache, but never leak into the pair observation
+    ext = a[0].deploy(MockExternalOracle)
+    ext.setETHPrice(TOKENA, 2 ** 113)
+    oracle.setExternalOracle([TOKENA], ext, {"from": a[0]})
+    assert oracle.getAssetETHPrice(TOKENA).return_value == 2 ** 113
+    assert oracle.observations(TOKENA) == (cumus[1], 2 ** 111, timestamps[1])
+    oracle.setExternalOracle([TOKENA], ZERO, {"from": a[0]})
+    for _ in range(8):
+        chain.sleep(600)
+        oracle.updatePriceFromPair(TOKENA)
+    # the ring wraps around, and a full TWAP is still available right after
+    _, index, timestamps, _ = oracle.getObservation(TOKENA)
+    assert index == 1
+    assert max(timestamps) - min(timestamps) >= 3600 + 600
+    assert oracle.updatePriceFromPair(TOKENA).return_value == 2 ** 111
+
+
+def test_oracle_batch_prices():
+    ext = a[0].deploy(MockExternalOracle)
+    batch_ext = a[0].deploy(MockExternalOracle)
+    factory = a[0].deploy(MockUniswapV2Factory)
+    pair = a[0].deploy(MockUniswapV2Pair)
+    oracle = a[0].deploy(BetaOracleUniswapV2, WETH, factory, 3600)
+    tokenc = "0x000000000000000000000000000000000000C0DE"
+    ext.setETHPrice(TOKENA, 3 * 2 ** 111)  # 1.5 ETH per token
+    batch_ext.setETHPrice(TOKENB, 2 ** 113)  # 2 ETH per token
+    batch_ext.setETHPrice(WETH, 5)  # never queried
+    oracle.setExternalOracle([TOKENA], ext, {"from": a[0]})
+    oracle.setExternalOracle([TOKENB], batch_ext, {"from": a[0]})
+    with brownie.reverts("setBatchExternalOracles/not-governor"):
+        oracle.setBatchExternalOracles([batch_ext], True, {"from": a[1]})
+    oracle.setBatchExternalOracles([batch_ext], True, {"from": a[0]})
+    assert batch_ext.getETHPxs([TOKENB, TOKENA]) == [2 ** 113, 0]
+    factory.setPair(tokenc, WETH, pair)
+    pair.setReserves(100, 50)
+    oracle.initPriceFromPair(tokenc)
+    chain.sleep(3600)
+    tx = oracle.getAssetETHPrices([TOKENA, TOKENB, WETH, tokenc])
+    assert tx.return_value == [3 * 2 ** 111, 2 ** 113, 2 ** 112, 2 ** 111]
+    assert oracle.cachedPrices(TOKENA) == (3 * 2 ** 111, tx.block_number)
+    assert oracle.cachedPrices(TOKENB) == (2 ** 113, tx.block_number)
+    assert oracle.getAssetETHPrices([]).return_value == []
+
+
+def test_oracle_v3_register_pools():
+    agg = a[0].deploy(MockAlphaAggOracle)
+    oracle = a[0].deploy(MockUniswapV3PriceOracle, ONE, 1800, agg)
+    assert [oracle.feeTiers(idx) for idx in range(3)] == [10000, 3000, 500]
+    with brownie.reverts("setFeeTiers/not-governor"):
+        oracle.setFeeTiers([3000], {"from": a[1]})
+    with brownie.reverts("registerPools/not-governor"):
+        oracle.registerPools([TOKENA], {"from": a[1]})
+    tx = oracle.setFeeTiers([3000, 100], {"from": a[0]})
+    assert tx.events["SetFeeTiers"]["feeTiers"] == [3000, 100]
+    assert oracle.feeTiers(1) == 100
+    oracle.setPools(TOKENA, [a[2]])
+    # no pool is deployed at the derived addresses, so re-registering clears the list
+    tx = oracle.registerPools([TOKENA], {"from": a[0]})
+    assert tx.events["SetPools"]["pools"] == []
+    assert oracle.getPools(TOKENA) == []
+    with brownie.reverts("no-obs"):
+        oracle.getAssetETHPrice(TOKENA)
+
+
+def test_oracle_v3_failing_pool():
+    agg = a[0].deploy(MockAlphaAggOracle)
+    oracle = a[0].deploy(MockUniswapV3PriceOracle, ONE, 1800, agg)
+    pool = a[0].deploy(MockUniswapV3Pool)
+    bad_pool = a[0].deploy(MockUniswapV3Pool)
+    bad_pool.setTick(6932)  # ~2 ETH per token
+    oracle.setPools(TOKENA, [pool, bad_pool])
+    # equal liquidity, so the mean tick is 3466, or ~1.414 ETH per token
+    assert float(oracle.getAssetETHPrice(TOKENA).return_value) == pytest.approx(
+        2 ** 112 * 1.41421, rel=1e-3
+    )
+    # batched queries share the observe arguments and short-circuit the quote token
+    prices = oracle.getAssetETHPrices([TOKENA, oracle.QUOTE_ADDRESS()]).return_value
+    assert float(prices[0]) == pytest.approx(2 ** 112 * 1.41421, rel=1e-3)
+    assert prices[1] == 2 ** 112
+    # a pool that fails to serve a TWAP is skipped
+    bad_pool.setFailing(True)
+    assert oracle.getAssetETHPrice(TOKENA).return_value == 2 ** 112
+    # so is a pool without liquidity in range, on which consult would divide by zero
+    bad_pool.setFailing(False)
+    bad_pool.setNoLiquidity(True)
+    assert oracle.getAssetETHPrice(TOKENA).return_value == 2 ** 112
+    pool.setFailing(True)
+    with brownie.reverts("no-obs"):
+        oracle.getAssetETHPrice(TOKENA)
+    # the aggregate oracle takes precedence when it has a primary source
+    agg.setETHPrice(TOKENA, 3 * 2 ** 111)
+    assert oracle.getAssetETHPrice(TOKENA).return_value == 3 * 2 ** 111